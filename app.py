@@ -3,37 +3,182 @@ PhysioHealth - Backend API
 FastAPI backend for appointment booking and contact management
 """
 
-from fastapi import FastAPI, HTTPException
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel, EmailStr
 from typing import Optional
-from datetime import datetime
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta
+import asyncio
+import hmac
 import json
 import os
+import threading
+import time
+
+from storage import REJECTED, create_engine
+from appointment_index import AppointmentIndex, decode_cursor, encode_cursor
+from writer import StorageWriter
+from chat_log import ChatLogger
+from chat_matcher import KnowledgeBase
+from catalog import Catalog
+from listing import MAX_PAGE_SIZE, make_filter, ndjson_lines, paginate
+from availability import Availability
+from records import as_dict
+from fast_json import FastJSONResponse
+from reports import DIMENSIONS, RevenueRollups
+from idempotency import KEY_FIELD, IdempotencyKeys, is_replay
+from ids import new_id
+from rate_limit import RateLimit, RateLimiter, RateLimitMiddleware, create_buckets
+from search import MessageSearch
+from snapshot import create_snapshot, list_snapshots, prune_snapshots
+from static_assets import StaticAssets
+from startup import StartupProfile, Warmup, WarmupGate
+from jobs import JobQueue, JobRunner
+from notifications import (booking_confirmation, booking_followup, contact_acknowledgement,
+                           contact_notice, create_sender)
+import metrics as prometheus
+
+# Seconds from process start to each startup phase (/api/admin/startup)
+startup_profile = StartupProfile()
+startup_profile.mark("imports")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    startup_profile.mark("lifespan")
+    storage.start()
+    writer.start()
+    chat_logger.start()
+    job_runner.start()
+    # Load the data before serving, or in the background with lazy startup
+    warmup.start(background=LAZY_STARTUP)
+    yield
+    await job_runner.stop()
+    await writer.stop()
+    chat_logger.close()
+    storage.close()
+    rate_limiter.store.close()
+    message_search.close()
+    job_queue.close()
 
 app = FastAPI(
     title="PhysioHealth API",
     description="Backend API for PhysioHealth Physiotherapy Clinic",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
 )
 
+
 # Data file paths
 DATA_DIR = "data"
 APPOINTMENTS_FILE = os.path.join(DATA_DIR, "appointments.json")
 CONTACTS_FILE = os.path.join(DATA_DIR, "contacts.json")
+CHAT_HISTORY_FILE = os.path.join(DATA_DIR, "chat_history.json")
+# Online backups of DATA_DIR (see snapshot.py). Snapshots taken through the
+# API are pruned to the latest PHYSIO_SNAPSHOT_KEEP and what they depend on.
+SNAPSHOT_DIR = os.environ.get("PHYSIO_SNAPSHOT_DIR", "snapshots")
+SNAPSHOT_KEEP = int(os.environ.get("PHYSIO_SNAPSHOT_KEEP", "10"))
+
+# Collections stored by the storage engine, keyed by their legacy file
+COLLECTIONS = {
+    APPOINTMENTS_FILE: "appointments",
+    CONTACTS_FILE: "contacts",
+}
 
 # Ensure data directory exists
 os.makedirs(DATA_DIR, exist_ok=True)
 
-# Initialize data files if they don't exist
-def init_data_file(filepath: str):
-    if not os.path.exists(filepath):
-        with open(filepath, 'w') as f:
-            json.dump([], f)
+# Start-up steps run by the lifespan. With PHYSIO_LAZY_STARTUP=1 the server
+# answers before they finish: requests needing a step's data wait for it,
+# the rest are served at once, and /api/ready reports the progress.
+LAZY_STARTUP = os.environ.get("PHYSIO_LAZY_STARTUP") == "1"
+warmup = Warmup(startup_profile)
+app.add_middleware(WarmupGate, warmup=warmup, routes={
+    "/api/appointments": "appointments",
+    "/api/availability": "appointments",
+    "/api/reports": "appointments",
+    "/api/admin/reports": "appointments",
+    "/api/admin/index-stats": "appointments",
+    "/api/contact": "contacts",
+    "/api/chat/search": "chat",
+})
+
+# Per-client limits on the unauthenticated write endpoints. Use
+# PHYSIO_RATE_LIMIT_BACKEND=sqlite to share the buckets between workers, and
+# PHYSIO_TRUST_PROXY=<number of reverse proxies> to key on X-Forwarded-For.
+rate_limiter = RateLimiter(
+    create_buckets(os.environ.get("PHYSIO_RATE_LIMIT_BACKEND", "memory"), DATA_DIR),
+    trusted_proxies=int(os.environ.get("PHYSIO_TRUST_PROXY", "0")),
+)
+rate_limiter.limit("POST", "/api/chat",
+                   RateLimit.parse("chat", os.environ.get("PHYSIO_CHAT_RATE", "30/60")))
+rate_limiter.limit("POST", "/api/contact",
+                   RateLimit.parse("contact", os.environ.get("PHYSIO_CONTACT_RATE", "5/60")))
+rate_limiter.limit("POST", "/api/appointments",
+                   RateLimit.parse("booking", os.environ.get("PHYSIO_BOOKING_RATE", "10/600")))
+app.add_middleware(RateLimitMiddleware, limiter=rate_limiter)
+
+# The /api/admin endpoints take `Authorization: Bearer <PHYSIO_ADMIN_TOKEN>`.
+# Without a token set they only answer direct requests from this machine:
+# anything that came through a proxy (even a local one, like ngrok's agent)
+# carries X-Forwarded-For and is refused.
+ADMIN_TOKEN = os.environ.get("PHYSIO_ADMIN_TOKEN")
+LOOPBACK = {"127.0.0.1", "::1"}
+
+def require_admin(request: Request, authorization: Optional[str] = Header(None)):
+    if ADMIN_TOKEN:
+        scheme, _, token = (authorization or "").partition(" ")
+        if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+            raise HTTPException(status_code=401, detail="Admin token required",
+                                headers={"WWW-Authenticate": "Bearer"})
+    elif (request.client is None or request.client.host not in LOOPBACK
+          or "x-forwarded-for" in request.headers or "forwarded" in request.headers):
+        raise HTTPException(status_code=403, detail="Admin endpoints are only served locally "
+                                                    "unless PHYSIO_ADMIN_TOKEN is set")
+
+# Request and storage metrics, served at /metrics. PHYSIO_SLOW_REQUEST_MS
+# logs every request slower than the threshold. Added last so it wraps the
+# rate limiter and also counts rejected requests.
+slow_request_ms = os.environ.get("PHYSIO_SLOW_REQUEST_MS")
+metrics = prometheus.Metrics(float(slow_request_ms) / 1000 if slow_request_ms else None)
+app.add_middleware(prometheus.MetricsMiddleware, metrics=metrics)
+
+# Storage engine ("jsonl" by default, "sqlite" optional)
+storage = create_engine(os.environ.get("PHYSIO_STORAGE", "jsonl"), DATA_DIR)
+storage.observer = metrics.observe_storage
+
+# All mutations go through a single writer task
+writer = StorageWriter(storage, on_commit=lambda: refresh_after_commit())
 
-init_data_file(APPOINTMENTS_FILE)
-init_data_file(CONTACTS_FILE)
+# Full-text index over contact messages and chat history, shared by all workers
+message_search = MessageSearch(os.path.join(DATA_DIR, "search.db"))
+
+# Chat messages are buffered and flushed to rotating segments under data/chat
+chat_logger = ChatLogger(
+    os.path.join(DATA_DIR, "chat"),
+    flush_interval=float(os.environ.get("PHYSIO_CHAT_FLUSH_INTERVAL", "1.0")),
+    max_segment_bytes=int(os.environ.get("PHYSIO_CHAT_SEGMENT_BYTES", str(16 * 1024 * 1024))),
+    queue_size=int(os.environ.get("PHYSIO_CHAT_QUEUE_SIZE", "10000")),
+    on_flush=message_search.add_chats,
+)
+
+# Confirmation emails, SMS and follow-ups are queued in data/jobs.db, shared
+# by all workers, and sent in the background after the response. Messages
+# go to data/outbox unless PHYSIO_EMAIL_BACKEND=smtp / PHYSIO_SMS_BACKEND=webhook.
+job_queue = JobQueue(os.path.join(DATA_DIR, "jobs.db"))
+job_runner = JobRunner(
+    job_queue,
+    concurrency=int(os.environ.get("PHYSIO_JOB_CONCURRENCY", "4")),
+    max_attempts=int(os.environ.get("PHYSIO_JOB_ATTEMPTS", "5")),
+    backoff=float(os.environ.get("PHYSIO_JOB_BACKOFF", "30")),
+)
+OUTBOX_DIR = os.path.join(DATA_DIR, "outbox")
+senders = {channel: create_sender(channel, os.environ.get(f"PHYSIO_{channel.upper()}_BACKEND", "outbox"),
+                                  OUTBOX_DIR)
+           for channel in ("email", "sms")}
+# Hours after the appointment starts that the follow-up email is sent
+FOLLOWUP_HOURS = float(os.environ.get("PHYSIO_FOLLOWUP_HOURS", "24"))
 
 # Pydantic Models
 class Appointment(BaseModel):
@@ -48,7 +193,10 @@ class Appointment(BaseModel):
     originalPrice: float
     discount: float = 0
     finalPrice: float
-    bookingId: str
+    # Assigned by the server; a client-supplied bookingId is only used as
+    # the idempotency key when no Idempotency-Key header is sent, and a
+    # client-supplied createdAt is ignored (listings are ordered by it)
+    bookingId: Optional[str] = None
     createdAt: Optional[str] = None
 
 class ContactMessage(BaseModel):
@@ -72,35 +220,207 @@ class ContactResponse(BaseModel):
 
 # Helper functions
 def load_json(filepath: str) -> list:
-    try:
-        with open(filepath, 'r') as f:
-            return json.load(f)
-    except:
-        return []
+    return storage.load(COLLECTIONS[filepath])
 
 def save_json(filepath: str, data: list):
-    with open(filepath, 'w') as f:
-        json.dump(data, f, indent=2)
+    storage.replace(COLLECTIONS[filepath], data)
+
+async def append_json(filepath: str, record: dict, guard=None):
+    return await writer.append(COLLECTIONS[filepath], record, guard)
+
+async def delete_json(filepath: str, field: str, value, record: Optional[dict] = None) -> Optional[dict]:
+    return await writer.delete(COLLECTIONS[filepath], field, value, record)
+
+# In-memory appointment index, built at startup and kept in sync on writes
+appointment_index = AppointmentIndex()
+
+def refresh_index(blocking: bool = False):
+    """Apply appointments committed by this or other worker processes to the index"""
+    collection = COLLECTIONS[APPOINTMENTS_FILE]
+    storage.poll(collection, blocking)
+    appointment_index.apply(*storage.drain(collection))
+
+def refresh_search(blocking: bool = False):
+    """Index contact messages committed by this or other worker processes"""
+    collection = COLLECTIONS[CONTACTS_FILE]
+    storage.poll(collection, blocking)
+    # Entries reach the search index through its storage listener
+    storage.drain(collection)
+
+def refresh_after_commit():
+    refresh_index()
+    refresh_search()
+
+def load_appointments():
+    """Warm-up: import the legacy file once, then build the index and rollups"""
+    storage.import_legacy(COLLECTIONS[APPOINTMENTS_FILE], APPOINTMENTS_FILE)
+    refresh_index(blocking=True)
+
+def load_contacts():
+    """Warm-up: import the legacy file once, then catch the search index up"""
+    storage.import_legacy(COLLECTIONS[CONTACTS_FILE], CONTACTS_FILE)
+    refresh_search(blocking=True)
+
+def load_chat_history():
+    """Warm-up: import the legacy file once, then index what search has not seen"""
+    imported = chat_logger.import_legacy(CHAT_HISTORY_FILE)
+    if imported or message_search.count("chat") == 0:
+        # First start with search, or legacy history just imported: index
+        # the chat history logged so far (already indexed messages are skipped)
+        threading.Thread(target=lambda: message_search.add("chat", chat_logger.entries()),
+                         name="chat-search-backfill", daemon=True).start()
+
+storage.subscribe(COLLECTIONS[CONTACTS_FILE], message_search.apply_contacts)
+
+# Services, doctors and clinic info, pre-serialised for the catalog endpoints
+catalog = Catalog(os.path.join(DATA_DIR, "catalog.json"))
+
+# Longest range answered by /api/availability
+MAX_AVAILABILITY_DAYS = 62
 
 # Service prices
-SERVICE_PRICES = {
-    'orthopedic': 1500,
-    'sports': 2000,
-    'neurological': 2500,
-    'pediatric': 1200,
-    'pain': 1000,
-    'home': 2500
-}
+SERVICE_PRICES = catalog.service_prices()
+
+# Booked-slot bitmaps, kept in step with the appointments log
+availability = Availability(catalog.data["clinic"]["hours"], catalog.data["doctors"])
+storage.subscribe(COLLECTIONS[APPOINTMENTS_FILE], availability.apply)
+
+# Revenue rollups per (day, doctor, service), also driven by the log
+revenue = RevenueRollups()
+storage.subscribe(COLLECTIONS[APPOINTMENTS_FILE], revenue.apply)
+
+# Recently used Idempotency-Keys and booking IDs, so retried submissions
+# are answered from the stored booking instead of being booked twice
+idempotency = IdempotencyKeys(ttl=float(os.environ.get("PHYSIO_IDEMPOTENCY_TTL", str(24 * 3600))))
+storage.subscribe(COLLECTIONS[APPOINTMENTS_FILE], idempotency.apply)
+
+metrics.add_gauge("appointment_index_records", "Appointments held in the in-memory index",
+                  lambda: appointment_index.stats()["size"])
+metrics.add_gauge("writer_queued_ops", "Storage operations waiting for the writer",
+                  lambda: writer.stats()["queued"])
+metrics.add_gauge("chat_log_queued_messages", "Chat messages waiting to be flushed",
+                  lambda: chat_logger.stats()["queued"])
+metrics.add_gauge("jobs_due", "Background jobs waiting to run",
+                  lambda: job_queue.counts()["due"])
+metrics.add_gauge("jobs_dead", "Background jobs in the dead-letter list",
+                  lambda: job_queue.counts()["dead"])
+job_runner.observer = metrics.observe_job
+
+# Background jobs
+async def send_email(message: dict):
+    await asyncio.to_thread(senders["email"].send, message)
+
+async def send_sms(message: dict):
+    await asyncio.to_thread(senders["sms"].send, message)
+
+async def send_followup(payload: dict):
+    """Follow-up email, unless the appointment was cancelled meanwhile"""
+    await warmup.wait("appointments")
+    refresh_index()
+    record = appointment_index.get(payload["bookingId"])
+    if record is not None:
+        await send_email(booking_followup(as_dict(record), catalog.data["clinic"]))
+
+job_runner.handle("email", send_email,
+                  concurrency=int(os.environ.get("PHYSIO_EMAIL_CONCURRENCY", "2")))
+job_runner.handle("sms", send_sms,
+                  concurrency=int(os.environ.get("PHYSIO_SMS_CONCURRENCY", "2")))
+job_runner.handle("followup", send_followup, concurrency=1)
+
+# Messages to any one address or phone number are capped as well, so the
+# public forms cannot be used to flood someone else's inbox or phone with
+# addresses that change with every request
+NOTIFY_RATE = RateLimit.parse("notify", os.environ.get("PHYSIO_NOTIFY_RATE", "10/86400"))
+
+def within_notify_rate(jobs: list) -> list:
+    """`jobs` without the messages to recipients over PHYSIO_NOTIFY_RATE.
+
+    The copies for the clinic's own inbox are never dropped.
+    """
+    clinic = catalog.data["clinic"]["contact"]["email"].lower()
+    now = time.time()
+    kept = []
+    for job in jobs:
+        to = "".join(job[2].get("to", "").lower().split())
+        if to and to != clinic and rate_limiter.store.take(NOTIFY_RATE, f"notify {to}", now):
+            continue
+        kept.append(job)
+    return kept
+
+async def enqueue_jobs(jobs: list):
+    """Queue (id, kind, payload, run_at) jobs and wake the runner"""
+    if rate_limiter.store.blocking:
+        jobs = await asyncio.to_thread(within_notify_rate, jobs)
+    else:
+        jobs = within_notify_rate(jobs)
+    await asyncio.to_thread(job_queue.enqueue_many, jobs)
+    job_runner.notify()
+
+def booking_jobs(record: dict) -> list:
+    """Confirmation email and SMS now, follow-up after the appointment"""
+    services = {service["id"]: service["name"] for service in catalog.data["services"]}
+    record = dict(record, service=services.get(record["service"], record["service"]))
+    booking_id = record["bookingId"]
+    jobs = [(f"{channel}:booking:{booking_id}", channel, message, None)
+            for channel, message in booking_confirmation(record, catalog.data["clinic"]).items()]
+    starts = datetime.strptime(f"{record['date']} {record['time']}", "%Y-%m-%d %H:%M")
+    followup_at = (starts + timedelta(hours=FOLLOWUP_HOURS)).timestamp()
+    jobs.append((f"followup:{booking_id}", "followup",
+                 {"bookingId": booking_id, "to": record["email"]}, followup_at))
+    return jobs
 
 # API Endpoints
+def replayed_booking(key: Optional[str], appointment: Appointment,
+                     response: Response) -> Optional[AppointmentResponse]:
+    """The original response if this submission was already booked"""
+    booking_id = idempotency.lookup(key) if key else None
+    record = appointment_index.get(booking_id) if booking_id else None
+    if record is None:
+        return None
+    if not is_replay(record, appointment.dict()):
+        raise HTTPException(status_code=409,
+                            detail="Idempotency-Key was already used for a different booking")
+    idempotency.replays += 1
+    response.headers["Idempotent-Replayed"] = "true"
+    return AppointmentResponse(
+        success=True,
+        message="Appointment booked successfully!",
+        bookingId=record.get("bookingId"),
+        appointment=Appointment(**as_dict(record))
+    )
+
 @app.post("/api/appointments", response_model=AppointmentResponse)
-async def create_appointment(appointment: Appointment):
-    """Create a new appointment booking"""
+async def create_appointment(appointment: Appointment, response: Response,
+                             idempotency_key: Optional[str] = Header(None, max_length=255)):
+    """Create a new appointment booking.
+
+    The booking ID is generated here. A repeated submission (same
+    Idempotency-Key header, or same client bookingId when no key is sent)
+    gets the original response back and is not stored again.
+    """
+    key = idempotency_key or appointment.bookingId
     
     # Validate service
     if appointment.service not in SERVICE_PRICES:
         raise HTTPException(status_code=400, detail="Invalid service selected")
     
+    # Validate doctor and slot
+    doctor = availability.doctor_name(appointment.doctor)
+    if doctor is None:
+        raise HTTPException(status_code=400, detail="Invalid doctor selected")
+    appointment.doctor = doctor
+    if availability.slot_index(appointment.date, appointment.time) is None:
+        raise HTTPException(status_code=400, detail="Selected time is outside clinic hours")
+    # One spelling per slot: the bitmaps, the guard and the stored record
+    # all use the canonical date and time
+    appointment.date, appointment.time = availability.normalize(appointment.date, appointment.time)
+    refresh_index()
+    replay = replayed_booking(key, appointment, response)
+    if replay is not None:
+        return replay
+    if not availability.is_free(doctor, appointment.date, appointment.time):
+        raise HTTPException(status_code=409, detail="This time slot is already booked")
+    
     # Calculate prices if not provided correctly
     base_price = SERVICE_PRICES[appointment.service]
     discount = base_price * 0.30 if appointment.isRegularPatient else 0
@@ -110,17 +430,25 @@ async def create_appointment(appointment: Appointment):
     appointment.discount = discount
     appointment.finalPrice = final_price
     
-    if not appointment.createdAt:
-        appointment.createdAt = datetime.now().isoformat()
-    
-    # Load existing appointments
-    appointments = load_json(APPOINTMENTS_FILE)
+    appointment.createdAt = datetime.now().isoformat()
+    appointment.bookingId = new_id("PH")
     
-    # Add new appointment
-    appointments.append(appointment.dict())
-    
-    # Save to file
-    save_json(APPOINTMENTS_FILE, appointments)
+    # Append new appointment; the key and the slot are re-checked atomically
+    # at commit time and the index picks the booking up once it is durable
+    record = appointment.dict()
+    guard = availability.guard(doctor, appointment.date, appointment.time)
+    if key:
+        record[KEY_FIELD] = key
+        guard = idempotency.guard(key, then=guard)
+    result = await append_json(APPOINTMENTS_FILE, record, guard)
+    if result == REJECTED:
+        # A concurrent retry may have committed the same submission first
+        replay = replayed_booking(key, appointment, response)
+        if replay is not None:
+            return replay
+        raise HTTPException(status_code=409, detail="This time slot is already booked")
+    # Sent by the job runner; the response does not wait for them
+    await enqueue_jobs(booking_jobs(record))
     
     return AppointmentResponse(
         success=True,
@@ -130,40 +458,65 @@ async def create_appointment(appointment: Appointment):
     )
 
 @app.get("/api/appointments")
-async def get_appointments():
-    """Get all appointments"""
-    appointments = load_json(APPOINTMENTS_FILE)
-    return {
+async def get_appointments(email: Optional[str] = None, date: Optional[str] = None,
+                           doctor: Optional[str] = None, service: Optional[str] = None,
+                           date_from: Optional[str] = None, date_to: Optional[str] = None,
+                           limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+                           after: Optional[str] = None,
+                           format: str = Query("json", pattern="^(json|ndjson)$")):
+    """Get appointments, filtered and paginated with `limit` and the `after` cursor"""
+    refresh_index()
+    try:
+        resume = decode_cursor(after) if after is not None else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    if doctor:
+        # Records store the canonical name; accept the id or name as booked
+        doctor = availability.doctor_name(doctor) or doctor
+    if email:
+        items = appointment_index.iter_by_email(email, resume)
+    elif date and doctor:
+        items = appointment_index.iter_by_slot(date, doctor, resume)
+    else:
+        items = appointment_index.iter_from(resume)
+    predicate = make_filter("date", date_from, date_to, email=email, date=date,
+                            doctor=doctor, service=service)
+    
+    if format == "ndjson":
+        return StreamingResponse(ndjson_lines(items, predicate, limit),
+                                 media_type="application/x-ndjson")
+    appointments, next_cursor = paginate(items, predicate, limit, encode_cursor)
+    return FastJSONResponse({
         "success": True,
         "count": len(appointments),
-        "appointments": appointments
-    }
+        "appointments": appointments,
+        "nextCursor": next_cursor
+    })
 
 @app.get("/api/appointments/{booking_id}")
 async def get_appointment(booking_id: str):
     """Get a specific appointment by booking ID"""
-    appointments = load_json(APPOINTMENTS_FILE)
-    
-    for appointment in appointments:
-        if appointment.get('bookingId') == booking_id:
-            return {"success": True, "appointment": appointment}
+    refresh_index()
+    appointment = appointment_index.get(booking_id)
+    if appointment is not None:
+        return {"success": True, "appointment": as_dict(appointment)}
     
     raise HTTPException(status_code=404, detail="Appointment not found")
 
 @app.delete("/api/appointments/{booking_id}")
 async def cancel_appointment(booking_id: str):
     """Cancel an appointment"""
-    appointments = load_json(APPOINTMENTS_FILE)
-    
-    for i, appointment in enumerate(appointments):
-        if appointment.get('bookingId') == booking_id:
-            cancelled = appointments.pop(i)
-            save_json(APPOINTMENTS_FILE, appointments)
-            return {
-                "success": True,
-                "message": "Appointment cancelled successfully",
-                "cancelled": cancelled
-            }
+    refresh_index()
+    cancelled = appointment_index.get(booking_id)
+    # Another request or worker may have cancelled it since the index was read
+    if cancelled is not None and await delete_json(APPOINTMENTS_FILE, 'bookingId', booking_id, cancelled):
+        await asyncio.to_thread(job_queue.cancel, f"followup:{booking_id}")
+        return {
+            "success": True,
+            "message": "Appointment cancelled successfully",
+            "cancelled": as_dict(cancelled)
+        }
     
     raise HTTPException(status_code=404, detail="Appointment not found")
 
@@ -171,20 +524,15 @@ async def cancel_appointment(booking_id: str):
 async def submit_contact(contact: ContactMessage):
     """Submit a contact message"""
     
-    if not contact.id:
-        contact.id = f"MSG{datetime.now().strftime('%Y%m%d%H%M%S')}"
-    
-    if not contact.createdAt:
-        contact.createdAt = datetime.now().isoformat()
+    contact.id = new_id("MSG")
+    contact.createdAt = datetime.now().isoformat()
     
-    # Load existing messages
-    messages = load_json(CONTACTS_FILE)
-    
-    # Add new message
-    messages.append(contact.dict())
-    
-    # Save to file
-    save_json(CONTACTS_FILE, messages)
+    # Append new message, then queue the reply and the copy for the clinic
+    record = contact.dict()
+    await append_json(CONTACTS_FILE, record)
+    clinic = catalog.data["clinic"]
+    await enqueue_jobs([(f"email:contact:{contact.id}", "email", contact_acknowledgement(record, clinic), None),
+                        (f"email:notice:{contact.id}", "email", contact_notice(record, clinic), None)])
     
     return ContactResponse(
         success=True,
@@ -193,209 +541,193 @@ async def submit_contact(contact: ContactMessage):
     )
 
 @app.get("/api/contact")
-async def get_messages():
-    """Get all contact messages"""
-    messages = load_json(CONTACTS_FILE)
-    return {
+async def get_messages(email: Optional[str] = None,
+                       date_from: Optional[str] = None, date_to: Optional[str] = None,
+                       limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+                       after: Optional[str] = None,
+                       format: str = Query("json", pattern="^(json|ndjson)$")):
+    """Get contact messages, filtered and paginated with `limit` and the `after` cursor"""
+    try:
+        items = storage.iter_records(COLLECTIONS[CONTACTS_FILE], after, raw=True)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    predicate = make_filter("createdAt", date_from, date_to, email=email)
+    
+    if format == "ndjson":
+        return StreamingResponse(ndjson_lines(items, predicate, limit),
+                                 media_type="application/x-ndjson")
+    messages, next_cursor = await asyncio.to_thread(paginate, items, predicate, limit)
+    # Stored records are passed through as they are on disk
+    return FastJSONResponse({
         "success": True,
         "count": len(messages),
-        "messages": messages
-    }
+        "messages": messages,
+        "nextCursor": next_cursor
+    })
+
+@app.get("/api/contact/search")
+async def search_messages(q: str = Query(..., min_length=1, max_length=200),
+                          date_from: Optional[str] = Query(None, alias="from"),
+                          date_to: Optional[str] = Query(None, alias="to"),
+                          limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+                          after: Optional[str] = None):
+    """Contact messages matching every word of `q` (`word*` for a prefix), newest first"""
+    refresh_search()
+    return await run_search("contact", "messages", q, date_from, date_to, limit, after)
+
+async def run_search(kind: str, field: str, q: str, date_from: Optional[str],
+                     date_to: Optional[str], limit: int, after: Optional[str]):
+    try:
+        results, next_cursor = await asyncio.to_thread(
+            message_search.search, kind, q, date_from, date_to, limit, after
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FastJSONResponse({
+        "success": True,
+        "count": len(results),
+        field: results,
+        "nextCursor": next_cursor
+    })
 
 @app.get("/api/services")
-async def get_services():
+async def get_services(request: Request):
     """Get available services and prices"""
-    services = [
-        {
-            "id": "orthopedic",
-            "name": "Orthopedic Rehabilitation",
-            "description": "Treatment for bone, joint, and muscle conditions",
-            "price": 1500
-        },
-        {
-            "id": "sports",
-            "name": "Sports Injury Treatment",
-            "description": "Specialized treatment for athletes",
-            "price": 2000
-        },
-        {
-            "id": "neurological",
-            "name": "Neurological Rehabilitation",
-            "description": "Expert care for neurological conditions",
-            "price": 2500
-        },
-        {
-            "id": "pediatric",
-            "name": "Pediatric Therapy",
-            "description": "Gentle physiotherapy for children",
-            "price": 1200
-        },
-        {
-            "id": "pain",
-            "name": "Pain Management",
-            "description": "Effective relief for chronic pain",
-            "price": 1000
-        },
-        {
-            "id": "home",
-            "name": "Home Visit",
-            "description": "Expert physiotherapy at your home",
-            "price": 2500
-        }
-    ]
-    return {"success": True, "services": services}
+    return catalog.responses["services"].to_response(request)
 
 @app.get("/api/doctors")
-async def get_doctors():
+async def get_doctors(request: Request):
     """Get list of doctors"""
-    doctors = [
-        {
-            "id": "dr-rajesh",
-            "name": "Dr. Rajesh Kumar",
-            "specialty": "Senior Physiotherapist",
-            "experience": "15+ years",
-            "rating": 4.9,
-            "reviews": 156,
-            "available": True
-        },
-        {
-            "id": "dr-priya",
-            "name": "Dr. Priya Sharma",
-            "specialty": "Sports Physiotherapist",
-            "experience": "10+ years",
-            "rating": 4.8,
-            "reviews": 132,
-            "available": True
-        },
-        {
-            "id": "dr-amit",
-            "name": "Dr. Amit Patel",
-            "specialty": "Neurological Specialist",
-            "experience": "12+ years",
-            "rating": 4.7,
-            "reviews": 98,
-            "available": True
-        }
-    ]
-    return {"success": True, "doctors": doctors}
+    return catalog.responses["doctors"].to_response(request)
 
 @app.get("/api/clinic-info")
-async def get_clinic_info():
+async def get_clinic_info(request: Request):
     """Get clinic information for SEO and Google Maps"""
+    return catalog.responses["clinic-info"].to_response(request)
+
+@app.post("/api/admin/catalog/reload", dependencies=[Depends(require_admin)])
+async def reload_catalog(force: bool = False):
+    """Rebuild the cached catalog responses after data/catalog.json changes"""
+    if force:
+        catalog.reload()
+        reloaded = True
+    else:
+        reloaded = catalog.reload_if_changed()
+    SERVICE_PRICES.clear()
+    SERVICE_PRICES.update(catalog.service_prices())
+    if reloaded:
+        refresh_index()
+        availability.set_catalog(catalog.data["clinic"]["hours"], catalog.data["doctors"])
+        availability.apply(appointment_index.all(), rebuilt=True)
+    return {"success": True, "reloaded": reloaded}
+
+@app.get("/api/availability")
+async def get_availability(doctor: str, date_from: str = Query(..., alias="from"),
+                           date_to: Optional[str] = Query(None, alias="to")):
+    """Free and booked slots for a doctor between two dates (default: one week)"""
+    name = availability.doctor_name(doctor)
+    if name is None:
+        raise HTTPException(status_code=404, detail="Doctor not found")
+    try:
+        start = date.fromisoformat(date_from)
+        end = date.fromisoformat(date_to) if date_to else start + timedelta(days=6)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be YYYY-MM-DD")
+    if end < start or (end - start).days > MAX_AVAILABILITY_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date range must be 0-{MAX_AVAILABILITY_DAYS} days")
+    refresh_index()
     return {
         "success": True,
-        "clinic": {
-            "name": "PhysioHealth Clinic",
-            "description": "Expert physiotherapy and rehabilitation services",
-            "address": {
-                "street": "123 Health Avenue, Medical District",
-                "city": "Bangalore",
-                "state": "Karnataka",
-                "postalCode": "560001",
-                "country": "India"
-            },
-            "coordinates": {
-                "latitude": 12.9716,
-                "longitude": 77.5946
-            },
-            "contact": {
-                "phone": ["+91 98765 43210", "+91 80123 45678"],
-                "email": "contact@physiohealth.com",
-                "whatsapp": "+919876543210"
-            },
-            "hours": {
-                "monday": "9:00 AM - 8:00 PM",
-                "tuesday": "9:00 AM - 8:00 PM",
-                "wednesday": "9:00 AM - 8:00 PM",
-                "thursday": "9:00 AM - 8:00 PM",
-                "friday": "9:00 AM - 8:00 PM",
-                "saturday": "9:00 AM - 2:00 PM",
-                "sunday": "Closed"
-            },
-            "social": {
-                "facebook": "https://facebook.com/physiohealth",
-                "instagram": "https://instagram.com/physiohealth",
-                "twitter": "https://twitter.com/physiohealth",
-                "linkedin": "https://linkedin.com/company/physiohealth"
-            },
-            "features": [
-                "30% discount for regular patients",
-                "Online booking available",
-                "Home visit services",
-                "Expert certified physiotherapists",
-                "Modern equipment and techniques"
-            ]
-        }
+        "doctor": name,
+        "slotMinutes": availability.slot_minutes,
+        "days": availability.free_slots(name, start, end)
     }
 
-# Chatbot responses knowledge base
-CHATBOT_RESPONSES = {
+@app.get("/api/reports/summary")
+async def get_report_summary(date_from: Optional[str] = Query(None, alias="from"),
+                             date_to: Optional[str] = Query(None, alias="to")):
+    """Bookings, revenue, discounts and regular-patient share over a date range"""
+    refresh_index()
+    total, _ = revenue.report(None, date_from, date_to)
+    return {"success": True, "from": date_from, "to": date_to, "total": total}
+
+@app.get("/api/reports/{dimension}")
+async def get_report(dimension: str, date_from: Optional[str] = Query(None, alias="from"),
+                     date_to: Optional[str] = Query(None, alias="to")):
+    """Report grouped by `day`, `doctor` or `service`"""
+    if dimension not in DIMENSIONS:
+        raise HTTPException(status_code=404, detail="Report not found")
+    refresh_index()
+    total, groups = revenue.report(dimension, date_from, date_to)
+    return {"success": True, "from": date_from, "to": date_to, "total": total, "groups": groups}
+
+@app.post("/api/admin/reports/rebuild", dependencies=[Depends(require_admin)])
+async def rebuild_reports():
+    """Recompute the revenue rollups (and other log-driven state) from the raw appointments log"""
+    await asyncio.to_thread(storage.resync, COLLECTIONS[APPOINTMENTS_FILE])
+    refresh_index()
+    return {"success": True, **revenue.stats()}
+
+
+# Chatbot responses knowledge base (matcher is rebuilt whenever it changes)
+CHATBOT_RESPONSES = KnowledgeBase({
     "book appointment": {
         "response": "I'd love to help you book an appointment! 📅 To get started, please click the 'Book Appointment' button in our website or provide your preferred date, time, and service. Our team will confirm availability soon.",
-        "suggestedActions": ["View Services", "Check Pricing", "Contact Us"]
+        "suggestedActions": ["View Services", "Check Pricing", "Contact Us"],
+        "aliases": ["appointment", "booking", "schedule", "reserve"]
     },
     "services": {
         "response": "We offer 6 main services: 1) Orthopedic Physiotherapy - ₹1000, 2) Sports Injury Rehab - ₹1500, 3) Neurological PT - ₹2000, 4) Post-Surgical Rehab - ₹1200, 5) Pediatric PT - ₹1500, 6) Geriatric PT - ₹2500. Which service interests you?",
-        "suggestedActions": ["See Pricing", "Book Appointment", "Ask More"]
+        "suggestedActions": ["See Pricing", "Book Appointment", "Ask More"],
+        "aliases": ["service", "treatment", "therapy"]
     },
     "pricing": {
         "response": "Our pricing ranges from ₹1000 to ₹2500 per session depending on the service. Regular patients receive a 30% discount! 💰 For detailed pricing, please visit our services section or contact us directly.",
-        "suggestedActions": ["Book Appointment", "Contact Us", "View Services"]
+        "suggestedActions": ["Book Appointment", "Contact Us", "View Services"],
+        "aliases": ["price", "cost", "fee", "charges", "how much"]
     },
     "contact": {
         "response": "You can reach us at: 📞 Phone: +91-XXXXXXX, 📧 Email: info@physiohealth.com, 🏥 Address: PhysioHealth Clinic, City Center. We're available Mon-Sat, 9 AM - 6 PM.",
-        "suggestedActions": ["Book Appointment", "View Services", "Feedback"]
+        "suggestedActions": ["Book Appointment", "View Services", "Feedback"],
+        "aliases": ["phone", "email", "address", "reach you"]
     },
     "feedback": {
         "response": "We'd love to hear your feedback! 😊 Please share your experience or any suggestions to help us improve our services.",
-        "suggestedActions": ["Book Appointment", "Contact Us", "View Services"]
+        "suggestedActions": ["Book Appointment", "Contact Us", "View Services"],
+        "aliases": ["suggestion", "complaint"]
     },
     "review": {
         "response": "Thank you for considering a review! 🌟 We appreciate your feedback. You can share your experience with us directly through our contact form or via phone.",
-        "suggestedActions": ["Provide Feedback", "Contact Us", "Book Appointment"]
+        "suggestedActions": ["Provide Feedback", "Contact Us", "Book Appointment"],
+        "aliases": ["rating", "testimonial"]
     },
     "discount": {
         "response": "Yes! Regular patients get a 30% discount on all services! 🎉 To qualify, you need to have at least 2 previous appointments with us. Your discount is automatically applied at checkout.",
-        "suggestedActions": ["Book Appointment", "View Pricing", "Contact Us"]
+        "suggestedActions": ["Book Appointment", "View Pricing", "Contact Us"],
+        "aliases": ["offer", "regular patient", "concession"]
     },
     "default": {
         "response": "Thank you for your question! 👋 I'm here to help. Please feel free to ask about our services, pricing, booking appointments, or anything else you'd like to know.",
         "suggestedActions": ["Book Appointment", "Services", "Pricing", "Contact"]
     }
-}
+})
 
 @app.post("/api/chat")
 async def chat(request: dict):
     """Chatbot endpoint for answering queries and collecting feedback"""
     try:
-        user_message = request.get("message", "").lower().strip()
-        
-        # Find matching response
-        response = CHATBOT_RESPONSES["default"].copy()
+        user_message = request.get("message", "").strip()
         
-        for keyword, bot_response in CHATBOT_RESPONSES.items():
-            if keyword != "default" and keyword in user_message:
-                response = bot_response.copy()
-                break
+        # Find the best matching response
+        _, response = CHATBOT_RESPONSES.match(user_message)
         
-        # Save chat message to file
-        chat_file = "data/chat_history.json"
-        chat_data = {
+        # Queue chat message for the buffered log
+        chat_logger.log({
+            "id": new_id("CHAT"),
             "message": request.get("message"),
             "response": response["response"],
             "timestamp": datetime.now().isoformat()
-        }
-        
-        try:
-            with open(chat_file, "r") as f:
-                chat_history = json.load(f)
-        except FileNotFoundError:
-            chat_history = []
-        
-        chat_history.append(chat_data)
-        
-        with open(chat_file, "w") as f:
-            json.dump(chat_history, f, indent=2)
+        })
         
         return {
             "response": response["response"],
@@ -407,13 +739,96 @@ async def chat(request: dict):
             "suggestedActions": ["Contact Us"]
         }
 
-# Serve static files
-app.mount("/", StaticFiles(directory="frontend/physiotherapy", html=True), name="static")
+@app.get("/api/chat/search")
+async def search_chats(q: str = Query(..., min_length=1, max_length=200),
+                       date_from: Optional[str] = Query(None, alias="from"),
+                       date_to: Optional[str] = Query(None, alias="to"),
+                       limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+                       after: Optional[str] = None):
+    """Chat history matching every word of `q`, newest first (indexed as it is flushed)"""
+    return await run_search("chat", "chats", q, date_from, date_to, limit, after)
+
+@app.post("/api/admin/snapshot", dependencies=[Depends(require_admin)])
+async def take_snapshot(full: bool = False):
+    """Snapshot appointments, contacts and chat history while requests go on.
+
+    Incremental unless `full` is set; restore with `python snapshot.py restore <id>`.
+    """
+    # Include the chat messages still buffered in memory
+    await asyncio.to_thread(chat_logger.flush)
+    snapshot = await asyncio.to_thread(create_snapshot, storage, DATA_DIR, SNAPSHOT_DIR, full,
+                                       max_chain=SNAPSHOT_KEEP)
+    pruned = await asyncio.to_thread(prune_snapshots, SNAPSHOT_DIR, SNAPSHOT_KEEP)
+    return {"success": True, "snapshot": snapshot, "pruned": pruned}
+
+@app.get("/api/admin/snapshots", dependencies=[Depends(require_admin)])
+async def get_snapshots():
+    """Complete snapshots, oldest first"""
+    return {"success": True, "snapshots": await asyncio.to_thread(list_snapshots, SNAPSHOT_DIR)}
+
+@app.get("/api/ready")
+async def readiness():
+    """Warm-up progress; 503 until every start-up step has finished"""
+    status = warmup.status()
+    return FastJSONResponse(status, status_code=200 if status["ready"] else 503)
+
+@app.get("/api/admin/startup", dependencies=[Depends(require_admin)])
+async def startup_report():
+    """Seconds from process start to each startup phase, and the warm-up steps"""
+    return {"success": True, **startup_profile.report(), "warmup": warmup.status()}
+
+@app.get("/api/admin/index-stats", dependencies=[Depends(require_admin)])
+async def get_index_stats():
+    """Size and hit counters of the in-memory appointment index"""
+    return {"success": True, "index": appointment_index.stats(), "writer": writer.stats(),
+            "chatLog": chat_logger.stats(), "reports": revenue.stats(),
+            "idempotency": idempotency.stats(), "rateLimit": rate_limiter.stats(),
+            "search": message_search.stats(), "jobs": job_runner.stats()}
+
+@app.get("/api/admin/jobs", dependencies=[Depends(require_admin)])
+async def get_jobs(limit: int = Query(100, ge=1, le=1000)):
+    """Background job counts per state, and the dead-letter list"""
+    return {"success": True, "jobs": await asyncio.to_thread(job_runner.stats),
+            "dead": await asyncio.to_thread(job_queue.dead, limit)}
+
+@app.post("/api/admin/jobs/{job_id}/retry", dependencies=[Depends(require_admin)])
+async def retry_job(job_id: str):
+    """Move a job from the dead-letter list back into the queue"""
+    if not await asyncio.to_thread(job_queue.requeue, job_id):
+        raise HTTPException(status_code=404, detail="No dead job with that ID")
+    job_runner.notify()
+    return {"success": True, "id": job_id}
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus text exposition of request and storage metrics"""
+    return PlainTextResponse(metrics.render(), media_type=prometheus.CONTENT_TYPE)
+
+# Frontend files, fingerprinted and precompressed once at startup (or by
+# the warm-up with lazy startup). Compressed variants are kept on disk so
+# later starts skip the compression; `python static_assets.py` fills the
+# cache ahead of time.
+ASSET_CACHE_DIR = os.environ.get("PHYSIO_ASSET_CACHE_DIR", os.path.join(DATA_DIR, "cache", "assets"))
+static_assets = StaticAssets("frontend/physiotherapy", lazy=LAZY_STARTUP, cache_dir=ASSET_CACHE_DIR)
+
+# The page shell first: it is what a visitor waits on after a cold start
+warmup.step("frontend", static_assets.load)
+warmup.step("appointments", load_appointments)
+warmup.step("contacts", load_contacts)
+warmup.step("chat", load_chat_history)
+
+# Root endpoint and static files
+@app.api_route("/{path:path}", methods=["GET", "HEAD"], include_in_schema=False)
+async def static_file(path: str, request: Request):
+    if not static_assets.built:
+        # Still being built by the warm-up; wait without blocking the event loop
+        await asyncio.to_thread(static_assets.load)
+    asset = static_assets.get(path)
+    if asset is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return asset.to_response(request)
 
-# Root endpoint
-@app.get("/")
-async def root():
-    return FileResponse("frontend/physiotherapy/index.html")
+startup_profile.mark("app")
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,210 @@
+"""
+PhysioHealth - Appointment index
+In-memory lookups for appointments by booking ID, email and date/doctor
+"""
+
+import base64
+import json
+from bisect import bisect_right, insort
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from records import AppointmentRecord
+from storage import DELETE_OP
+
+# A record's place in listings: (createdAt, bookingId, seq). The first two
+# are the same in every worker and survive rebuilds; seq only separates
+# exact duplicates within this process.
+Position = Tuple[str, str, int]
+
+
+def encode_cursor(position: Position) -> str:
+    """Opaque listing cursor for the record at `position`"""
+    raw = json.dumps([position[0], position[1]], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str, float]:
+    """Resume point for `encode_cursor` output; ValueError if malformed"""
+    try:
+        created, booking_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid cursor: {cursor!r}") from None
+    if not isinstance(created, str) or not isinstance(booking_id, str):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    # Sorts after every seq, so duplicates of the cursor's record are skipped too
+    return created, booking_id, float("inf")
+
+
+class AppointmentIndex:
+    """Process-resident index over all stored appointments.
+
+    Records are listed in (createdAt, bookingId) order, which every worker
+    agrees on and which a rebuild (compaction, replace, resync) does not
+    change, so listing cursors built from it stay valid across both.
+    Internally every record also gets a sequence number: the primary index
+    maps bookingId to sequence numbers (normally just one), and the
+    secondary indexes map email and (date, doctor) to sorted lists of
+    positions.
+
+    Records are held as slotted `AppointmentRecord`s; callers convert
+    them with `as_dict` when building a response.
+    """
+
+    def __init__(self):
+        self._records: Dict[int, AppointmentRecord] = {}
+        # All positions in listing order; removed ones are skipped lazily
+        self._order: List[Position] = []
+        self._by_id: Dict[str, List[int]] = {}
+        self._by_email: Dict[str, List[Position]] = {}
+        self._by_slot: Dict[Tuple[str, str], List[Position]] = {}
+        self._next_seq = 0
+        self.hits = 0
+        self.misses = 0
+
+    def build(self, records: list):
+        """Rebuild the index from a full list of records"""
+        self._records.clear()
+        self._order = []
+        self._by_id.clear()
+        self._by_email.clear()
+        self._by_slot.clear()
+        for record in records:
+            self.add(record)
+
+    def apply(self, entries: list, rebuilt: bool = False):
+        """Apply log entries drained from the storage engine"""
+        if rebuilt:
+            self.build(entries)
+            return
+        for entry in entries:
+            if DELETE_OP in entry:
+                self.remove(entry[DELETE_OP]["value"])
+            else:
+                self.add(entry)
+
+    def add(self, record: dict) -> int:
+        if not isinstance(record, AppointmentRecord):
+            record = AppointmentRecord.from_dict(record)
+        seq = self._next_seq
+        self._next_seq += 1
+        self._records[seq] = record
+        position = self._position(seq, record)
+        self._insert(self._order, position)
+        self._by_id.setdefault(record.get("bookingId"), []).append(seq)
+        self._insert(self._by_email.setdefault(self._email_key(record.get("email")), []), position)
+        self._insert(self._by_slot.setdefault(self._slot_key(record.get("date"), record.get("doctor")), []),
+                     position)
+        return seq
+
+    def get(self, booking_id: str) -> Optional[AppointmentRecord]:
+        seqs = self._by_id.get(booking_id)
+        if not seqs:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self._records[seqs[0]]
+
+    def remove(self, booking_id: str) -> Optional[AppointmentRecord]:
+        """Remove the first appointment with this booking ID"""
+        seqs = self._by_id.get(booking_id)
+        if not seqs:
+            self.misses += 1
+            return None
+        self.hits += 1
+        seq = seqs.pop(0)
+        if not seqs:
+            del self._by_id[booking_id]
+        record = self._records.pop(seq)
+        if len(self._order) > 2 * len(self._records) + 1000:
+            self._order = [p for p in self._order if p[2] in self._records]
+        position = self._position(seq, record)
+        self._discard(self._by_email, self._email_key(record.get("email")), position)
+        self._discard(self._by_slot, self._slot_key(record.get("date"), record.get("doctor")), position)
+        return record
+
+    def find_by_email(self, email: str) -> List[AppointmentRecord]:
+        positions = self._by_email.get(self._email_key(email), [])
+        return [self._records[p[2]] for p in positions]
+
+    def find_by_slot(self, date: str, doctor: str) -> List[AppointmentRecord]:
+        positions = self._by_slot.get(self._slot_key(date, doctor), [])
+        return [self._records[p[2]] for p in positions]
+
+    def all(self) -> List[AppointmentRecord]:
+        return list(self._records.values())
+
+    def iter_from(self, after: Optional[tuple] = None) -> Iterator[Tuple[Position, AppointmentRecord]]:
+        """Yield (position, record) in listing order, starting after `after`.
+
+        `after` is a position or a `decode_cursor` result. Safe to consume
+        from another thread while the index is updated; records added
+        meanwhile are included if they sort after the last one yielded,
+        removed ones are skipped.
+        """
+        return self._iter_positions(self._order, after)
+
+    def iter_by_email(self, email: str, after: Optional[tuple] = None) -> Iterator[Tuple[Position, AppointmentRecord]]:
+        return self._iter_positions(self._by_email.get(self._email_key(email), []), after)
+
+    def iter_by_slot(self, date: str, doctor: str, after: Optional[tuple] = None) -> Iterator[Tuple[Position, AppointmentRecord]]:
+        return self._iter_positions(self._by_slot.get(self._slot_key(date, doctor), []), after)
+
+    def _iter_positions(self, positions: List[Position], after: Optional[tuple]) -> Iterator[Tuple[Position, AppointmentRecord]]:
+        i = 0 if after is None else bisect_right(positions, after)
+        last = after
+        while i < len(positions):
+            position = positions[i]
+            if last is not None and position <= last:
+                # Something was inserted before us meanwhile; find our place again
+                i = bisect_right(positions, last)
+                continue
+            i += 1
+            record = self._records.get(position[2])
+            if record is not None:
+                last = position
+                yield position, record
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._records),
+            "bookingIds": len(self._by_id),
+            "emails": len(self._by_email),
+            "slots": len(self._by_slot),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    @staticmethod
+    def _position(seq: int, record: AppointmentRecord) -> Position:
+        return (str(record.get("createdAt") or ""), str(record.get("bookingId") or ""), seq)
+
+    @staticmethod
+    def _insert(positions: List[Position], position: Position):
+        # New bookings almost always sort last
+        if not positions or positions[-1] < position:
+            positions.append(position)
+        else:
+            insort(positions, position)
+
+    @staticmethod
+    def _email_key(email: Optional[str]) -> str:
+        return (email or "").lower()
+
+    @staticmethod
+    def _slot_key(date: Optional[str], doctor: Optional[str]) -> Tuple[str, str]:
+        return (date or "", doctor or "")
+
+    @staticmethod
+    def _discard(index: dict, key, position: Position):
+        positions = index.get(key)
+        if positions is None:
+            return
+        # A new list, so iterators over the old one do not shift
+        positions = [p for p in positions if p != position]
+        if positions:
+            index[key] = positions
+        else:
+            del index[key]
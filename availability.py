@@ -0,0 +1,189 @@
+"""
+PhysioHealth - Slot availability
+Per-doctor, per-day bitmaps of booked appointment slots
+"""
+
+import re
+import threading
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from storage import DELETE_OP
+
+WEEKDAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+
+HOURS_PATTERN = re.compile(
+    r"^\s*(\d{1,2}):(\d{2})\s*([AP]M)\s*-\s*(\d{1,2}):(\d{2})\s*([AP]M)\s*$", re.IGNORECASE
+)
+
+
+def parse_clock(hour: str, minute: str, meridiem: str) -> int:
+    """Minutes after midnight for a 12-hour clock time"""
+    value = int(hour) % 12 * 60 + int(minute)
+    return value + 12 * 60 if meridiem.upper() == "PM" else value
+
+
+def parse_hours(hours: dict) -> Dict[int, Optional[Tuple[int, int]]]:
+    """Map weekday number to (open, close) minutes, or None when closed"""
+    parsed = {}
+    for number, name in enumerate(WEEKDAYS):
+        match = HOURS_PATTERN.match(hours.get(name, ""))
+        if match:
+            parsed[number] = (parse_clock(*match.group(1, 2, 3)),
+                              parse_clock(*match.group(4, 5, 6)))
+        else:
+            parsed[number] = None
+    return parsed
+
+
+class Availability:
+    """Booked-slot bitmaps driven by the clinic's opening hours.
+
+    Slots are `slot_minutes` long and start at opening time; bit `i` of
+    the bitmap for (doctor, date) is set when slot `i` is booked. Rare
+    double bookings (e.g. imported history) are counted separately so a
+    cancellation only frees the slot once every booking in it is gone.
+    Bookings outside opening hours are not tracked.
+
+    The bitmaps follow the appointments log: `apply` is subscribed to the
+    storage engine, and `guard` builds the check that booking appends run
+    under the engine's lock, which makes check-and-book atomic across
+    requests and worker processes.
+    """
+
+    def __init__(self, hours: dict, doctors: List[dict], slot_minutes: int = 60):
+        self.slot_minutes = slot_minutes
+        self._lock = threading.Lock()
+        self._booked: Dict[Tuple[str, str], int] = {}
+        self._extra: Dict[Tuple[str, str, int], int] = {}
+        # bookingId -> booked (doctor, date, slot), so tombstones can free them
+        self._slots_by_id: Dict[str, List[Tuple[str, str, int]]] = {}
+        self.set_catalog(hours, doctors)
+
+    def set_catalog(self, hours: dict, doctors: List[dict]):
+        self._hours = parse_hours(hours)
+        # Bookings store the doctor's name; queries may use the id as well
+        self._doctor_names = {}
+        for doctor in doctors:
+            self._doctor_names[doctor["id"]] = doctor["name"]
+            self._doctor_names[doctor["name"]] = doctor["name"]
+
+    def doctor_name(self, doctor: str) -> Optional[str]:
+        return self._doctor_names.get(doctor)
+
+    @staticmethod
+    def normalize(day: str, time: str) -> Optional[Tuple[str, str]]:
+        """Canonical (YYYY-MM-DD, HH:MM) for a booking's date and time, or None.
+
+        `date.fromisoformat` also takes forms like "20261020" on newer
+        Pythons, and "%H:%M" takes "9:00"; bookings are stored and keyed in
+        the canonical form so one slot never has two spellings.
+        """
+        try:
+            return date.fromisoformat(day).isoformat(), datetime.strptime(time, "%H:%M").strftime("%H:%M")
+        except (TypeError, ValueError):
+            return None
+
+    def slot_index(self, day: str, time: str) -> Optional[int]:
+        """Slot number for a booking, or None if outside opening hours"""
+        try:
+            weekday = date.fromisoformat(day).weekday()
+            clock = datetime.strptime(time, "%H:%M")
+        except (TypeError, ValueError):
+            return None
+        hours = self._hours.get(weekday)
+        if hours is None:
+            return None
+        opens, closes = hours
+        minutes = clock.hour * 60 + clock.minute
+        if minutes < opens or minutes + self.slot_minutes > closes:
+            return None
+        if (minutes - opens) % self.slot_minutes:
+            return None
+        return (minutes - opens) // self.slot_minutes
+
+    def slot_times(self, day: date) -> List[str]:
+        hours = self._hours.get(day.weekday())
+        if hours is None:
+            return []
+        opens, closes = hours
+        return [f"{m // 60:02d}:{m % 60:02d}"
+                for m in range(opens, closes - self.slot_minutes + 1, self.slot_minutes)]
+
+    # Log-driven state
+    def apply(self, entries: list, rebuilt: bool = False):
+        with self._lock:
+            if rebuilt:
+                self._booked.clear()
+                self._extra.clear()
+                self._slots_by_id.clear()
+            for entry in entries:
+                if DELETE_OP in entry:
+                    slots = self._slots_by_id.get(entry[DELETE_OP]["value"])
+                    if slots:
+                        self._unmark(slots.pop(0))
+                        if not slots:
+                            del self._slots_by_id[entry[DELETE_OP]["value"]]
+                    continue
+                doctor = self._doctor_names.get(entry.get("doctor"), entry.get("doctor"))
+                slot = self.slot_index(entry.get("date"), entry.get("time"))
+                if doctor is None or slot is None:
+                    continue
+                # Keyed by the canonical date, also for records stored before
+                # dates were normalised
+                key = (doctor, date.fromisoformat(entry["date"]).isoformat(), slot)
+                self._slots_by_id.setdefault(entry.get("bookingId"), []).append(key)
+                self._mark(key)
+
+    def _mark(self, key: Tuple[str, str, int]):
+        day_key, bit = key[:2], 1 << key[2]
+        booked = self._booked.get(day_key, 0)
+        if booked & bit:
+            self._extra[key] = self._extra.get(key, 0) + 1
+        else:
+            self._booked[day_key] = booked | bit
+
+    def _unmark(self, key: Tuple[str, str, int]):
+        day_key, bit = key[:2], 1 << key[2]
+        if self._extra.get(key):
+            self._extra[key] -= 1
+            if not self._extra[key]:
+                del self._extra[key]
+            return
+        booked = self._booked.get(day_key, 0) & ~bit
+        if booked:
+            self._booked[day_key] = booked
+        else:
+            self._booked.pop(day_key, None)
+
+    def is_free(self, doctor: str, day: str, time: str) -> bool:
+        slot = self.slot_index(day, time)
+        if slot is None:
+            return False
+        day = date.fromisoformat(day).isoformat()
+        return not self._booked.get((doctor, day), 0) & (1 << slot)
+
+    def guard(self, doctor: str, day: str, time: str) -> Callable[[set], bool]:
+        """Check run by the storage engine just before a booking is written"""
+        def check(claims: set) -> bool:
+            key = (doctor, date.fromisoformat(day).isoformat(), self.slot_index(day, time))
+            if key in claims or not self.is_free(doctor, day, time):
+                return False
+            claims.add(key)
+            return True
+        return check
+
+    def free_slots(self, doctor: str, start: date, end: date) -> List[dict]:
+        days = []
+        day = start
+        while day <= end:
+            booked = self._booked.get((doctor, day.isoformat()), 0)
+            times = self.slot_times(day)
+            days.append({
+                "date": day.isoformat(),
+                "open": bool(times),
+                "available": [t for i, t in enumerate(times) if not booked & (1 << i)],
+                "booked": [t for i, t in enumerate(times) if booked & (1 << i)],
+            })
+            day += timedelta(days=1)
+        return days
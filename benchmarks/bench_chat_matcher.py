@@ -0,0 +1,86 @@
+"""
+PhysioHealth - Chatbot matcher benchmark
+Compares the KnowledgeBase automaton with the original linear
+`keyword in message` loop at 10, 100 and 1000 intents.
+
+Usage: python benchmarks/bench_chat_matcher.py [--messages 2000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_matcher import KnowledgeBase
+
+WORDS = ("knee back shoulder neck ankle wrist hip spine posture sports injury "
+         "rehab stretch massage yoga pain swelling surgery fracture sprain "
+         "strain therapy session doctor clinic visit home elderly child").split()
+
+
+def make_intents(count: int, rng: random.Random) -> dict:
+    intents = {}
+    while len(intents) < count:
+        keyword = " ".join(rng.sample(WORDS, 2)) + f" {len(intents)}"
+        intents[keyword] = {
+            "response": f"Answer for {keyword}",
+            "aliases": [f"{rng.choice(WORDS)} alias {len(intents)}"],
+        }
+    intents["default"] = {"response": "Default answer"}
+    return intents
+
+
+def linear_match(intents: dict, message: str) -> dict:
+    """The original app.py loop: first keyword hit in dict order"""
+    user_message = message.lower().strip()
+    response = intents["default"].copy()
+    for keyword, bot_response in intents.items():
+        if keyword != "default" and keyword in user_message:
+            response = bot_response.copy()
+            break
+    return response
+
+
+def make_messages(intents: dict, count: int, rng: random.Random) -> list:
+    keywords = [k for k in intents if k != "default"]
+    messages = []
+    for _ in range(count):
+        filler = " ".join(rng.choices(WORDS, k=12))
+        if rng.random() < 0.7:
+            messages.append(f"hello, {filler} {rng.choice(keywords)} please")
+        else:
+            messages.append(f"hello, {filler}")
+    return messages
+
+
+def timed(fn, messages: list) -> float:
+    started = time.perf_counter()
+    for message in messages:
+        fn(message)
+    return (time.perf_counter() - started) / len(messages) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    print(f"{'intents':>8} {'linear us/msg':>14} {'automaton us/msg':>17} {'build ms':>9}")
+    for count in (10, 100, 1000):
+        intents = make_intents(count, rng)
+        messages = make_messages(intents, args.messages, rng)
+        kb = KnowledgeBase(intents)
+        started = time.perf_counter()
+        kb.match("warm up")
+        build_ms = (time.perf_counter() - started) * 1000
+        linear = timed(lambda m: linear_match(intents, m), messages)
+        automaton = timed(kb.match, messages)
+        print(f"{count:>8} {linear:>14.1f} {automaton:>17.1f} {build_ms:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
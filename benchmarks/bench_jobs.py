@@ -0,0 +1,158 @@
+"""
+PhysioHealth - Background job benchmark
+Books --bookings appointments against the app (in-process) with email
+going through SMTP to the fake sink from notifications.py, which holds
+every message for --smtp-delay seconds. Reports booking latency (the
+emails are queued, not sent, by the request), the time the queue takes to
+drain, job latency from the runner, and what one inline send would have
+added to each booking instead.
+
+Usage: python benchmarks/bench_jobs.py [--bookings 200] [--smtp-delay 0.2] [--fail-rate 0.1] [--concurrency 8]
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def percentile(values: list, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] * 1000 if values else 0.0
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_sink(outbox_dir: str, port: int, delay: float, fail_rate: float):
+    from notifications import OutboxSender, SmtpSink
+
+    sink = SmtpSink(OutboxSender(outbox_dir, "smtp"), delay, fail_rate)
+    started = threading.Event()
+
+    def run():
+        async def serve():
+            server = await sink.start("127.0.0.1", port)
+            started.set()
+            async with server:
+                await server.serve_forever()
+        asyncio.run(serve())
+
+    threading.Thread(target=run, name="smtp-sink", daemon=True).start()
+    started.wait()
+    return sink
+
+
+def slots(availability, doctors: list, count: int):
+    day = date(2027, 1, 4)
+    while True:
+        for time_ in availability.slot_times(day):
+            for doctor in doctors:
+                yield day.isoformat(), time_, doctor
+                count -= 1
+                if count == 0:
+                    return
+        day += timedelta(days=1)
+
+
+async def run(args, app_module) -> dict:
+    import httpx
+
+    app = app_module.app
+    doctors = [doctor["id"] for doctor in app_module.catalog.data["doctors"]]
+    service = app_module.catalog.data["services"][0]
+    bookings = [{"name": f"Patient {i}", "email": f"patient{i}@example.com",
+                 "phone": f"+91 98{i:08d}", "doctor": doctor, "service": service["id"],
+                 "date": day, "time": time_, "originalPrice": service["price"],
+                 "finalPrice": service["price"]}
+                for i, (day, time_, doctor) in enumerate(slots(app_module.availability, doctors,
+                                                                args.bookings))]
+    latencies = []
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            async def book(body: dict):
+                async with semaphore:
+                    started = time.perf_counter()
+                    response = await client.post("/api/appointments", json=body)
+                    latencies.append(time.perf_counter() - started)
+                    if response.status_code != 200:
+                        raise RuntimeError(f"booking failed: {response.status_code} {response.text}")
+
+            started = time.perf_counter()
+            await asyncio.gather(*(book(body) for body in bookings))
+            booked = time.perf_counter() - started
+            # Follow-ups are scheduled after the appointments; only the
+            # confirmations are waited for
+            while True:
+                counts = app_module.job_queue.counts()
+                if counts["due"] == 0 and app_module.job_runner.stats()["running"] == 0:
+                    break
+                await asyncio.sleep(0.05)
+            drained = time.perf_counter() - started
+            stats = app_module.job_runner.stats()
+    return {"latencies": latencies, "booked": booked, "drained": drained, "stats": stats}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--bookings", type=int, default=200)
+    parser.add_argument("--smtp-delay", type=float, default=0.2, help="seconds the sink holds each message")
+    parser.add_argument("--fail-rate", type=float, default=0.1, help="share of messages the sink rejects")
+    parser.add_argument("--concurrency", type=int, default=8, help="bookings in flight at once")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="physio-jobs-")
+    os.makedirs(os.path.join(workdir, "data"))
+    shutil.copy(os.path.join(ROOT, "data", "catalog.json"), os.path.join(workdir, "data"))
+    shutil.copytree(os.path.join(ROOT, "frontend"), os.path.join(workdir, "frontend"))
+    port = free_port()
+    sink = start_sink(os.path.join(workdir, "sink"), port, args.smtp_delay, args.fail_rate)
+    os.chdir(workdir)
+    os.environ.update({"PHYSIO_EMAIL_BACKEND": "smtp", "PHYSIO_SMTP_HOST": "127.0.0.1",
+                       "PHYSIO_SMTP_PORT": str(port), "PHYSIO_JOB_BACKOFF": "0.5",
+                       # Every booking comes from the same client
+                       "PHYSIO_BOOKING_RATE": "1000000000/1"})
+    import app as app_module
+
+    # What a booking would wait for if it sent its confirmation inline
+    inline = []
+    for _ in range(5):
+        started = time.perf_counter()
+        try:
+            app_module.senders["email"].send({"to": "probe@example.com", "subject": "probe", "body": "probe"})
+        except Exception:
+            pass
+        inline.append(time.perf_counter() - started)
+
+    result = asyncio.run(run(args, app_module))
+    latencies, stats = result["latencies"], result["stats"]
+    print(f"{args.bookings} bookings, SMTP sink delay {args.smtp_delay * 1000:.0f} ms, "
+          f"fail rate {args.fail_rate:.0%}, {args.concurrency} in flight\n")
+    print(f"{'':<24} {'p50 ms':>8} {'p99 ms':>8}")
+    print(f"{'booking request':<24} {percentile(latencies, 0.5):>8.1f} {percentile(latencies, 0.99):>8.1f}")
+    print(f"{'inline send (one email)':<24} {percentile(inline, 0.5):>8.1f} {percentile(inline, 0.99):>8.1f}")
+    latency = stats["latency"] or {"p50": 0, "p99": 0}
+    print(f"{'job latency':<24} {latency['p50'] * 1000:>8.1f} {latency['p99'] * 1000:>8.1f}")
+    print(f"\nbooked in {result['booked']:.2f}s, confirmations sent after {result['drained']:.2f}s")
+    print(f"jobs completed {stats['completed']}, retried {stats['retried']}, dead {stats['buried']}; "
+          f"sink accepted {sink.received}, rejected {sink.rejected}")
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+PhysioHealth - JSON response benchmark
+Responses per second for GET /api/appointments at 10k and 100k stored
+appointments, comparing FastAPI's default jsonable_encoder + json path
+with the FastJSONResponse path, for each available JSON backend.
+
+Usage: python benchmarks/bench_json_responses.py [--sizes 10000 100000] [--seconds 3]
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DOCTORS = ("Dr. Priya Sharma", "Dr. Rajesh Kumar", "Dr. Anjali Patel")
+SERVICES = {"orthopedic": 1500.0, "sports": 2000.0, "neuro": 2500.0}
+
+
+def write_appointments(data_dir: str, count: int):
+    rng = random.Random(42)
+    with open(os.path.join(data_dir, "appointments.jsonl"), "w", encoding="utf-8") as f:
+        for i in range(count):
+            service = rng.choice(list(SERVICES))
+            f.write(json.dumps({
+                "name": f"Patient {i}", "email": f"patient{i}@example.com",
+                "phone": f"98{i:08d}", "doctor": rng.choice(DOCTORS), "service": service,
+                "date": f"2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                "time": f"{rng.randint(9, 19):02d}:00", "isRegularPatient": False,
+                "originalPrice": SERVICES[service], "discount": 0, "finalPrice": SERVICES[service],
+                "bookingId": f"PH{i:010d}", "createdAt": "2026-01-01T10:00:00",
+            }, separators=(",", ":")) + "\n")
+
+
+def rate(client, url: str, seconds: float) -> float:
+    client.get(url)
+    count, started = 0, time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        assert client.get(url).status_code == 200
+        count += 1
+    return count / (time.perf_counter() - started)
+
+
+def run(count: int, seconds: float):
+    """Measure one backend (chosen by PHYSIO_JSON) in a scratch directory"""
+    from fastapi.responses import JSONResponse
+    from fastapi.testclient import TestClient
+
+    import app as physio
+    from fast_json import BACKEND
+    from listing import paginate
+
+    async def default_path(limit: int = 1000):
+        # What the endpoint did before: a dict through jsonable_encoder + json
+        appointments, _ = paginate(physio.appointment_index.iter_from(None), lambda r: True, limit)
+        return {"success": True, "count": len(appointments), "appointments": appointments,
+                "nextCursor": None}
+
+    physio.app.add_api_route("/bench/default", default_path, response_class=JSONResponse)
+    # Ahead of the static files mount at "/"
+    physio.app.router.routes.insert(0, physio.app.router.routes.pop())
+
+    with TestClient(physio.app) as client:
+        for limit in (100, 1000, count):
+            default = rate(client, f"/bench/default?limit={limit}", seconds)
+            fast = rate(client, f"/api/appointments?limit={min(limit, 1000)}"
+                        if limit <= 1000 else "/api/appointments", seconds)
+            print(f"{count:>8} {limit:>7} {BACKEND:>7} {default:>12.1f} {fast:>12.1f} "
+                  f"{fast / default:>7.1f}x", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--run", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run(args.run, args.seconds)
+        return
+
+    try:
+        import orjson  # noqa: F401
+        backends = ("stdlib", "orjson")
+    except ImportError:
+        backends = ("stdlib",)
+    print(f"{'records':>8} {'limit':>7} {'backend':>7} {'default r/s':>12} {'fast r/s':>12} {'speedup':>8}")
+    for count in args.sizes:
+        for backend in backends:
+            workdir = tempfile.mkdtemp()
+            try:
+                os.makedirs(os.path.join(workdir, "data"))
+                shutil.copy(os.path.join(ROOT, "data", "catalog.json"), os.path.join(workdir, "data"))
+                shutil.copytree(os.path.join(ROOT, "frontend"), os.path.join(workdir, "frontend"))
+                write_appointments(os.path.join(workdir, "data"), count)
+                env = dict(os.environ, PHYSIO_JSON=backend, PHYSIO_STORAGE="jsonl")
+                subprocess.run([sys.executable, os.path.abspath(__file__), "--run", str(count),
+                                "--seconds", str(args.seconds)], cwd=workdir, env=env, check=True)
+            finally:
+                shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+PhysioHealth - Patient statistics benchmark
+Compares the PatientColumns NumPy queries with plain loops over the
+list of record dicts, at 1M patients by default.
+
+Usage: python benchmarks/bench_patient_stats.py [--rows 1000000]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from patient_repo import PatientRepository
+from patient_stats import PatientColumns
+
+DISEASES = ("Diabetes", "Pneumonia", "Heart Disease", "Asthma", "Fracture",
+            "Hypertension", "Arthritis", "Migraine", "Kidney Stone", "Tuberculosis")
+BLOOD_GROUPS = ("A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-")
+
+
+def make_patients(count: int, rng: random.Random) -> list:
+    return [{
+        "patient_id": i,
+        "name": f"Patient {i}",
+        "age": rng.randint(0, 95),
+        "gender": rng.choice(("Male", "Female")),
+        "disease": rng.choice(DISEASES),
+        "blood_group": rng.choice(BLOOD_GROUPS),
+        "admission_date": f"{rng.randint(2020, 2025)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        "readmitted": rng.random() < 0.2,
+    } for i in range(1, count + 1)]
+
+
+# The list-of-dicts versions a client crunching /view would write
+def naive_counts(data, field):
+    return Counter(p[field] for p in data)
+
+
+def naive_readmission(data, field):
+    totals, again = defaultdict(int), defaultdict(int)
+    for p in data:
+        totals[p[field]] += 1
+        again[p[field]] += p["readmitted"]
+    return {key: again[key] / totals[key] for key in totals}
+
+
+def naive_age_histogram(data, width):
+    return Counter(p["age"] // width for p in data)
+
+
+def naive_per_month(data):
+    return Counter(p["admission_date"][:7] for p in data)
+
+
+def timed(fn, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    data = make_patients(args.rows, random.Random(42))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "patients.json")
+        with open(path, "w") as f:
+            json.dump(data, f)
+        repo = PatientRepository(path)
+        records = repo.all()
+        columns = PatientColumns(repo)
+        build_ms = timed(columns.refresh, repeat=1)
+
+        queries = (
+            ("counts by gender", lambda: naive_counts(records, "gender"),
+             lambda: columns.counts("gender")),
+            ("readmission by disease", lambda: naive_readmission(records, "disease"),
+             lambda: columns.readmission_rates("disease")),
+            ("age histogram", lambda: naive_age_histogram(records, 10),
+             lambda: columns.age_histogram(10)),
+            ("admissions per month", lambda: naive_per_month(records),
+             columns.admissions_per_month),
+        )
+        print(f"{args.rows} patients, columnar build {build_ms:.0f} ms")
+        print(f"{'query':<24} {'dicts ms':>9} {'numpy ms':>9} {'speedup':>8}")
+        for name, naive, columnar in queries:
+            naive_ms, columnar_ms = timed(naive), timed(columnar)
+            print(f"{name:<24} {naive_ms:>9.1f} {columnar_ms:>9.2f} {naive_ms / columnar_ms:>7.0f}x")
+
+        extra = make_patients(1000, random.Random(7))
+        for patient in extra:
+            patient["patient_id"] += args.rows
+        repo.append(extra)
+        append_ms = timed(columns.refresh, repeat=1)
+        print(f"refresh after appending 1000 rows: {append_ms:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+PhysioHealth - Rate limiter benchmark
+Per-request cost of the rate limiter (memory and SQLite bucket stores),
+measured at the ASGI middleware, and a check that the SQLite store holds
+one limit across several worker processes.
+
+Usage: python benchmarks/bench_rate_limit.py [--requests 200000] [--clients 10000] [--workers 4]
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rate_limit import (MemoryBuckets, RateLimit, RateLimiter, RateLimitMiddleware,
+                        SqliteBuckets)
+
+
+async def endpoint(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def per_request(app, requests: int, clients: int) -> float:
+    """Mean microseconds per request through `app`"""
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    scopes = [{"type": "http", "method": "POST", "path": "/api/chat", "headers": [],
+               "client": (f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}", 5000)}
+              for i in range(clients)]
+    started = time.perf_counter()
+    for n in range(requests):
+        await app(scopes[n % clients], receive, send)
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+def take_many(db_path: str, takes: int, barrier) -> int:
+    store = SqliteBuckets(db_path)
+    limit = RateLimit("chat", 50, 3600)
+    barrier.wait()
+    allowed = sum(1 for _ in range(takes) if store.take(limit, "chat 10.0.0.1", time.time()) == 0)
+    store.close()
+    return allowed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200_000)
+    parser.add_argument("--clients", type=int, default=10_000)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+    workdir = tempfile.mkdtemp(prefix="physio-ratelimit-")
+
+    baseline = asyncio.run(per_request(endpoint, args.requests, args.clients))
+    print(f"{'store':<8} {'us/request':>11} {'overhead us':>12}")
+    print(f"{'none':<8} {baseline:>11.2f} {0:>12.2f}")
+    for name, store in (("memory", MemoryBuckets()),
+                        ("sqlite", SqliteBuckets(os.path.join(workdir, "bench.db")))):
+        limiter = RateLimiter(store)
+        # Generous enough that no benchmark request is refused
+        limiter.limit("POST", "/api/chat", RateLimit("chat", 1_000_000, 1))
+        app = RateLimitMiddleware(endpoint, limiter)
+        requests = args.requests if name == "memory" else args.requests // 10
+        cost = asyncio.run(per_request(app, requests, args.clients))
+        print(f"{name:<8} {cost:>11.2f} {cost - baseline:>12.2f}")
+        store.close()
+
+    # 50 requests per hour for one client, hammered from every worker at once
+    db_path = os.path.join(workdir, "shared.db")
+    SqliteBuckets(db_path).close()
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Manager().Barrier(args.workers)
+    with context.Pool(args.workers) as pool:
+        allowed = pool.starmap(take_many, [(db_path, 1000, barrier)] * args.workers)
+    print(f"\nshared limit 50/hour across {args.workers} workers x 1000 requests: "
+          f"allowed {sum(allowed)} ({allowed})")
+    ok = sum(allowed) == 50
+    print("OK" if ok else "FAILED: the limit was not shared")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
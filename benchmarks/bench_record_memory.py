@@ -0,0 +1,95 @@
+"""
+PhysioHealth - Record memory benchmark
+Measures resident bytes per record (tracemalloc) for appointments and
+patients held as plain dicts versus the slotted records in records.py.
+
+Usage: python benchmarks/bench_record_memory.py [--sizes 100000 1000000]
+"""
+
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from records import AppointmentRecord, PatientRecord
+
+DOCTORS = ("Dr. Priya Sharma", "Dr. Rajesh Kumar", "Dr. Anjali Patel")
+SERVICES = {"orthopedic": 1500.0, "sports": 2000.0, "neuro": 2500.0,
+            "post-surgery": 1800.0, "pediatric": 1200.0, "geriatric": 1000.0}
+DISEASES = ("Diabetes", "Pneumonia", "Heart Disease", "Asthma", "Fracture")
+BLOOD_GROUPS = ("A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-")
+
+
+def appointment_lines(count: int, rng: random.Random) -> list:
+    """One JSON line per appointment, as in the appointments log"""
+    lines = []
+    for i in range(count):
+        service = rng.choice(list(SERVICES))
+        regular = rng.random() < 0.3
+        price = SERVICES[service]
+        discount = price * 0.3 if regular else 0
+        lines.append(json.dumps({
+            "name": f"Patient {i}", "email": f"patient{i}@example.com",
+            "phone": f"98{i:08d}", "doctor": rng.choice(DOCTORS), "service": service,
+            "date": f"2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            "time": f"{rng.randint(9, 19):02d}:00", "isRegularPatient": regular,
+            "originalPrice": price, "discount": discount, "finalPrice": price - discount,
+            "bookingId": f"PH{i:010d}", "createdAt": f"2026-01-01T10:{i % 60:02d}:00",
+        }))
+    return lines
+
+
+def patients_document(count: int, rng: random.Random) -> str:
+    """The whole patients.json array"""
+    return json.dumps([{
+        "patient_id": i, "name": f"Patient {i}", "age": rng.randint(0, 95),
+        "gender": rng.choice(("Male", "Female")), "disease": rng.choice(DISEASES),
+        "blood_group": rng.choice(BLOOD_GROUPS),
+        "admission_date": f"{rng.randint(2020, 2025)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        "readmitted": rng.random() < 0.2,
+    } for i in range(1, count + 1)])
+
+
+def retained_bytes(build) -> int:
+    """Bytes still allocated once `build()` has returned its result"""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    args = parser.parse_args()
+
+    print(f"{'records':<22} {'dict B/rec':>11} {'compact B/rec':>14} {'saved':>6}")
+    for count in args.sizes:
+        rng = random.Random(42)
+        lines = appointment_lines(count, rng)
+        plain = retained_bytes(lambda: [json.loads(line) for line in lines])
+        compact = retained_bytes(lambda: [AppointmentRecord.from_dict(json.loads(line))
+                                          for line in lines])
+        print(f"{f'{count} appointments':<22} {plain / count:>11.0f} {compact / count:>14.0f} "
+              f"{1 - compact / plain:>6.0%}")
+        del lines
+
+        document = patients_document(count, rng)
+        plain = retained_bytes(lambda: json.loads(document))
+        compact = retained_bytes(lambda: json.loads(document, object_hook=PatientRecord.from_dict))
+        print(f"{f'{count} patients':<22} {plain / count:>11.0f} {compact / count:>14.0f} "
+              f"{1 - compact / plain:>6.0%}")
+        del document
+
+
+if __name__ == "__main__":
+    main()
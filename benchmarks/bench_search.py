@@ -0,0 +1,95 @@
+"""
+PhysioHealth - Message search benchmark
+Indexes synthetic contact messages into search.MessageSearch and reports
+indexing throughput and query latency (median and p95 over repeated
+queries) for exact, multi-word, prefix and date-filtered searches.
+
+Usage: python benchmarks/bench_search.py [--messages 1000000] [--repeat 50]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search import MessageSearch
+
+WORDS = ("pain knee back shoulder neck ankle hip wrist elbow injury sports running "
+         "appointment booking cancel reschedule invoice payment insurance refund doctor "
+         "physiotherapy session exercise stretch massage posture surgery recovery swelling "
+         "morning evening weekend monday tuesday friday saturday parking address phone "
+         "email question thanks urgent follow home visit price discount regular patient").split()
+SUBJECTS = ("Appointment question", "Billing", "Feedback", "Treatment enquiry", "Home visit")
+
+QUERIES = (
+    ("common word", "pain", None),
+    ("two words", "knee swelling", None),
+    ("three words", "back pain morning", None),
+    ("rare word", "zygomatic", None),
+    ("prefix", "physio*", None),
+    ("short prefix", "sw*", None),
+    ("one week", "invoice", ("2025-03-01", "2025-03-07")),
+    ("since date", "invoice", ("2024-06-01", None)),
+    ("until date", "invoice", (None, "2024-03-01")),
+)
+
+
+def messages(count: int, rng: random.Random):
+    start = datetime(2024, 1, 1)
+    step = timedelta(days=730) / count
+    weights = [1 / (rank + 1) for rank in range(len(WORDS))]
+    for i in range(count):
+        words = rng.choices(WORDS, weights, k=rng.randint(8, 30))
+        if i % 100_000 == 7:
+            words.append("zygomatic")
+        yield {
+            "name": f"Visitor {i}", "email": f"visitor{i % 50_000}@example.com",
+            "subject": rng.choice(SUBJECTS), "message": " ".join(words),
+            "id": f"MSG{i:012d}", "createdAt": (start + step * i).isoformat(timespec="seconds"),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--batch", type=int, default=10_000)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix="physio-search-"), "search.db")
+    search = MessageSearch(db_path)
+    rng = random.Random(42)
+    started = time.perf_counter()
+    batch = []
+    for message in messages(args.messages, rng):
+        batch.append(message)
+        if len(batch) >= args.batch:
+            search.add("contact", batch)
+            batch = []
+    search.add("contact", batch)
+    elapsed = time.perf_counter() - started
+    size = sum(os.path.getsize(db_path + suffix) for suffix in ("", "-wal") if os.path.exists(db_path + suffix))
+    print(f"indexed {args.messages:,} messages in {elapsed:.1f}s "
+          f"({args.messages / elapsed:,.0f}/s), {size / 1e6:.0f} MB on disk\n")
+
+    print(f"{'query':<14} {'q':<20} {'hits':>5} {'median ms':>10} {'p95 ms':>8}")
+    for label, text, dates in QUERIES:
+        date_from, date_to = dates or (None, None)
+        timings = []
+        for _ in range(args.repeat):
+            t = time.perf_counter()
+            results, _ = search.search("contact", text, date_from, date_to, limit=50)
+            timings.append((time.perf_counter() - t) * 1000)
+        timings.sort()
+        print(f"{label:<14} {text:<20} {len(results):>5} {timings[len(timings) // 2]:>10.2f} "
+              f"{timings[int(len(timings) * 0.95) - 1]:>8.2f}")
+    search.close()
+
+
+if __name__ == "__main__":
+    main()
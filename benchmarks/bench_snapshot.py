@@ -0,0 +1,154 @@
+"""
+PhysioHealth - Snapshot benchmark
+Builds a data directory with about --gigabytes of appointments (JSONL
+engine), then times a full snapshot while a thread keeps appending contact
+messages (reporting append latency with and without the snapshot running),
+an incremental snapshot after more messages, and a restore into an empty
+directory, which is checked byte for byte against the captured data.
+
+Writes go to the small contacts log so the benchmark process does not
+have to hold the whole appointments log in memory the way a server does.
+
+Usage: python benchmarks/bench_snapshot.py [--gigabytes 1] [--workers 4] [--level 3]
+"""
+
+import argparse
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from snapshot import create_snapshot, read_manifest, restore_snapshot
+from storage import create_engine, encode
+
+
+def appointment(i: int) -> dict:
+    return {
+        "name": f"Patient {i}", "email": f"patient{i % 100_000}@example.com",
+        "phone": f"+91 98{i % 100_000_000:08d}", "doctor": ("Dr. Sarah Johnson", "Dr. Michael Chen")[i % 2],
+        "service": ("sports", "back-pain", "post-surgery", "neuro")[i % 4],
+        "date": f"20{24 + i % 6}-{1 + i % 12:02d}-{1 + i % 28:02d}", "time": f"{9 + i % 8:02d}:00",
+        "isRegularPatient": i % 3 == 0, "originalPrice": 1500.0, "discount": 10.0 * (i % 3 == 0),
+        "finalPrice": 1350.0 if i % 3 == 0 else 1500.0, "bookingId": f"PH{i:024d}",
+        "status": "confirmed", "createdAt": f"2026-01-01T{i % 24:02d}:{i % 60:02d}:00",
+    }
+
+
+def generate(data_dir: str, target_bytes: int) -> int:
+    os.makedirs(data_dir, exist_ok=True)
+    count = 0
+    with open(os.path.join(data_dir, "appointments.jsonl"), "wb") as f:
+        while f.tell() < target_bytes:
+            f.write(b"".join(encode(appointment(count + i)) for i in range(10_000)))
+            count += 10_000
+    return count
+
+
+def percentile(values: list, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] * 1000 if values else 0.0
+
+
+def write_while(storage, done: threading.Event, first: int) -> list:
+    """Append latencies in seconds, writing messages until `done` is set"""
+    latencies = []
+    i = first
+    while not done.is_set():
+        started = time.perf_counter()
+        storage.append("contacts", {"id": f"MSG{i:012d}", "name": f"Visitor {i}",
+                                    "email": "visitor@example.com", "subject": "Billing",
+                                    "message": "Is my invoice ready? " * 4})
+        latencies.append(time.perf_counter() - started)
+        i += 1
+    return latencies
+
+
+def timed_writes(storage, seconds: float, first: int) -> list:
+    done = threading.Event()
+    threading.Timer(seconds, done.set).start()
+    return write_while(storage, done, first)
+
+
+def file_sha256(path: str, size: int) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while size > 0:
+            chunk = f.read(min(1 << 20, size))
+            digest.update(chunk)
+            size -= len(chunk)
+    return digest.hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--gigabytes", type=float, default=1.0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--level", type=int, default=3)
+    parser.add_argument("--dir", default=None, help="work directory (default: a temp dir)")
+    args = parser.parse_args()
+    workdir = args.dir or tempfile.mkdtemp(prefix="physio-snapshot-")
+    data_dir = os.path.join(workdir, "data")
+    dest = os.path.join(workdir, "snapshots")
+    restored = os.path.join(workdir, "restored")
+
+    started = time.perf_counter()
+    count = generate(data_dir, int(args.gigabytes * 1e9))
+    size = os.path.getsize(os.path.join(data_dir, "appointments.jsonl"))
+    print(f"generated {count:,} appointments, {size / 1e9:.2f} GB in {time.perf_counter() - started:.1f}s")
+
+    storage = create_engine("jsonl", data_dir)
+    idle = timed_writes(storage, 2.0, 0)
+    written = len(idle)
+
+    # Full snapshot with writes going on
+    done = threading.Event()
+    busy = []
+    writer = threading.Thread(target=lambda: busy.extend(write_while(storage, done, written)))
+    writer.start()
+    full = create_snapshot(storage, data_dir, dest, full=True, level=args.level, workers=args.workers)
+    done.set()
+    writer.join()
+    written += len(busy)
+    print(f"\nfull snapshot: {full['bytes'] / 1e9:.2f} GB -> {full['stored'] / 1e6:.0f} MB "
+          f"in {full['seconds']:.1f}s ({full['bytes'] / 1e6 / full['seconds']:.0f} MB/s)")
+    print(f"{'appends':<18} {'count':>7} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for label, latencies in (("without snapshot", idle), ("during snapshot", busy)):
+        print(f"{label:<18} {len(latencies):>7} {percentile(latencies, 0.5):>8.2f} "
+              f"{percentile(latencies, 0.99):>8.2f} {percentile(latencies, 1.0):>8.2f}")
+
+    # Incremental snapshot after some more writes
+    written += len(timed_writes(storage, 2.0, written))
+    incremental = create_snapshot(storage, data_dir, dest, level=args.level, workers=args.workers)
+    print(f"\nincremental snapshot: copied {incremental['copied'] / 1e6:.2f} MB "
+          f"of {incremental['bytes'] / 1e9:.2f} GB in {incremental['seconds']:.2f}s")
+    storage.close()
+
+    restore = restore_snapshot(dest, incremental["id"], restored, args.workers)
+    print(f"\nrestore: {restore['bytes'] / 1e9:.2f} GB from {restore['parts']} parts "
+          f"in {restore['seconds']:.1f}s ({restore['bytes'] / 1e6 / restore['seconds']:.0f} MB/s)")
+
+    manifest = read_manifest(dest, incremental["id"])
+    mismatched = [name for name, entry in manifest["files"].items()
+                  if file_sha256(os.path.join(data_dir, name), entry["size"])
+                  != file_sha256(os.path.join(restored, name), entry["size"])
+                  or os.path.getsize(os.path.join(restored, name)) != entry["size"]]
+    restored_storage = create_engine("jsonl", restored)
+    records = sum(1 for _ in restored_storage.iter_records("appointments"))
+    messages = len(restored_storage.load("contacts"))
+    restored_storage.close()
+    print(f"restored {records:,} appointments and {messages:,} contact messages")
+    ok = not mismatched and records == count and messages == written
+    print("OK" if ok else f"FAILED: mismatched={mismatched} appointments={records}/{count} "
+                          f"messages={messages}/{written}")
+    if args.dir is None:
+        shutil.rmtree(workdir)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+PhysioHealth - Worker scaling benchmark
+Runs the patient API in 1..N worker processes over a generated patients
+file, once with every worker holding its own parsed records and once with
+the memory-mapped shared cache (PHYSIO_SHARED_CACHE=1, as serve.py runs
+it), and reports read throughput and per-worker memory. PSS counts shared
+pages once across the workers, so it is the number that should stay flat.
+
+Usage: python benchmarks/bench_workers.py [--patients 200000] [--workers 1 2 4] [--seconds 5]
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DISEASES = ("Diabetes", "Pneumonia", "Asthma", "Hypertension", "Fracture", "Migraine")
+
+
+def generate(path: str, count: int):
+    rng = random.Random(7)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[\n")
+        for i in range(1, count + 1):
+            height = round(rng.uniform(1.4, 2.0), 2)
+            weight = round(rng.uniform(40, 120), 1)
+            record = {
+                "patient_id": i, "name": f"Patient {rng.randrange(10 ** 9)}", "age": rng.randint(1, 95),
+                "gender": rng.choice(("Male", "Female")), "disease": rng.choice(DISEASES),
+                "blood_group": rng.choice(("A+", "B+", "O+", "AB+", "O-")),
+                "admission_date": f"202{rng.randint(0, 5)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                "readmitted": rng.random() < 0.2, "height": height, "weight": weight,
+                "bmi": round(weight / height ** 2, 1),
+            }
+            f.write(("  " if i == 1 else ",\n  ") + json.dumps(record))
+        f.write("\n]\n")
+
+
+def memory() -> dict:
+    """RSS, PSS and private (USS) kilobytes of this process"""
+    values = {}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                name, _, rest = line.partition(":")
+                if name in ("Rss", "Pss", "Private_Clean", "Private_Dirty"):
+                    values[name] = int(rest.split()[0])
+    except FileNotFoundError:  # not Linux
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return {"rss": rss, "pss": rss, "uss": rss}
+    return {"rss": values["Rss"], "pss": values["Pss"],
+            "uss": values["Private_Clean"] + values["Private_Dirty"]}
+
+
+async def call(app, path: str, query: str = "") -> int:
+    status = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app({"type": "http", "method": "GET", "path": path, "raw_path": path.encode(),
+               "query_string": query.encode(), "headers": [], "root_path": "",
+               "scheme": "http", "server": ("bench", 80), "client": ("127.0.0.1", 1)},
+              receive, send)
+    return status
+
+
+async def serve_reads(app, patients: int, seconds: float, rng: random.Random) -> int:
+    # Warm up: load the records and build (or map) the sort orders
+    for field in ("age", "name", "bmi"):
+        await call(app, "/patients", f"sort_by={field}&limit=1")
+    requests = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        roll = rng.random()
+        if roll < 0.8:
+            status = await call(app, f"/patient/{rng.randint(1, patients)}")
+        elif roll < 0.9:
+            status = await call(app, "/patients", "sort_by=age&order=desc&limit=20")
+        else:
+            status = await call(app, "/patients", "sort_by=name&limit=20")
+        if status != 200:
+            raise RuntimeError(f"unexpected status {status}")
+        requests += 1
+    return requests
+
+
+def worker(env: dict, patients: int, seconds: float, barrier, seed: int) -> dict:
+    os.environ.update(env)
+    import main
+
+    # Every worker is loaded and warm before any of them is measured
+    asyncio.run(serve_reads(main.app, patients, 0, random.Random(seed)))
+    barrier.wait()
+    requests = asyncio.run(serve_reads(main.app, patients, seconds, random.Random(seed)))
+    result = {"requests": requests, **memory()}
+    barrier.wait()  # keep every mapping alive until all workers have measured
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--patients", type=int, default=200_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="physio-workers-")
+    patients_file = os.path.join(workdir, "patients.json")
+    generate(patients_file, args.patients)
+    print(f"{args.patients:,} patients, {os.path.getsize(patients_file) / 1e6:.0f} MB of JSON, "
+          f"{os.cpu_count()} CPUs\n")
+
+    context = multiprocessing.get_context("spawn")
+    print(f"{'mode':<8} {'workers':>7} {'req/s':>9} {'scaling':>8} "
+          f"{'RSS MB/w':>9} {'PSS MB/w':>9} {'USS MB/w':>9} {'PSS total':>10}")
+    for mode in ("private", "shared"):
+        env = {"PHYSIO_PATIENTS_FILE": patients_file,
+               "PHYSIO_SHARED_CACHE": "1" if mode == "shared" else "0",
+               "PHYSIO_SHARED_CACHE_DIR": os.path.join(workdir, "shared")}
+        single = None
+        for workers in args.workers:
+            barrier = context.Manager().Barrier(workers)
+            with context.Pool(workers) as pool:
+                results = pool.starmap(worker, [(env, args.patients, args.seconds, barrier, seed)
+                                                for seed in range(workers)])
+            throughput = sum(r["requests"] for r in results) / args.seconds
+            single = single or throughput / workers
+            average = {key: sum(r[key] for r in results) / workers / 1024 for key in ("rss", "pss", "uss")}
+            print(f"{mode:<8} {workers:>7} {throughput:>9,.0f} {throughput / single:>7.2f}x "
+                  f"{average['rss']:>9.1f} {average['pss']:>9.1f} {average['uss']:>9.1f} "
+                  f"{average['pss'] * workers:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+PhysioHealth - Double-booking load test
+Several worker processes, each running app.py in-process, fire thousands
+of concurrent bookings at the same doctor/date/time. Exactly one may win.
+
+Usage: python benchmarks/booking_race.py [--workers 4] [--attempts 1000] [--engine jsonl]
+Requires httpx (already needed by FastAPI's TestClient).
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def worker(workdir: str, engine: str, worker_id: int, attempts: int, barrier):
+    os.chdir(workdir)
+    os.environ["PHYSIO_STORAGE"] = engine
+    # Every attempt comes from the same client; only the slot guard may refuse
+    os.environ["PHYSIO_BOOKING_RATE"] = "1000000000/1"
+    import httpx
+    import app as clinic
+
+    async def run():
+        transport = httpx.ASGITransport(app=clinic.app)
+        async with clinic.app.router.lifespan_context(clinic.app):
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                barrier.wait()
+                started = time.perf_counter()
+                responses = await asyncio.gather(*[
+                    client.post("/api/appointments", json={
+                        "name": "Race", "email": "race@example.com", "phone": "1",
+                        "doctor": "Dr. Priya Sharma", "service": "sports",
+                        "date": "2030-01-07", "time": "10:00",
+                        "originalPrice": 0, "finalPrice": 0,
+                        "bookingId": f"RACE-{worker_id}-{i}",
+                    })
+                    for i in range(attempts)
+                ])
+                elapsed = time.perf_counter() - started
+                availability = await client.get(
+                    "/api/availability", params={"doctor": "dr-priya", "from": "2030-01-07", "to": "2030-01-07"}
+                )
+        codes = [r.status_code for r in responses]
+        return codes.count(200), codes.count(409), len(codes), elapsed, availability.json()
+
+    return asyncio.run(run())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--attempts", type=int, default=1000, help="attempts per worker")
+    parser.add_argument("--engine", default="jsonl", choices=["jsonl", "sqlite"])
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="physio-race-")
+    os.makedirs(os.path.join(workdir, "data"))
+    shutil.copy(os.path.join(ROOT, "data", "catalog.json"), os.path.join(workdir, "data"))
+    shutil.copytree(os.path.join(ROOT, "frontend"), os.path.join(workdir, "frontend"))
+
+    manager = multiprocessing.Manager()
+    barrier = manager.Barrier(args.workers)
+    with multiprocessing.get_context("spawn").Pool(args.workers) as pool:
+        results = pool.starmap(worker, [
+            (workdir, args.engine, i, args.attempts, barrier) for i in range(args.workers)
+        ])
+
+    won = sum(r[0] for r in results)
+    rejected = sum(r[1] for r in results)
+    total = sum(r[2] for r in results)
+    slowest = max(r[3] for r in results)
+    print(f"engine={args.engine} workers={args.workers} attempts={total}")
+    print(f"booked={won} rejected={rejected} other={total - won - rejected}")
+    print(f"slowest worker: {slowest:.2f}s ({total / slowest:.0f} attempts/s overall)")
+    booked_views = {tuple(r[4]["days"][0]["booked"]) for r in results}
+    print(f"booked slots seen by workers: {sorted(booked_views)}")
+
+    ok = won == 1 and rejected == total - 1 and booked_views == {("10:00",)}
+    print("OK" if ok else "FAILED: slot was double-booked or requests errored")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
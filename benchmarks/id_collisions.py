@@ -0,0 +1,81 @@
+"""
+PhysioHealth - ID collision test
+Several worker processes, each with a few threads, generate millions of IDs
+with ids.new_id at the same time; every ID must be unique and each thread's
+IDs strictly increasing. Workers are forked from a parent that has already
+generated IDs, so they also check that children do not repeat its sequence.
+
+Usage: python benchmarks/id_collisions.py [--workers 8] [--threads 2] [--ids 500000]
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ids import ID_LENGTH, new_id
+
+
+def worker(threads: int, count: int, barrier) -> list:
+    """IDs from each thread, as one newline-joined string per thread"""
+    results = [None] * threads
+    start = threading.Barrier(threads)
+
+    def generate(slot: int):
+        start.wait()
+        results[slot] = "\n".join([new_id() for _ in range(count)])
+
+    barrier.wait()
+    pool = [threading.Thread(target=generate, args=(i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--threads", type=int, default=2, help="threads per worker")
+    parser.add_argument("--ids", type=int, default=500_000, help="IDs per thread")
+    args = parser.parse_args()
+
+    # Advance the parent's sequence so forked children inherit live state
+    parent_ids = [new_id() for _ in range(1000)]
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in methods else None)
+    barrier = context.Manager().Barrier(args.workers)
+
+    started = time.perf_counter()
+    with context.Pool(args.workers) as pool:
+        batches = pool.starmap(worker, [(args.threads, args.ids, barrier)] * args.workers)
+    elapsed = time.perf_counter() - started
+
+    seen = set(parent_ids)
+    total = len(parent_ids)
+    unordered = malformed = 0
+    for batch in batches:
+        for joined in batch:
+            ids = joined.split("\n")
+            total += len(ids)
+            seen.update(ids)
+            unordered += sum(1 for a, b in zip(ids, ids[1:]) if a >= b)
+            malformed += sum(1 for value in ids if len(value) != ID_LENGTH)
+
+    generated = args.workers * args.threads * args.ids
+    collisions = total - len(seen)
+    print(f"workers={args.workers} threads={args.threads} ids={generated:,}")
+    print(f"generated in {elapsed:.2f}s ({generated / elapsed:,.0f} IDs/s across workers)")
+    print(f"collisions={collisions} out_of_order={unordered} malformed={malformed}")
+    ok = collisions == 0 and unordered == 0 and malformed == 0
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
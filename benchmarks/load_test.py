@@ -0,0 +1,335 @@
+"""
+PhysioHealth - Load test
+Seeds a scratch data directory with 1k/10k/100k appointments and contact
+messages, drives synthetic booking, contact, chat and lookup traffic at
+app.py and reports throughput and p50/p95/p99 latency per endpoint. Results
+are written as JSON; pass an earlier file as --baseline to compare runs.
+
+The app runs in-process over ASGI by default (--target asgi), or as a local
+uvicorn server (--target uvicorn). --url points the traffic at a server that
+is already running, whose data is left as it is.
+
+Usage: python benchmarks/load_test.py [--sizes 1000 10000 100000] [--requests 2000]
+                                      [--concurrency 16] [--output load_results.json]
+                                      [--baseline previous.json]
+Requires httpx (already needed by FastAPI's TestClient).
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Seeded bookings start here; generated bookings continue after them
+FIRST_DAY = date(2031, 1, 6)
+
+CHAT_MESSAGES = (
+    "What are your opening hours?", "How much does sports physiotherapy cost?",
+    "I have back pain after running", "Can I book an appointment for tomorrow?",
+    "Do you offer home visits?", "Which doctor treats knee injuries?",
+)
+
+ENDPOINTS = ("book", "get_appointment", "list_by_email", "contact", "list_contacts", "chat")
+
+# All traffic comes from one address, so lift the per-client rate limits
+UNLIMITED = {"PHYSIO_CHAT_RATE": "1000000000/1", "PHYSIO_CONTACT_RATE": "1000000000/1",
+             "PHYSIO_BOOKING_RATE": "1000000000/1"}
+
+
+def slots(catalog: dict):
+    """Every bookable (doctor, date, time) from FIRST_DAY on, in order"""
+    from availability import Availability
+    availability = Availability(catalog["clinic"]["hours"], catalog["doctors"])
+    doctors = [d["name"] for d in catalog["doctors"]]
+    day = FIRST_DAY
+    while True:
+        for slot in availability.slot_times(day):
+            for doctor in doctors:
+                yield doctor, day.isoformat(), slot
+        day += timedelta(days=1)
+
+
+def appointment(i: int, slot: tuple, services: list, rng: random.Random) -> dict:
+    doctor, day, clock = slot
+    return {
+        "name": f"Patient {i}", "email": f"patient{i % 5000}@example.com",
+        "phone": f"98{i:08d}", "doctor": doctor, "service": rng.choice(services),
+        "date": day, "time": clock, "isRegularPatient": rng.random() < 0.3,
+        "originalPrice": 0, "discount": 0, "finalPrice": 0,
+        "bookingId": f"LT{i:010d}", "createdAt": datetime(2030, 1, 1, 10).isoformat(),
+    }
+
+
+def contact(i: int) -> dict:
+    return {
+        "name": f"Visitor {i}", "email": f"visitor{i % 5000}@example.com",
+        "subject": "Appointment question", "message": "Could you call me back about a booking?",
+        "id": f"MSG{i:010d}", "createdAt": datetime(2030, 1, 1, 10).isoformat(),
+    }
+
+
+def seed(workdir: str, engine: str, size: int):
+    """A data directory holding `size` appointments and contact messages"""
+    from storage import create_engine
+
+    data_dir = os.path.join(workdir, "data")
+    os.makedirs(data_dir)
+    shutil.copy(os.path.join(ROOT, "data", "catalog.json"), data_dir)
+    shutil.copytree(os.path.join(ROOT, "frontend"), os.path.join(workdir, "frontend"))
+    with open(os.path.join(data_dir, "catalog.json"), encoding="utf-8") as f:
+        catalog = json.load(f)
+
+    rng = random.Random(size)
+    services = [s["id"] for s in catalog["services"]]
+    free = slots(catalog)
+    storage = create_engine(engine, data_dir)
+    storage.replace("appointments", [appointment(i, next(free), services, rng) for i in range(size)])
+    storage.replace("contacts", [contact(i) for i in range(size)])
+    storage.close()
+
+
+class Plan:
+    """Builds request `n` for each endpoint; bookings take fresh slots"""
+
+    def __init__(self, size: int, seeded: bool):
+        with open(os.path.join(ROOT, "data", "catalog.json"), encoding="utf-8") as f:
+            catalog = json.load(f)
+        self.services = [s["id"] for s in catalog["services"]]
+        self.size = size
+        self.seeded = seeded
+        self.free = slots(catalog)
+        # Skip the seeded slots so new bookings do not collide with them
+        for _ in range(size if seeded else 0):
+            next(self.free)
+        self.rng = random.Random(0)
+        self.run_id = f"{os.getpid()}{int(time.time())}"
+
+    def request(self, endpoint: str, n: int):
+        """(method, url, json body or None)"""
+        rng = self.rng
+        known = rng.randrange(max(self.size, 1))
+        if endpoint == "book":
+            body = appointment(n, next(self.free), self.services, rng)
+            body["bookingId"] = f"LT{self.run_id}-{n}"
+            return "POST", "/api/appointments", body
+        if endpoint == "get_appointment":
+            return "GET", f"/api/appointments/LT{known:010d}", None
+        if endpoint == "list_by_email":
+            return "GET", f"/api/appointments?email=patient{known % 5000}@example.com", None
+        if endpoint == "contact":
+            body = contact(n)
+            del body["id"], body["createdAt"]
+            return "POST", "/api/contact", body
+        if endpoint == "list_contacts":
+            return "GET", "/api/contact?limit=100", None
+        if endpoint == "chat":
+            return "POST", "/api/chat", {"message": rng.choice(CHAT_MESSAGES)}
+        raise ValueError(f"Unknown endpoint: {endpoint}")
+
+
+def percentile(ordered: list, fraction: float) -> float:
+    """Nearest-rank percentile of an ascending list"""
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+async def drive(client, plan: Plan, endpoint: str, requests: int, concurrency: int) -> dict:
+    """Send `requests` requests from `concurrency` concurrent clients"""
+    latencies, errors, counter = [], 0, iter(range(requests))
+
+    async def client_loop():
+        nonlocal errors
+        for n in counter:
+            method, url, body = plan.request(endpoint, n)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, url, json=body)
+                ok = response.status_code < 400
+            except Exception:
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            errors += not ok
+
+    # Warm up caches and lazily built indexes before timing
+    for n in range(min(20, requests)):
+        method, url, body = plan.request(endpoint, requests + n)
+        await client.request(method, url, json=body)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[client_loop() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "endpoint": endpoint, "requests": len(latencies), "errors": errors,
+        "seconds": round(elapsed, 4), "throughput": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "max_ms": round(latencies[-1] * 1000, 3),
+    }
+
+
+async def run_endpoints(client, plan: Plan, args) -> list:
+    results = []
+    for endpoint in args.endpoints:
+        result = await drive(client, plan, endpoint, args.requests, args.concurrency)
+        result["size"] = plan.size if plan.seeded else None
+        print_result(result, args.target)
+        results.append(result)
+    return results
+
+
+def asgi_worker(workdir: str, size: int, args) -> list:
+    """Runs in a fresh process: app.py keeps module-level state"""
+    os.chdir(workdir)
+    os.environ["PHYSIO_STORAGE"] = args.engine
+    os.environ.update(UNLIMITED)
+    import httpx
+    import app as clinic
+
+    async def run():
+        transport = httpx.ASGITransport(app=clinic.app)
+        async with clinic.app.router.lifespan_context(clinic.app):
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await run_endpoints(client, Plan(size, seeded=True), args)
+
+    return asyncio.run(run())
+
+
+async def http_run(url: str, size: int, seeded: bool, args) -> list:
+    import httpx
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        return await run_endpoints(client, Plan(size, seeded), args)
+
+
+def uvicorn_run(workdir: str, size: int, args) -> list:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    env = dict(os.environ, PHYSIO_STORAGE=args.engine, **UNLIMITED,
+               PYTHONPATH=os.pathsep.join(filter(None, (ROOT, os.environ.get("PYTHONPATH")))))
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port),
+         "--workers", str(args.workers), "--log-level", "warning"],
+        cwd=workdir, env=env,
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.time() + 60
+        while True:
+            try:
+                with socket.create_connection(("127.0.0.1", port), timeout=1):
+                    break
+            except OSError:
+                if server.poll() is not None or time.time() > deadline:
+                    raise RuntimeError("uvicorn did not start")
+                time.sleep(0.2)
+        return asyncio.run(http_run(url, size, True, args))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def print_result(result: dict, target: str):
+    size = "-" if result["size"] is None else result["size"]
+    print(f"{target:>8} {size:>7} {result['endpoint']:>16} {result['throughput']:>9.1f} "
+          f"{result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f} "
+          f"{result['errors']:>6}", flush=True)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, check=True,
+                              capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def compare(baseline_path: str, results: list):
+    """Throughput and p95 changes against an earlier results file"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    before = {(r["target"], r["size"], r["endpoint"]): r for r in baseline["results"]}
+    print(f"\ncompared with {baseline_path} ({baseline['meta'].get('commit') or 'unknown commit'})")
+    print(f"{'target':>8} {'size':>7} {'endpoint':>16} {'req/s':>9} {'p95':>9}")
+    for result in results:
+        old = before.get((result["target"], result["size"], result["endpoint"]))
+        if old is None:
+            continue
+        throughput = result["throughput"] / old["throughput"] - 1 if old["throughput"] else 0
+        p95 = result["p95_ms"] / old["p95_ms"] - 1 if old["p95_ms"] else 0
+        size = "-" if result["size"] is None else result["size"]
+        print(f"{result['target']:>8} {size:>7} {result['endpoint']:>16} "
+              f"{throughput:>+9.1%} {p95:>+9.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000],
+                        help="seeded appointments and contact messages")
+    parser.add_argument("--requests", type=int, default=2000, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--endpoints", nargs="+", default=list(ENDPOINTS), choices=ENDPOINTS)
+    parser.add_argument("--target", default="asgi", choices=["asgi", "uvicorn"])
+    parser.add_argument("--url", help="load an already running server instead (no seeding)")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers")
+    parser.add_argument("--engine", default="jsonl", choices=["jsonl", "sqlite"])
+    parser.add_argument("--output", default="load_results.json")
+    parser.add_argument("--baseline", help="earlier results file to compare with")
+    args = parser.parse_args()
+    if args.url:
+        args.target = "url"
+
+    print(f"{'target':>8} {'size':>7} {'endpoint':>16} {'req/s':>9} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>6}")
+    results = []
+    if args.url:
+        results += asyncio.run(http_run(args.url.rstrip("/"), 0, False, args))
+    else:
+        for size in args.sizes:
+            workdir = tempfile.mkdtemp(prefix="physio-load-")
+            try:
+                seed(workdir, args.engine, size)
+                if args.target == "asgi":
+                    with multiprocessing.get_context("spawn").Pool(1) as pool:
+                        results += pool.apply(asgi_worker, (workdir, size, args))
+                else:
+                    results += uvicorn_run(workdir, size, args)
+            finally:
+                shutil.rmtree(workdir)
+    for result in results:
+        result["target"] = args.target
+
+    from fast_json import BACKEND
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"), "commit": git_commit(),
+            "python": platform.python_version(), "platform": platform.platform(),
+            "target": args.target, "url": args.url, "engine": args.engine,
+            "json": BACKEND, "concurrency": args.concurrency, "requests": args.requests,
+            "workers": args.workers if args.target == "uvicorn" else 1,
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nresults written to {args.output}")
+    if args.baseline:
+        compare(args.baseline, results)
+
+
+if __name__ == "__main__":
+    main()
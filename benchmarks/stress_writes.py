@@ -0,0 +1,90 @@
+"""
+PhysioHealth - Write stress test
+Several worker processes book appointments concurrently against one data
+directory; afterwards every booking must be present exactly once.
+
+Usage: python benchmarks/stress_writes.py [--workers 4] [--bookings 2000] [--engine jsonl]
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from appointment_index import AppointmentIndex
+from storage import create_engine
+from writer import StorageWriter
+
+
+def worker(engine: str, data_dir: str, worker_id: int, bookings: int, barrier):
+    storage = create_engine(engine, data_dir)
+    index = AppointmentIndex()
+
+    def refresh():
+        storage.poll("appointments", blocking=False)
+        index.apply(*storage.drain("appointments"))
+
+    async def run():
+        writer = StorageWriter(storage, on_commit=refresh)
+        writer.start()
+        await asyncio.gather(*[
+            writer.append("appointments", {"bookingId": f"W{worker_id}-{i}",
+                                           "email": f"p{i}@example.com"})
+            for i in range(bookings)
+        ])
+        await writer.stop()
+        return writer.stats()
+
+    stats = asyncio.run(run())
+    barrier.wait()
+    # Every worker must be able to catch up on the others' writes
+    storage.poll("appointments")
+    index.apply(*storage.drain("appointments"))
+    storage.close()
+    return worker_id, stats, len(index)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--bookings", type=int, default=2000, help="bookings per worker")
+    parser.add_argument("--engine", default="jsonl", choices=["jsonl", "sqlite"])
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix="physio-stress-")
+    expected = args.workers * args.bookings
+    manager = multiprocessing.Manager()
+    barrier = manager.Barrier(args.workers)
+
+    started = time.perf_counter()
+    with multiprocessing.Pool(args.workers) as pool:
+        results = pool.starmap(worker, [
+            (args.engine, data_dir, i, args.bookings, barrier) for i in range(args.workers)
+        ])
+    elapsed = time.perf_counter() - started
+
+    storage = create_engine(args.engine, data_dir)
+    records = storage.load("appointments")
+    storage.close()
+    ids = [r["bookingId"] for r in records]
+
+    print(f"engine={args.engine} workers={args.workers} bookings={expected}")
+    print(f"elapsed={elapsed:.2f}s rate={expected / elapsed:.0f} bookings/s")
+    for worker_id, stats, indexed in results:
+        print(f"  worker {worker_id}: {stats['ops']} ops in {stats['batches']} batches,"
+              f" index sees {indexed}")
+    print(f"stored={len(records)} unique={len(set(ids))}")
+
+    ok = (len(records) == expected and len(set(ids)) == expected
+          and all(indexed == expected for _, _, indexed in results))
+    print("OK" if ok else "FAILED: writes were lost or duplicated")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+PhysioHealth - Clinic catalog
+Services, doctors and clinic information loaded from data/catalog.json
+"""
+
+import json
+import os
+import threading
+from typing import Dict, Optional
+
+from http_cache import CachedResponse
+
+
+class Catalog:
+    """Static clinic catalog served from pre-serialised responses.
+
+    The catalog file is read once; every endpoint body is serialised,
+    hashed and compressed up front. `reload` rebuilds everything, and
+    `reload_if_changed` does so only when the file's mtime has moved.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.data: dict = {}
+        self.responses: Dict[str, CachedResponse] = {}
+        self._mtime: Optional[float] = None
+        self._lock = threading.Lock()
+        self.reload()
+
+    def reload(self):
+        with self._lock:
+            mtime = os.path.getmtime(self.path)
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.responses = {
+                "services": self._build({"success": True, "services": data["services"]}),
+                "doctors": self._build({"success": True, "doctors": data["doctors"]}),
+                "clinic-info": self._build({"success": True, "clinic": data["clinic"]}),
+            }
+            self.data = data
+            self._mtime = mtime
+
+    def reload_if_changed(self) -> bool:
+        if os.path.getmtime(self.path) == self._mtime:
+            return False
+        self.reload()
+        return True
+
+    @staticmethod
+    def _build(payload: dict) -> CachedResponse:
+        body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        return CachedResponse(body)
+
+    def service_prices(self) -> Dict[str, float]:
+        return {service["id"]: service["price"] for service in self.data["services"]}
@@ -0,0 +1,181 @@
+"""
+PhysioHealth - Chat log
+Buffered, rotating JSON-Lines log for chatbot conversations
+"""
+
+import json
+import os
+import queue
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Callable, Iterator, List, Optional
+
+from fast_json import dumps, loads
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process locking only
+    fcntl = None
+
+# Written next to the segments once the legacy chat_history.json is imported
+IMPORTED_MARKER = ".legacy-imported"
+
+
+class ChatLogger:
+    """Collects chat messages in memory and flushes them in batches.
+
+    `log` never blocks: messages go into a bounded queue, and when the
+    queue is full the message is dropped and counted instead of delaying
+    the reply. A background thread flushes the queue every
+    `flush_interval` seconds (or as soon as `batch_size` messages are
+    waiting) into segments named `chat-YYYY-MM-DD-NNN.jsonl`, starting a
+    new segment each day or once a segment exceeds `max_segment_bytes`.
+
+    `on_flush(entries)` runs on the flush thread after each batch is
+    written, e.g. to index the messages for search.
+    """
+
+    def __init__(self, log_dir: str, flush_interval: float = 1.0,
+                 batch_size: int = 500, max_segment_bytes: int = 16 * 1024 * 1024,
+                 queue_size: int = 10000, recent_size: int = 1000,
+                 on_flush: Optional[Callable[[list], None]] = None):
+        self.log_dir = log_dir
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_segment_bytes = max_segment_bytes
+        self.on_flush = on_flush
+        self.written = 0
+        self.dropped = 0
+        self.segment_count = 0
+        self.recent = deque(maxlen=recent_size)
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        os.makedirs(log_dir, exist_ok=True)
+        self.segment_count = len(self.segments())
+
+    def log(self, entry: dict) -> bool:
+        """Queue a message for writing; returns False if it was dropped"""
+        self.recent.append(entry)
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        if self._queue.qsize() >= self.batch_size:
+            self._wake.set()
+        return True
+
+    def segments(self) -> List[str]:
+        """Paths of all segments, oldest first"""
+        names = sorted(n for n in os.listdir(self.log_dir)
+                       if n.startswith("chat-") and n.endswith(".jsonl"))
+        return [os.path.join(self.log_dir, n) for n in names]
+
+    def entries(self) -> Iterator[dict]:
+        """Every message written so far, oldest segment first"""
+        for path in self.segments():
+            with open(path, "rb") as f:
+                for line in f:
+                    if line.endswith(b"\n"):
+                        yield loads(line)
+
+    def _segment_path(self, day: str) -> str:
+        segments = self.segments()
+        # Other workers add segments too, so recount whenever we list them
+        self.segment_count = len(segments)
+        existing = [p for p in segments if os.path.basename(p).startswith(f"chat-{day}-")]
+        if existing:
+            latest = existing[-1]
+            if os.path.getsize(latest) < self.max_segment_bytes:
+                return latest
+            number = int(os.path.basename(latest)[len(f"chat-{day}-"):-len(".jsonl")]) + 1
+        else:
+            number = 1
+        self.segment_count += 1
+        return os.path.join(self.log_dir, f"chat-{day}-{number:03d}.jsonl")
+
+    def _write(self, batch: list):
+        by_day = {}
+        for entry in batch:
+            day = (entry.get("timestamp") or datetime.now().isoformat())[:10]
+            by_day.setdefault(day, []).append(entry)
+        for day, entries in by_day.items():
+            with open(self._segment_path(day), "ab") as f:
+                f.write(b"".join(
+                    dumps(e) + b"\n"
+                    for e in entries
+                ))
+
+    def flush(self):
+        """Write everything queued so far"""
+        with self._flush_lock:
+            batch = []
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return
+            self._write(batch)
+            self.written += len(batch)
+            if self.on_flush is not None:
+                self.on_flush(batch)
+
+    def import_legacy(self, filepath: str) -> int:
+        """Copy a legacy JSON-array history into the segments, once.
+
+        A marker file records the import, so it happens once even when
+        several workers start together or segments already exist. Returns
+        how many messages were imported.
+        """
+        marker = os.path.join(self.log_dir, IMPORTED_MARKER)
+        with self._flush_lock, open(marker + ".lock", "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            if os.path.exists(marker):
+                return 0
+            try:
+                with open(filepath, "r", encoding="utf-8") as f:
+                    history = json.load(f)
+            except (FileNotFoundError, ValueError):
+                history = []
+            # Oldest first, as they were appended
+            self._write(history)
+            with open(marker, "w") as f:
+                f.write(f"{len(history)}\n")
+            return len(history)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="chat-log", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def close(self):
+        """Stop the flush thread and write anything still queued"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "segments": self.segment_count,
+        }
@@ -0,0 +1,139 @@
+"""
+PhysioHealth - Chatbot keyword matcher
+Aho-Corasick automaton over the chatbot knowledge base
+"""
+
+from collections import deque
+from typing import Dict, Iterator, List, MutableMapping, Optional, Tuple
+
+DEFAULT_INTENT = "default"
+
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton finding every keyword in a single pass"""
+
+    def __init__(self, keywords: List[str]):
+        self.keywords = keywords
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+        for keyword_id, keyword in enumerate(keywords):
+            state = 0
+            for char in keyword:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[state][char] = next_state
+                state = next_state
+            self._out[state].append(keyword_id)
+
+        # Breadth-first pass to link each state to its longest proper suffix
+        pending = deque(self._goto[0].values())
+        while pending:
+            state = pending.popleft()
+            for char, next_state in self._goto[state].items():
+                pending.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._out[next_state] = self._out[next_state] + self._out[self._fail[next_state]]
+
+    def _transition(self, state: int, char: str) -> int:
+        # Follow failure links once, then cache the result as a direct edge
+        fallback = state
+        while fallback and char not in self._goto[fallback]:
+            fallback = self._fail[fallback]
+        next_state = self._goto[fallback].get(char, 0)
+        self._goto[state][char] = next_state
+        return next_state
+
+    def find(self, text: str) -> Iterator[Tuple[int, int]]:
+        """Yield (keyword id, end position) for every occurrence in `text`"""
+        goto, out = self._goto, self._out
+        state = 0
+        for position, char in enumerate(text):
+            next_state = goto[state].get(char)
+            state = self._transition(state, char) if next_state is None else next_state
+            for keyword_id in out[state]:
+                yield keyword_id, position
+
+
+class KnowledgeBase(MutableMapping):
+    """Chatbot intents with a keyword matcher rebuilt whenever they change.
+
+    Each intent maps to a dict with a `response`, optional
+    `suggestedActions`, optional `aliases` (synonyms that also trigger
+    the intent) and an optional `weight` added to its score. The intent
+    name itself is always one of its keywords; the `default` intent is
+    used when nothing matches.
+
+    An intent's score is the total length of the distinct keywords found
+    (longer phrases are more specific) plus its `weight`; ties go to the
+    intent whose first keyword appears earliest in the message.
+    """
+
+    def __init__(self, intents: Optional[dict] = None):
+        self._intents: Dict[str, dict] = dict(intents or {})
+        self._automaton: Optional[KeywordAutomaton] = None
+        self._keyword_intents: List[str] = []
+
+    def __getitem__(self, intent: str) -> dict:
+        return self._intents[intent]
+
+    def __setitem__(self, intent: str, entry: dict):
+        self._intents[intent] = entry
+        self.invalidate()
+
+    def __delitem__(self, intent: str):
+        del self._intents[intent]
+        self.invalidate()
+
+    def __iter__(self):
+        return iter(self._intents)
+
+    def __len__(self) -> int:
+        return len(self._intents)
+
+    def invalidate(self):
+        """Force a rebuild, e.g. after editing an entry's aliases in place"""
+        self._automaton = None
+
+    def _build(self) -> KeywordAutomaton:
+        keywords = []
+        self._keyword_intents = []
+        for intent, entry in self._intents.items():
+            if intent == DEFAULT_INTENT:
+                continue
+            for keyword in {intent, *entry.get("aliases", [])}:
+                keywords.append(keyword.lower())
+                self._keyword_intents.append(intent)
+        self._automaton = KeywordAutomaton(keywords)
+        return self._automaton
+
+    def rank(self, message: str) -> List[Tuple[str, float]]:
+        """All matching intents with their scores, best first"""
+        automaton = self._automaton or self._build()
+        matched: Dict[str, Dict[int, None]] = {}
+        first_seen: Dict[str, int] = {}
+        for keyword_id, position in automaton.find(message.lower()):
+            intent = self._keyword_intents[keyword_id]
+            matched.setdefault(intent, {})[keyword_id] = None
+            first_seen.setdefault(intent, position)
+
+        scored = []
+        for intent, keyword_ids in matched.items():
+            score = sum(len(automaton.keywords[k]) for k in keyword_ids)
+            score += self._intents[intent].get("weight", 0)
+            scored.append((intent, score))
+        scored.sort(key=lambda item: (-item[1], first_seen[item[0]]))
+        return scored
+
+    def match(self, message: str) -> Tuple[str, dict]:
+        """Best intent for the message, falling back to the default intent"""
+        ranked = self.rank(message)
+        intent = ranked[0][0] if ranked else DEFAULT_INTENT
+        return intent, self._intents[intent]
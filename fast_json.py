@@ -0,0 +1,114 @@
+"""
+PhysioHealth - JSON encoding
+Compact JSON through orjson when installed, with a stdlib fallback and
+pass-through of records that are already serialised
+"""
+
+import json
+import os
+import uuid
+from datetime import date, datetime, time
+from typing import Optional
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from records import CompactRecord
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the stdlib encoder is always available
+    orjson = None
+
+# PHYSIO_JSON=stdlib forces the fallback even when orjson is installed
+BACKEND = "orjson" if orjson is not None and os.environ.get("PHYSIO_JSON") != "stdlib" else "stdlib"
+
+# orjson >= 3.9.15 splices pre-encoded fragments itself
+_FRAGMENT = getattr(orjson, "Fragment", None) if BACKEND == "orjson" else None
+
+
+class RawJSON:
+    """A record that is already encoded, emitted verbatim by `dumps`.
+
+    `get` parses the record on first use, so filters work without
+    decoding records they never look at.
+    """
+
+    __slots__ = ("data", "_record")
+
+    def __init__(self, data: bytes, record: Optional[dict] = None):
+        self.data = data.rstrip(b"\n")
+        self._record = record
+
+    def record(self) -> dict:
+        if self._record is None:
+            self._record = loads(self.data)
+        return self._record
+
+    def get(self, key: str, default=None):
+        return self.record().get(key, default)
+
+
+def _default(value):
+    if isinstance(value, CompactRecord):
+        return value.to_dict()
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    if _FRAGMENT is not None and isinstance(value, RawJSON):
+        return _FRAGMENT(value.data)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _encode(value, default) -> bytes:
+    if BACKEND == "orjson":
+        return orjson.dumps(value, default=default)
+    return json.dumps(value, default=default, ensure_ascii=False,
+                      separators=(",", ":")).encode("utf-8")
+
+
+def dumps(value) -> bytes:
+    """Compact UTF-8 JSON; RawJSON values are copied in without re-encoding"""
+    if _FRAGMENT is not None:
+        return _encode(value, _default)
+
+    # Encode raw records as placeholder strings, then swap their bytes in
+    fragments = []
+    nonce = uuid.uuid4().hex
+
+    def default(item):
+        if isinstance(item, RawJSON):
+            fragments.append(item.data)
+            return f"{nonce}:{len(fragments) - 1}"
+        return _default(item)
+
+    body = _encode(value, default)
+    if not fragments:
+        return body
+    parts = body.split(f'"{nonce}:'.encode())
+    out = [parts[0]]
+    for part in parts[1:]:
+        index, _, rest = part.partition(b'"')
+        out.append(fragments[int(index)])
+        out.append(rest)
+    return b"".join(out)
+
+
+def loads(data):
+    if BACKEND == "orjson":
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with `dumps`.
+
+    Set as the apps' default response class; hot endpoints return it
+    directly so FastAPI's jsonable_encoder pass is skipped as well.
+    """
+
+    def render(self, content) -> bytes:
+        return dumps(content)
@@ -175,6 +175,46 @@ function initBookingForm() {
     updatePrice();
   });
 
+  // Only offer times the clinic is open and the doctor is free
+  const dateInput = document.getElementById("appointment-date");
+  const doctorSelect = document.getElementById("doctor-select");
+  const timeSelect = document.getElementById("appointment-time");
+  const bookingError = document.getElementById("booking-error");
+  dateInput.addEventListener("change", updateTimeOptions);
+  doctorSelect.addEventListener("change", updateTimeOptions);
+
+  async function updateTimeOptions() {
+    const day = dateInput.value;
+    const hours = day ? CLINIC_HOURS[new Date(day + "T00:00:00").getDay()] : undefined;
+    let booked = [];
+    if (day && hours && doctorSelect.value) {
+      try {
+        const params = new URLSearchParams({ doctor: doctorSelect.value, from: day, to: day });
+        const response = await fetch(`/api/availability?${params}`);
+        if (response.ok) {
+          booked = (await response.json()).days[0].booked;
+        }
+      } catch (error) {
+        // Opening hours alone still rule out most bad choices
+      }
+    }
+    for (const option of timeSelect.options) {
+      if (!option.value) continue;
+      const hour = parseInt(option.value);
+      const open = hours !== undefined && hours !== null && hour >= hours[0] && hour < hours[1];
+      option.disabled = Boolean(day) && (!open || booked.includes(option.value));
+      option.hidden = option.disabled;
+    }
+    if (timeSelect.selectedOptions[0] && timeSelect.selectedOptions[0].disabled) {
+      timeSelect.value = "";
+    }
+  }
+
+  function showBookingError(message) {
+    bookingError.textContent = message;
+    bookingError.hidden = false;
+  }
+
   function updatePrice() {
     const selectedService = serviceSelect.value;
     let basePrice = servicePrices[selectedService] || 1500;
@@ -198,6 +238,17 @@ function initBookingForm() {
     }
   }
 
+  // One key per booking attempt: kept across resubmissions of the same
+  // details, so a retry after a lost response is not booked twice, and
+  // dropped once the booking succeeds or the form is edited
+  let idempotencyKey = null;
+  const forgetIdempotencyKey = () => {
+    idempotencyKey = null;
+  };
+  bookingForm.addEventListener("input", forgetIdempotencyKey);
+  bookingForm.addEventListener("change", forgetIdempotencyKey);
+  bookingForm.addEventListener("reset", forgetIdempotencyKey);
+
   // Form submission
   bookingForm.addEventListener("submit", async function (e) {
     e.preventDefault();
@@ -224,35 +275,58 @@ function initBookingForm() {
       originalPrice: basePrice,
       discount: isRegular ? basePrice * 0.3 : 0,
       finalPrice: finalPrice,
-      bookingId: generateBookingId(),
       createdAt: new Date().toISOString(),
     };
 
-    // Try to save to backend
+    if (!idempotencyKey) idempotencyKey = generateBookingId();
+    bookingError.hidden = true;
+
+    // Only a booking the server accepted is confirmed to the patient
     try {
-      const response = await fetch("/api/appointments", {
+      const response = await postWithRetries("/api/appointments", {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
+          "Idempotency-Key": idempotencyKey,
         },
         body: JSON.stringify(booking),
       });
 
       if (response.ok) {
+        // The booking ID is assigned by the server
+        const result = await response.json();
+        booking.bookingId = result.bookingId;
+        idempotencyKey = null;
         showBookingConfirmation(booking);
       } else {
-        // If backend fails, still show confirmation (for demo)
-        showBookingConfirmation(booking);
-        saveToLocalStorage(booking);
+        // e.g. 409 when the slot was just taken, 400 outside opening hours
+        const result = await response.json().catch(() => ({}));
+        showBookingError(errorMessage(result.detail));
+        updateTimeOptions();
       }
     } catch (error) {
-      // Fallback to localStorage
-      showBookingConfirmation(booking);
-      saveToLocalStorage(booking);
+      showBookingError(
+        "We could not reach the clinic. Please try again, or call us to book.",
+      );
     }
   });
 }
 
+// Network failures are retried with the same request, which is safe for
+// bookings because every attempt carries the same Idempotency-Key
+const RETRY_DELAYS_MS = [1000, 3000];
+
+async function postWithRetries(url, options) {
+  for (let attempt = 0; ; attempt++) {
+    try {
+      return await fetch(url, options);
+    } catch (error) {
+      if (attempt >= RETRY_DELAYS_MS.length) throw error;
+      await new Promise((resolve) => setTimeout(resolve, RETRY_DELAYS_MS[attempt]));
+    }
+  }
+}
+
 function generateBookingId() {
   return (
     "PH" +
@@ -261,10 +335,25 @@ function generateBookingId() {
   );
 }
 
-function saveToLocalStorage(booking) {
-  const bookings = JSON.parse(localStorage.getItem("physioBookings") || "[]");
-  bookings.push(booking);
-  localStorage.setItem("physioBookings", JSON.stringify(bookings));
+// Opening hours per weekday (0 = Sunday) as [first hour, closing hour],
+// matching data/catalog.json; the server has the final say
+const CLINIC_HOURS = {
+  0: null,
+  1: [9, 20],
+  2: [9, 20],
+  3: [9, 20],
+  4: [9, 20],
+  5: [9, 20],
+  6: [9, 14],
+};
+
+function errorMessage(detail) {
+  if (typeof detail === "string") return detail;
+  if (Array.isArray(detail) && detail.length) {
+    // Request validation errors
+    return detail.map((item) => item.msg).join(". ");
+  }
+  return "Sorry, we could not book this appointment. Please try again.";
 }
 
 function showBookingConfirmation(booking) {
@@ -0,0 +1,122 @@
+"""
+PhysioHealth - HTTP caching helpers
+Pre-serialised, precompressed responses with strong ETags
+"""
+
+import gzip
+import hashlib
+import os
+from typing import Dict, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+# Preferred order when the client accepts several encodings
+ENCODINGS = ("br", "gzip")
+
+
+def negotiate_encoding(accept_encoding: str, available) -> Optional[str]:
+    """Pick the best encoding from `available` allowed by an Accept-Encoding header"""
+    accepted = set()
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(name.strip().lower())
+    for encoding in ENCODINGS:
+        if encoding in available and (encoding in accepted or "*" in accepted):
+            return encoding
+    return None
+
+
+def compress(body: bytes) -> Dict[str, bytes]:
+    """Compressed variants of `body`, keeping only those that are smaller"""
+    variants = {"gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(body, quality=11)
+    return {name: data for name, data in variants.items() if len(data) < len(body)}
+
+
+def compress_cached(body: bytes, cache_dir: Optional[str]) -> Dict[str, bytes]:
+    """`compress(body)`, reusing variants saved in `cache_dir` by an earlier run.
+
+    Files are named by the body's hash, so a changed body never picks up
+    stale variants. An empty file records a variant that was not smaller.
+    The cache is an optimisation only: a directory that cannot be read or
+    written just means compressing again.
+    """
+    if not cache_dir:
+        return compress(body)
+    encodings = ENCODINGS if brotli is not None else ("gzip",)
+    base = os.path.join(cache_dir, hashlib.sha256(body).hexdigest())
+    variants = {}
+    try:
+        for encoding in encodings:
+            with open(f"{base}.{encoding}", "rb") as f:
+                variants[encoding] = f.read()
+        return {name: data for name, data in variants.items() if data}
+    except OSError:
+        pass
+
+    variants = compress(body)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        for encoding in encodings:
+            tmp_path = f"{base}.{encoding}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(variants.get(encoding, b""))
+            os.replace(tmp_path, f"{base}.{encoding}")
+    except OSError:
+        pass
+    return variants
+
+
+def etag_matches(if_none_match: str, etags) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return any(tag in candidates for tag in etags)
+
+
+class CachedResponse:
+    """A response body serialised once, with compressed variants and ETags.
+
+    Each representation gets its own strong ETag (the identity one plus a
+    suffix per encoding), and conditional requests matching any of them
+    get a 304.
+    """
+
+    def __init__(self, body: bytes, media_type: str = "application/json",
+                 cache_control: str = "public, max-age=300",
+                 variants: Optional[Dict[str, bytes]] = None):
+        self.body = body
+        self.media_type = media_type
+        self.cache_control = cache_control
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        self.etag = f'"{digest}"'
+        # Callers serving one body under several names pass its variants in
+        self.variants = compress(body) if variants is None else variants
+        self.etags = {None: self.etag}
+        for encoding in self.variants:
+            self.etags[encoding] = f'"{digest}-{encoding}"'
+
+    def to_response(self, request: Request) -> Response:
+        encoding = negotiate_encoding(request.headers.get("accept-encoding", ""), self.variants)
+        headers = {
+            "ETag": self.etags[encoding],
+            "Cache-Control": self.cache_control,
+            "Vary": "Accept-Encoding",
+        }
+        if etag_matches(request.headers.get("if-none-match", ""), self.etags.values()):
+            return Response(status_code=304, headers=headers)
+        if encoding is None:
+            return Response(self.body, media_type=self.media_type, headers=headers)
+        headers["Content-Encoding"] = encoding
+        return Response(self.variants[encoding], media_type=self.media_type, headers=headers)
@@ -0,0 +1,108 @@
+"""
+PhysioHealth - Idempotent bookings
+Recently used Idempotency-Keys, kept in step with the appointments log
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+from storage import DELETE_OP
+
+# Field under which a booking's Idempotency-Key is stored in the log
+KEY_FIELD = "idempotencyKey"
+
+# Fields that must match for a repeated submission to count as a replay
+REPLAY_FIELDS = ("name", "email", "phone", "doctor", "service", "date", "time")
+
+
+class IdempotencyKeys:
+    """Bounded TTL cache of Idempotency-Key -> bookingId.
+
+    Filled from the appointments log like the availability bitmaps, so it
+    is rebuilt after a restart and follows bookings made by other workers.
+    Keys are stored with the booking itself, which makes the log the only
+    durable state; bookings stored before keys existed are keyed by their
+    bookingId. Each key is remembered for `ttl` seconds after this process
+    sees it, and at most `max_keys` keys are kept.
+    """
+
+    def __init__(self, ttl: float = 24 * 3600, max_keys: int = 100_000):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._keys: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        # bookingId -> its Idempotency-Key, to forget it on cancellation
+        self._key_of: Dict[str, str] = {}
+        self.replays = 0
+
+    def lookup(self, key: str) -> Optional[str]:
+        """bookingId previously committed under this key, if still remembered"""
+        with self._lock:
+            return self._get(key)
+
+    def guard(self, key: str, then: Optional[Callable[[set], bool]] = None) -> Callable[[set], bool]:
+        """Commit-time check that the key is unused, chained with `then`"""
+        claim = ("idempotency", key)
+
+        def check(claims: set) -> bool:
+            with self._lock:
+                if claim in claims or self._get(key) is not None:
+                    return False
+            if then is not None and not then(claims):
+                return False
+            claims.add(claim)
+            return True
+        return check
+
+    # Log-driven state
+    def apply(self, entries: list, rebuilt: bool = False):
+        now = time.time()
+        with self._lock:
+            if rebuilt:
+                self._keys.clear()
+                self._key_of.clear()
+            for entry in entries:
+                if DELETE_OP in entry:
+                    key = self._key_of.pop(entry[DELETE_OP]["value"], None)
+                    if key is not None:
+                        self._keys.pop(key, None)
+                    continue
+                booking_id = entry.get("bookingId")
+                key = entry.get(KEY_FIELD) or booking_id
+                if key:
+                    self._put(key, booking_id, now)
+                    self._key_of[booking_id] = key
+            self._expire(now)
+
+    def _get(self, key: str) -> Optional[str]:
+        item = self._keys.get(key)
+        if item is None or item[0] < time.time():
+            return None
+        return item[1]
+
+    def _put(self, key: str, booking_id: str, now: float):
+        self._keys[key] = (now + self.ttl, booking_id)
+        self._keys.move_to_end(key)
+
+    def _expire(self, now: float):
+        keys = self._keys
+        while keys:
+            key, (expires, booking_id) = next(iter(keys.items()))
+            if expires >= now and len(keys) <= self.max_keys:
+                break
+            del keys[key]
+            if self._key_of.get(booking_id) == key:
+                del self._key_of[booking_id]
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def stats(self) -> dict:
+        return {"keys": len(self._keys), "ttlSeconds": self.ttl, "replays": self.replays}
+
+
+def is_replay(record, submitted: dict) -> bool:
+    """Whether a stored booking was made from the same submission"""
+    return all(record.get(field) == submitted.get(field) for field in REPLAY_FIELDS)
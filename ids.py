@@ -0,0 +1,85 @@
+"""
+PhysioHealth - IDs
+Monotonic, time-ordered IDs for bookings and contact messages (ULID layout)
+"""
+
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+# Crockford base32: no I, L, O or U, so IDs survive being read out on the phone
+ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+
+# 26 characters encode 48 bits of milliseconds followed by 80 random bits
+ID_LENGTH = 26
+RANDOM_BITS = 80
+
+# Two base32 digits per lookup (10 bits)
+_PAIRS = [a + b for a in ALPHABET for b in ALPHABET]
+
+
+def encode(value: int) -> str:
+    """128-bit integer -> 26 base32 characters, most significant first"""
+    pairs = _PAIRS
+    return (ALPHABET[value >> 125]
+            + "".join([pairs[(value >> shift) & 0x3FF] for shift in range(115, 4, -10)])
+            + ALPHABET[value & 0x1F])
+
+
+def decode(text: str) -> int:
+    value = 0
+    for char in text:
+        value = (value << 5) | ALPHABET.index(char)
+    return value
+
+
+class IdGenerator:
+    """ULID-style IDs that sort by creation time.
+
+    The first ID in each millisecond gets fresh random bits; later IDs in
+    the same millisecond (or after the clock steps back) increment them,
+    so IDs from one process are strictly increasing. Separate processes
+    differ in their 80 random bits. Child processes reseed after a fork,
+    so uvicorn workers never continue their parent's sequence.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._random = 0
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reseed)
+
+    def _reseed(self):
+        self._lock = threading.Lock()
+        self._last_ms = -1
+
+    def new(self, prefix: str = "") -> str:
+        with self._lock:
+            ms = time.time_ns() // 1_000_000
+            if ms > self._last_ms:
+                self._last_ms = ms
+                self._random = int.from_bytes(os.urandom(RANDOM_BITS // 8), "big")
+            else:
+                self._random += 1
+                if self._random >> RANDOM_BITS:
+                    # 2^80 IDs in one millisecond: borrow the next one
+                    self._last_ms += 1
+                    self._random = 0
+            value = (self._last_ms << RANDOM_BITS) | self._random
+        return prefix + encode(value)
+
+
+_generator = IdGenerator()
+
+
+def new_id(prefix: str = "") -> str:
+    """A new unique ID, e.g. `new_id("PH")` -> `PH01JAB3K5Q7X2M4N8R6T0V9W1YZ`"""
+    return _generator.new(prefix)
+
+
+def id_time(value: str) -> datetime:
+    """When an ID was generated (its prefix is ignored)"""
+    ms = decode(value[-ID_LENGTH:]) >> RANDOM_BITS
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc)
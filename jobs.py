@@ -0,0 +1,351 @@
+"""
+PhysioHealth - Background jobs
+Persistent job queue (SQLite) and the asyncio runner that works it off
+"""
+
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional
+
+# Job states; `dead` jobs ran out of attempts and wait for an operator
+QUEUED, RUNNING, DONE, DEAD = "queued", "running", "done", "dead"
+
+Handler = Callable[[dict], Awaitable[None]]
+
+
+class Job:
+    __slots__ = ("id", "kind", "payload", "attempts", "due_at")
+
+    def __init__(self, id: str, kind: str, payload: dict, attempts: int, due_at: float):
+        self.id = id
+        self.kind = kind
+        self.payload = payload
+        self.attempts = attempts
+        # When the job was first due to run: latency is measured from here
+        self.due_at = due_at
+
+
+class JobQueue:
+    """Jobs in a SQLite table shared by all workers on the host.
+
+    A job id doubles as its deduplication key: enqueueing an id that
+    already exists does nothing, so a retried request cannot queue the
+    same notification twice. A claimed job is leased rather than locked:
+    its `run_at` moves to the end of the lease, and if the worker dies
+    before finishing it, the job becomes due again and another worker
+    claims it. Jobs are therefore run at least once.
+    """
+
+    def __init__(self, db_path: str, lease: float = 300.0):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.db_path = db_path
+        self.lease = lease
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30,
+                                     isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY,"
+            " kind TEXT NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " state TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " run_at REAL NOT NULL,"
+            " due_at REAL NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " finished_at REAL,"
+            " last_error TEXT)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS jobs_due ON jobs (run_at)"
+            " WHERE state IN ('queued', 'running')"
+        )
+
+    def enqueue(self, job_id: str, kind: str, payload: dict,
+                run_at: Optional[float] = None) -> bool:
+        """Queue a job; False if a job with this id already exists"""
+        return self.enqueue_many([(job_id, kind, payload, run_at)]) == 1
+
+    def enqueue_many(self, jobs: List[tuple]) -> int:
+        """Queue (id, kind, payload, run_at or None) jobs in one transaction.
+
+        Returns how many were new.
+        """
+        now = time.time()
+        # A job scheduled in the past is due from now, for its latency
+        rows = [(job_id, kind, json.dumps(payload), QUEUED, run_at or now, max(run_at or now, now), now)
+                for job_id, kind, payload, run_at in jobs]
+        with self._lock:
+            conn = self._conn
+            before = conn.total_changes
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO jobs (id, kind, payload, state, run_at, due_at, created_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            return conn.total_changes - before
+
+    def claim(self, kinds: List[str], now: Optional[float] = None) -> Optional[Job]:
+        """Lease the oldest due job of one of `kinds`, counting it as an attempt"""
+        if not kinds:
+            return None
+        now = time.time() if now is None else now
+        marks = ",".join("?" * len(kinds))
+        with self._lock:
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT id, kind, payload, attempts, due_at FROM jobs"
+                    f" WHERE state IN ('queued', 'running') AND run_at <= ? AND kind IN ({marks})"
+                    " ORDER BY run_at LIMIT 1",
+                    (now, *kinds)).fetchone()
+                if row is not None:
+                    conn.execute("UPDATE jobs SET state = ?, attempts = attempts + 1, run_at = ?"
+                                 " WHERE id = ?", (RUNNING, now + self.lease, row[0]))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        return Job(row[0], row[1], json.loads(row[2]), row[3] + 1, row[4])
+
+    def complete(self, job_id: str):
+        self._finish(job_id, DONE, None)
+
+    def retry(self, job_id: str, run_at: float, error: str):
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET state = ?, run_at = ?, last_error = ? WHERE id = ?",
+                               (QUEUED, run_at, error, job_id))
+
+    def bury(self, job_id: str, error: str):
+        """Move a job to the dead-letter list"""
+        self._finish(job_id, DEAD, error)
+
+    def _finish(self, job_id: str, state: str, error: Optional[str]):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, finished_at = ?, last_error = COALESCE(?, last_error)"
+                " WHERE id = ?", (state, time.time(), error, job_id))
+
+    def cancel(self, job_id: str) -> bool:
+        """Drop a job that has not run yet"""
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM jobs WHERE id = ? AND state = ?",
+                                        (job_id, QUEUED))
+        return cursor.rowcount == 1
+
+    def requeue(self, job_id: str) -> bool:
+        """Give a dead job a fresh set of attempts"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET state = ?, attempts = 0, run_at = ?, due_at = ?, finished_at = NULL"
+                " WHERE id = ? AND state = ?", (QUEUED, now, now, job_id, DEAD))
+        return cursor.rowcount == 1
+
+    def next_due(self, kinds: List[str]) -> Optional[float]:
+        """When the next job of one of `kinds` is due, or None if there is none"""
+        if not kinds:
+            return None
+        marks = ",".join("?" * len(kinds))
+        with self._lock:
+            return self._conn.execute(
+                "SELECT MIN(run_at) FROM jobs WHERE state IN ('queued', 'running')"
+                f" AND kind IN ({marks})", kinds).fetchone()[0]
+
+    def counts(self) -> Dict[str, int]:
+        """Jobs per state; `due` counts the queued jobs that could run now"""
+        with self._lock:
+            rows = self._conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+            due = self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE state = ? AND run_at <= ?",
+                (QUEUED, time.time())).fetchone()[0]
+        counts = {state: 0 for state in (QUEUED, RUNNING, DONE, DEAD)}
+        counts.update(rows)
+        counts["due"] = due
+        return counts
+
+    def dead(self, limit: int = 100) -> List[dict]:
+        """The dead-letter list, most recent first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, kind, payload, attempts, created_at, finished_at, last_error FROM jobs"
+                " WHERE state = ? ORDER BY finished_at DESC LIMIT ?", (DEAD, limit)).fetchall()
+        return [{"id": row[0], "kind": row[1], "payload": json.loads(row[2]), "attempts": row[3],
+                 "createdAt": row[4], "failedAt": row[5], "error": row[6]} for row in rows]
+
+    def prune(self, before: float) -> int:
+        """Delete jobs that finished successfully before `before`"""
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM jobs WHERE state = ? AND finished_at < ?",
+                                        (DONE, before))
+        return cursor.rowcount
+
+    def close(self):
+        self._conn.close()
+
+
+class JobRunner:
+    """Runs queued jobs on the event loop, at most `concurrency` at a time.
+
+    Handlers are registered per kind with an optional lower limit of
+    their own (e.g. how many connections the mail server allows). A
+    handler that raises is retried after `backoff * 2 ** (attempt - 1)`
+    seconds (capped at `max_backoff`, with some jitter) until
+    `max_attempts` is reached, then the job goes to the dead-letter list.
+    A handler taking longer than `timeout` counts as failed.
+
+    `notify()` wakes the runner after a local enqueue; jobs queued by
+    other workers are found by polling every `poll_interval` seconds.
+    `observer(kind, outcome, latency)` is called after every attempt,
+    with the seconds since the job was first due (when it was queued,
+    unless it was scheduled for later).
+    """
+
+    def __init__(self, queue: JobQueue, concurrency: int = 4, max_attempts: int = 5,
+                 backoff: float = 30.0, max_backoff: float = 3600.0, timeout: float = 60.0,
+                 poll_interval: float = 1.0, retention: float = 7 * 24 * 3600):
+        self.queue = queue
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.observer: Optional[Callable[[str, str, float], None]] = None
+        self.handlers: Dict[str, Handler] = {}
+        self.limits: Dict[str, int] = {}
+        self.running: Dict[str, int] = {}
+        self.completed = 0
+        self.retried = 0
+        self.buried = 0
+        self._latencies = deque(maxlen=1000)
+        self._tasks: set = set()
+        self._wake: Optional[asyncio.Event] = None
+        self._loop_task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    def handle(self, kind: str, handler: Handler, concurrency: Optional[int] = None):
+        self.handlers[kind] = handler
+        self.running[kind] = 0
+        if concurrency is not None:
+            self.limits[kind] = concurrency
+
+    def delay(self, attempts: int) -> float:
+        """Seconds before retrying a job that has failed `attempts` times"""
+        delay = min(self.max_backoff, self.backoff * 2 ** (attempts - 1))
+        return delay * random.uniform(0.8, 1.2)
+
+    def start(self):
+        if self._loop_task is not None:
+            return
+        self._stopping = False
+        self._wake = asyncio.Event()
+        self._loop_task = asyncio.create_task(self._run(), name="job-runner")
+
+    async def stop(self, timeout: float = 10.0):
+        """Stop claiming jobs and give the running ones `timeout` seconds.
+
+        Jobs still running after that keep their lease and run again
+        once it expires.
+        """
+        if self._loop_task is None:
+            return
+        self._stopping = True
+        self._wake.set()
+        await self._loop_task
+        self._loop_task = None
+        if self._tasks:
+            await asyncio.wait(self._tasks, timeout=timeout)
+        for task in self._tasks:
+            task.cancel()
+
+    def notify(self):
+        if self._wake is not None:
+            self._wake.set()
+
+    def _free_kinds(self) -> List[str]:
+        return [kind for kind in self.handlers
+                if self.running[kind] < self.limits.get(kind, self.concurrency)]
+
+    async def _run(self):
+        pruned_at = 0.0
+        while not self._stopping:
+            self._wake.clear()
+            while len(self._tasks) < self.concurrency and not self._stopping:
+                job = await asyncio.to_thread(self.queue.claim, self._free_kinds())
+                if job is None:
+                    break
+                self.running[job.kind] += 1
+                task = asyncio.create_task(self._execute(job), name=f"job-{job.id}")
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+            now = time.time()
+            if now - pruned_at > 3600:
+                await asyncio.to_thread(self.queue.prune, now - self.retention)
+                pruned_at = now
+            wait = self.poll_interval
+            if len(self._tasks) < self.concurrency:
+                # Only kinds below their limit: a due job of a kind that is
+                # busy cannot be claimed yet, and waiting for it would spin.
+                # A finishing job wakes the runner.
+                next_due = await asyncio.to_thread(self.queue.next_due, self._free_kinds())
+                if next_due is not None:
+                    wait = min(wait, max(0.0, next_due - time.time()))
+            try:
+                await asyncio.wait_for(self._wake.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _execute(self, job: Job):
+        try:
+            await asyncio.wait_for(self.handlers[job.kind](job.payload), self.timeout)
+        except Exception as exc:
+            error = f"{type(exc).__name__}: {exc}" if str(exc) else type(exc).__name__
+            if job.attempts >= self.max_attempts:
+                await asyncio.to_thread(self.queue.bury, job.id, error)
+                self.buried += 1
+                outcome = "dead"
+            else:
+                await asyncio.to_thread(self.queue.retry, job.id,
+                                        time.time() + self.delay(job.attempts), error)
+                self.retried += 1
+                outcome = "retried"
+        else:
+            await asyncio.to_thread(self.queue.complete, job.id)
+            self.completed += 1
+            outcome = "done"
+            self._latencies.append(time.time() - job.due_at)
+        finally:
+            self.running[job.kind] -= 1
+            self.notify()
+        if self.observer is not None:
+            self.observer(job.kind, outcome, time.time() - job.due_at)
+
+    def stats(self) -> dict:
+        latencies = sorted(self._latencies)
+
+        def percentile(fraction: float) -> float:
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * fraction))], 4)
+
+        return {
+            "concurrency": self.concurrency, "limits": dict(self.limits),
+            "running": sum(self.running.values()), "completed": self.completed,
+            "retried": self.retried, "buried": self.buried, "queue": self.queue.counts(),
+            "latency": {"p50": percentile(0.5), "p99": percentile(0.99)} if latencies else None,
+        }
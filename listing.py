@@ -0,0 +1,59 @@
+"""
+PhysioHealth - Listing helpers
+Filtering, cursor pagination and NDJSON streaming for record listings
+"""
+
+from itertools import islice
+from typing import Callable, Iterator, Optional, Tuple
+
+from fast_json import dumps
+from records import as_dict
+
+# Upper bound for `limit` on paginated listings
+MAX_PAGE_SIZE = 1000
+
+
+def make_filter(date_field: str, date_from: Optional[str] = None,
+                date_to: Optional[str] = None, **equals) -> Callable[[dict], bool]:
+    """Build a record predicate from a date range and exact-match fields.
+
+    Dates are compared on their first 10 characters (YYYY-MM-DD), so the
+    range works for both plain dates and ISO timestamps. `email` matches
+    case-insensitively; `None` values are ignored.
+    """
+    equals = {field: value for field, value in equals.items() if value is not None}
+    email = equals.pop("email", None)
+    email = email.lower() if email else None
+
+    def predicate(record: dict) -> bool:
+        if date_from or date_to:
+            day = (record.get(date_field) or "")[:10]
+            if date_from and day < date_from:
+                return False
+            if date_to and day > date_to:
+                return False
+        if email and (record.get("email") or "").lower() != email:
+            return False
+        return all(record.get(field) == value for field, value in equals.items())
+
+    return predicate
+
+
+def paginate(items: Iterator[Tuple[object, dict]], predicate: Callable[[dict], bool],
+             limit: Optional[int], encode_cursor: Callable[[object], str] = str) -> Tuple[list, Optional[str]]:
+    """Collect up to `limit` matching records and the cursor to resume from"""
+    matching = ((cursor, record) for cursor, record in items if predicate(record))
+    page = list(islice(matching, limit + 1 if limit else None))
+    next_cursor = None
+    if limit and len(page) > limit:
+        page = page[:limit]
+        next_cursor = encode_cursor(page[-1][0])
+    return [as_dict(record) for _, record in page], next_cursor
+
+
+def ndjson_lines(items: Iterator[Tuple[object, dict]], predicate: Callable[[dict], bool],
+                 limit: Optional[int] = None) -> Iterator[bytes]:
+    """Yield matching records as newline-delimited JSON, one at a time"""
+    matching = (record for _, record in items if predicate(record))
+    for record in islice(matching, limit):
+        yield dumps(record) + b"\n"
@@ -1,11 +1,50 @@
-from fastapi import FastAPI, HTTPException, Query
-import json
-app = FastAPI()
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from typing import Optional
+import asyncio
+import os
+import tempfile
+
+from patient_repo import SORTABLE_FIELDS, PatientRepository
+from patient_import import ImportJobs
+from patient_stats import CATEGORICAL_FIELDS, PatientColumns
+from records import as_dict
+from fast_json import FastJSONResponse
+from shared_cache import MappedRecords, SharedCache
+
+app = FastAPI(default_response_class=FastJSONResponse)
+
+PATIENTS_FILE = os.environ.get("PHYSIO_PATIENTS_FILE", "patients.json")
+
+# Parsed once; reloaded only when the file's mtime or size changes
+patients = PatientRepository(PATIENTS_FILE)
+
+# Bulk imports run on a background thread, one at a time
+import_jobs = ImportJobs(patients)
+# Largest import body accepted, in bytes
+MAX_IMPORT_BYTES = int(os.environ.get("PHYSIO_IMPORT_MAX_BYTES", str(512 * 1024 * 1024)))
+# The upload is written to disk in blocks of this size, off the event loop
+SPOOL_BLOCK_BYTES = 1 << 20
+
+# Columnar copy of the records for the /patients/stats endpoints
+patient_stats = PatientColumns(patients)
+
+# With PHYSIO_SHARED_CACHE=1 (set by serve.py for several workers) the read
+# endpoints serve a memory-mapped copy of the records that every worker
+# shares, rebuilt by the first worker to see patients.json change
+shared_patients = None
+if os.environ.get("PHYSIO_SHARED_CACHE") == "1":
+    shared_patients = SharedCache(
+        os.path.join(os.environ.get("PHYSIO_SHARED_CACHE_DIR", os.path.join("data", "shared")),
+                     "patients.cache"),
+        source=patients.source,
+        build=lambda path: PatientRepository(PATIENTS_FILE).write_cache(path),
+    )
+
+def shared_records() -> Optional[MappedRecords]:
+    return shared_patients.current() if shared_patients is not None else None
 
 def load_data():
-    with open('patients.json', 'r') as f:
-        data = json.load(f)
-    return data
+    return patients.all()
 
 @app.get("/")
 def hello():
@@ -17,26 +56,121 @@ def about():
 
 @app.get('/view')
 def view():
-    data = load_data()
-    return data 
+    cache = shared_records()
+    if cache is not None:
+        return Response(cache.json_array(), media_type="application/json")
+    # Records are encoded straight from their compact form
+    return FastJSONResponse(load_data())
+
+@app.get('/patient/{patient_id}')
+def view_patient(patient_id: int):
+    cache = shared_records()
+    if cache is not None:
+        record = cache.get(patient_id)
+        if record is None:
+            raise HTTPException(status_code=404, detail="Patient not found")
+        return Response(record, media_type="application/json")
+    patient = patients.get(patient_id)
+    if patient is None:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    return as_dict(patient)
 
-@app.get('/patirnt/{patient_id}')
+# Kept for existing clients of the misspelt route
+@app.get('/patirnt/{patient_id}', include_in_schema=False)
 def get_patient(patient_id: int):
-    data = load_data()
-    for patient in data:
-        if patient['id'] == patient_id:
-            return patient
-    return {"error": "Patient not found"}
+    return view_patient(patient_id)
 
-@app.get('/patient/{patient_id}')
-def view_patient(patient_id: str=Query(..., description="The ID of the patient in DB; e.g., 1")):
-    data = load_data()
-    if patient_id in data:
-        return data[patient_id]
-    raise HTTPException(status_code=404, detail="Patient not found")
+@app.get('/patients')
+def list_patients(
+    sort_by: str = Query("patient_id", description=f"One of: {', '.join(SORTABLE_FIELDS)}"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    limit: Optional[int] = Query(None, ge=1),
+):
+    if sort_by not in SORTABLE_FIELDS:
+        raise HTTPException(status_code=400, detail=f"Cannot sort by '{sort_by}'")
+    cache = shared_records()
+    if cache is not None:
+        return FastJSONResponse(cache.sorted(sort_by, descending=order == "desc", limit=limit))
+    return FastJSONResponse(patients.sorted(sort_by, descending=order == "desc", limit=limit))
+
+@app.post('/patients/import', status_code=202)
+async def import_patients(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(json|csv)$",
+                                  description="Defaults to csv for text/csv bodies, json otherwise"),
+):
+    """Bulk import from a raw JSON array, JSON Lines or CSV request body"""
+    if format is None:
+        format = "csv" if "csv" in request.headers.get("content-type", "") else "json"
+    # Refuse before reading the body
+    try:
+        import_jobs.check_idle()
+    except RuntimeError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    too_large = HTTPException(status_code=413, detail=f"Imports are limited to {MAX_IMPORT_BYTES} bytes")
+    length = request.headers.get("content-length", "")
+    if length.isdigit() and int(length) > MAX_IMPORT_BYTES:
+        raise too_large
+    # Spool the body to disk so the import can outlive the request
+    fd, path = tempfile.mkstemp(prefix="patients-import-", suffix=f".{format}")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            size = 0
+            block = bytearray()
+            async for chunk in request.stream():
+                size += len(chunk)
+                if size > MAX_IMPORT_BYTES:
+                    raise too_large
+                block += chunk
+                if len(block) >= SPOOL_BLOCK_BYTES:
+                    await asyncio.to_thread(f.write, block)
+                    block = bytearray()
+            await asyncio.to_thread(f.write, block)
+        job_id = import_jobs.start(path, format, remove_after=True)
+    except RuntimeError as exc:
+        os.remove(path)
+        raise HTTPException(status_code=409, detail=str(exc))
+    except BaseException:
+        os.remove(path)
+        raise
+    return {"jobId": job_id, **import_jobs.get(job_id).to_dict()}
+
+@app.get('/patients/import/{job_id}')
+def import_status(job_id: str):
+    report = import_jobs.get(job_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Import not found")
+    return {"jobId": job_id, **report.to_dict()}
+
+@app.get('/patients/stats')
+def stats_summary():
+    return patient_stats.refresh().summary()
+
+@app.get('/patients/stats/counts')
+def stats_counts(by: str = Query(..., description=f"One of: {', '.join(CATEGORICAL_FIELDS)}, readmitted")):
+    if by not in CATEGORICAL_FIELDS and by != "readmitted":
+        raise HTTPException(status_code=400, detail=f"Cannot group by '{by}'")
+    return {"by": by, "counts": patient_stats.refresh().counts(by)}
+
+@app.get('/patients/stats/readmission')
+def stats_readmission(by: str = Query("disease", description=f"One of: {', '.join(CATEGORICAL_FIELDS)}")):
+    if by not in CATEGORICAL_FIELDS:
+        raise HTTPException(status_code=400, detail=f"Cannot group by '{by}'")
+    return {"by": by, "groups": patient_stats.refresh().readmission_rates(by)}
+
+@app.get('/patients/stats/age-histogram')
+def stats_age_histogram(bin_width: int = Query(10, ge=1, le=130)):
+    return {"binWidth": bin_width, "bins": patient_stats.refresh().age_histogram(bin_width)}
+
+@app.get('/patients/stats/admissions-per-month')
+def stats_admissions_per_month():
+    return {"months": patient_stats.refresh().admissions_per_month()}
 
 @app.get('/sort0/')
 def sort_patients(sort_by: str=Query(..., description='sort on the basis of height, weight, or bmi')):
-    data       = load_data()
-    sorted_data = sorted(data, key=lambda x: x[sort_by] if sort_by in x else 0)
-    return sorted_data
+    if sort_by not in SORTABLE_FIELDS:
+        raise HTTPException(status_code=400, detail=f"Cannot sort by '{sort_by}'")
+    cache = shared_records()
+    if cache is not None and cache.has_order(sort_by):
+        return FastJSONResponse(cache.sorted(sort_by))
+    return FastJSONResponse(patients.sorted(sort_by))
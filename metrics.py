@@ -0,0 +1,212 @@
+"""
+PhysioHealth - Metrics
+Request and storage metrics exposed in the Prometheus text format
+"""
+
+import logging
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Background jobs include retries, so their latency reaches into hours
+JOB_LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0, 120.0, 600.0, 3600.0, 14400.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+logger = logging.getLogger("physiohealth.slow_requests")
+
+
+class Histogram:
+    """Fixed-bucket histogram; the last count is the +Inf bucket"""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name: str, labels: str, lines: List[str]):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels}le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels}le="+Inf"}} {self.count}')
+        lines.append(f"{name}_sum{{{labels.rstrip(',')}}} {self.sum:.6f}")
+        lines.append(f"{name}_count{{{labels.rstrip(',')}}} {self.count}")
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metrics:
+    """Per-process counters and histograms.
+
+    Requests are keyed by method and route template (not the raw path),
+    so the number of series stays bounded. Storage operations arrive
+    from writer threads and are recorded under a lock; request metrics
+    are only touched from the event loop.
+    """
+
+    def __init__(self, slow_request_seconds: Optional[float] = None):
+        self.slow_request_seconds = slow_request_seconds
+        self.latency: Dict[Tuple[str, str], Histogram] = {}
+        self.responses: Dict[Tuple[str, str, int], int] = {}
+        self.errors: Dict[Tuple[str, str], int] = {}
+        self.request_bytes: Dict[Tuple[str, str], int] = {}
+        self.response_bytes: Dict[Tuple[str, str], int] = {}
+        self.storage_latency: Dict[str, Histogram] = {}
+        self.storage_read: Dict[str, int] = {}
+        self.storage_written: Dict[str, int] = {}
+        self.job_latency: Dict[str, Histogram] = {}
+        self.job_outcomes: Dict[Tuple[str, str], int] = {}
+        self.gauges: Dict[str, Tuple[str, Callable[[], float]]] = {}
+        self._storage_lock = threading.Lock()
+        self.started_at = time.time()
+
+    def add_gauge(self, name: str, help_text: str, read: Callable[[], float]):
+        self.gauges[name] = (help_text, read)
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float,
+                        received: int, sent: int):
+        key = (method, route)
+        histogram = self.latency.get(key)
+        if histogram is None:
+            histogram = self.latency[key] = Histogram()
+        histogram.observe(seconds)
+        status_key = (method, route, status)
+        self.responses[status_key] = self.responses.get(status_key, 0) + 1
+        self.request_bytes[key] = self.request_bytes.get(key, 0) + received
+        self.response_bytes[key] = self.response_bytes.get(key, 0) + sent
+        if status >= 500:
+            self.errors[key] = self.errors.get(key, 0) + 1
+        if self.slow_request_seconds is not None and seconds >= self.slow_request_seconds:
+            logger.warning("slow request: %s %s took %.1f ms (status %d, %d bytes sent)",
+                           method, route, seconds * 1000, status, sent)
+
+    def observe_storage(self, operation: str, seconds: float, read: int, written: int):
+        """Storage engine observer (see StorageEngine.observer)"""
+        with self._storage_lock:
+            histogram = self.storage_latency.get(operation)
+            if histogram is None:
+                histogram = self.storage_latency[operation] = Histogram()
+            histogram.observe(seconds)
+            self.storage_read[operation] = self.storage_read.get(operation, 0) + read
+            self.storage_written[operation] = self.storage_written.get(operation, 0) + written
+
+    def observe_job(self, kind: str, outcome: str, latency: float):
+        """Job runner observer (see JobRunner.observer); runs on the event loop"""
+        key = (kind, outcome)
+        self.job_outcomes[key] = self.job_outcomes.get(key, 0) + 1
+        if outcome == "done":
+            histogram = self.job_latency.get(kind)
+            if histogram is None:
+                histogram = self.job_latency[kind] = Histogram(JOB_LATENCY_BUCKETS)
+            histogram.observe(latency)
+
+    def render(self) -> str:
+        lines: List[str] = []
+
+        def header(name: str, kind: str, help_text: str):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        header("http_request_duration_seconds", "histogram", "Request latency by route")
+        for (method, route), histogram in list(self.latency.items()):
+            histogram.render("http_request_duration_seconds",
+                             f'method="{method}",route="{_escape(route)}",', lines)
+        header("http_responses_total", "counter", "Responses by route and status code")
+        for (method, route, status), count in list(self.responses.items()):
+            lines.append(f'http_responses_total{{method="{method}",route="{_escape(route)}",'
+                         f'status="{status}"}} {count}')
+        for name, help_text, values in (
+            ("http_request_errors_total", "Requests that failed with a 5xx or an exception", self.errors),
+            ("http_request_size_bytes_total", "Request body bytes received", self.request_bytes),
+            ("http_response_size_bytes_total", "Response body bytes sent", self.response_bytes),
+        ):
+            header(name, "counter", help_text)
+            for (method, route), value in list(values.items()):
+                lines.append(f'{name}{{method="{method}",route="{_escape(route)}"}} {value}')
+
+        with self._storage_lock:
+            header("storage_operation_duration_seconds", "histogram",
+                   "Storage engine operation latency")
+            for operation, histogram in self.storage_latency.items():
+                histogram.render("storage_operation_duration_seconds",
+                                 f'operation="{operation}",', lines)
+            header("storage_read_bytes_total", "counter", "Bytes read by storage operations")
+            for operation, value in self.storage_read.items():
+                lines.append(f'storage_read_bytes_total{{operation="{operation}"}} {value}')
+            header("storage_written_bytes_total", "counter", "Bytes written by storage operations")
+            for operation, value in self.storage_written.items():
+                lines.append(f'storage_written_bytes_total{{operation="{operation}"}} {value}')
+
+        header("job_latency_seconds", "histogram",
+               "Seconds from a background job being due to its completion")
+        for kind, histogram in list(self.job_latency.items()):
+            histogram.render("job_latency_seconds", f'kind="{kind}",', lines)
+        header("job_attempts_total", "counter", "Background job attempts by kind and outcome")
+        for (kind, outcome), count in list(self.job_outcomes.items()):
+            lines.append(f'job_attempts_total{{kind="{kind}",outcome="{outcome}"}} {count}')
+
+        header("process_start_time_seconds", "gauge", "Start time of the process")
+        lines.append(f"process_start_time_seconds {self.started_at:.3f}")
+        for name, (help_text, read) in self.gauges.items():
+            header(name, "gauge", help_text)
+            lines.append(f"{name} {read()}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware timing every HTTP request.
+
+    Only counters are touched per request (no per-request objects beyond
+    two small closures), which keeps the overhead to a few microseconds.
+    """
+
+    def __init__(self, app, metrics: Metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+        received = sent = 0
+
+        async def counting_receive():
+            nonlocal received
+            message = await receive()
+            received += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message):
+            nonlocal status, sent
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                sent += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            route = scope.get("route")
+            self.metrics.observe_request(
+                scope["method"], getattr(route, "path", "unmatched"), status,
+                time.perf_counter() - started, received, sent,
+            )
@@ -0,0 +1,305 @@
+"""
+PhysioHealth - Notifications
+Booking and contact emails and SMS, the senders that deliver them, and a
+fake SMTP server for local testing
+
+Usage: python notifications.py sink [--port 1025] [--outbox data/outbox] [--delay 0] [--fail-rate 0]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import smtplib
+import threading
+import urllib.request
+from datetime import datetime
+from email import message_from_bytes, policy
+from email.message import EmailMessage
+from typing import Dict, Optional
+
+
+# Messages. Each is a dict with `to`, `body` and, for email, `subject`.
+
+def header(text: str) -> str:
+    """`text` on one line, for an email header.
+
+    A line break in a header is rejected by the email package, so a
+    contact subject containing one would fail on every attempt.
+    """
+    return " ".join(text.split())
+
+
+def booking_confirmation(record: dict, clinic: dict) -> Dict[str, dict]:
+    """Email and SMS confirming a booking"""
+    when = f"{record['date']} at {record['time']}"
+    phone = clinic["contact"]["phone"][0]
+    return {
+        "email": {
+            "to": record["email"],
+            "subject": f"Your appointment on {when} - {clinic['name']}",
+            "body": (
+                f"Dear {record['name']},\n\n"
+                f"Thank you for booking with {clinic['name']}. Your appointment:\n\n"
+                f"  Booking ID: {record['bookingId']}\n"
+                f"  Date: {when}\n"
+                f"  Doctor: {record['doctor']}\n"
+                f"  Service: {record['service']}\n"
+                f"  Price: Rs. {record['finalPrice']:.0f}\n\n"
+                f"Our team will confirm availability shortly. To reschedule or "
+                f"cancel, call us on {phone}.\n\n{clinic['name']}\n"
+            ),
+        },
+        "sms": {
+            "to": record["phone"],
+            "body": (f"{clinic['name']}: appointment {record['bookingId']} with "
+                     f"{record['doctor']} on {when} received. Questions? Call {phone}."),
+        },
+    }
+
+
+def booking_followup(record: dict, clinic: dict) -> dict:
+    """Email sent after the appointment"""
+    return {
+        "to": record["email"],
+        "subject": f"How are you feeling? - {clinic['name']}",
+        "body": (
+            f"Dear {record['name']},\n\n"
+            f"We hope your session with {record['doctor']} on {record['date']} helped. "
+            f"Keep up your exercises, and book a follow-up visit online or call "
+            f"{clinic['contact']['phone'][0]} if anything is bothering you.\n\n{clinic['name']}\n"
+        ),
+    }
+
+
+def contact_acknowledgement(contact: dict, clinic: dict) -> dict:
+    """Reply to a contact form message"""
+    return {
+        "to": contact["email"],
+        "subject": header(f"Re: {contact['subject']}"),
+        "body": (
+            f"Dear {contact['name']},\n\n"
+            f"Thank you for contacting {clinic['name']}. We have received your message "
+            f"({contact['id']}) and will get back to you soon.\n\n{clinic['name']}\n"
+        ),
+    }
+
+
+def contact_notice(contact: dict, clinic: dict) -> dict:
+    """The contact form message, forwarded to the clinic's inbox"""
+    return {
+        "to": clinic["contact"]["email"],
+        "subject": header(f"[Contact] {contact['subject']}"),
+        "body": f"From: {contact['name']} <{contact['email']}>\n\n{contact['message']}\n",
+    }
+
+
+# Senders. `send` blocks, so callers on the event loop run it in a thread.
+
+class Sender:
+    def send(self, message: dict):
+        raise NotImplementedError
+
+
+class OutboxSender(Sender):
+    """Appends messages to `<directory>/<channel>.jsonl` instead of sending them.
+
+    The default for development and tests: nothing leaves the machine,
+    and what would have been sent can be read back with `messages()`.
+    """
+
+    def __init__(self, directory: str, channel: str):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"{channel}.jsonl")
+        self.channel = channel
+        self._lock = threading.Lock()
+
+    def send(self, message: dict):
+        line = json.dumps(dict(message, channel=self.channel,
+                               sentAt=datetime.now().isoformat()), ensure_ascii=False)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    def messages(self) -> list:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return [json.loads(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            return []
+
+
+class SmtpSender(Sender):
+    """Email through an SMTP server, one connection per message"""
+
+    def __init__(self, host: str, port: int, sender: str, username: Optional[str] = None,
+                 password: Optional[str] = None, starttls: bool = False, timeout: float = 30.0):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+
+    def send(self, message: dict):
+        email = EmailMessage()
+        email["From"] = self.sender
+        email["To"] = message["to"]
+        email["Subject"] = message["subject"]
+        email.set_content(message["body"])
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            if self.starttls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password or "")
+            smtp.send_message(email)
+
+
+class WebhookSender(Sender):
+    """SMS through an HTTP gateway: the message is POSTed as JSON"""
+
+    def __init__(self, url: str, token: Optional[str] = None, timeout: float = 30.0):
+        self.url = url
+        self.token = token
+        self.timeout = timeout
+
+    def send(self, message: dict):
+        request = urllib.request.Request(
+            self.url, data=json.dumps({"to": message["to"], "body": message["body"]}).encode(),
+            headers={"Content-Type": "application/json"}, method="POST")
+        if self.token:
+            request.add_header("Authorization", f"Bearer {self.token}")
+        # Non-2xx statuses raise HTTPError, so the job is retried
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+def create_sender(channel: str, kind: str, outbox_dir: str, environ=os.environ) -> Sender:
+    """The sender for `channel` ("email" or "sms"), configured from the environment"""
+    if kind == "outbox":
+        return OutboxSender(outbox_dir, channel)
+    if channel == "email" and kind == "smtp":
+        return SmtpSender(environ.get("PHYSIO_SMTP_HOST", "localhost"),
+                          int(environ.get("PHYSIO_SMTP_PORT", "25")),
+                          environ.get("PHYSIO_SMTP_FROM", "PhysioHealth <noreply@physiohealth.com>"),
+                          environ.get("PHYSIO_SMTP_USER"), environ.get("PHYSIO_SMTP_PASSWORD"),
+                          starttls=environ.get("PHYSIO_SMTP_STARTTLS") == "1")
+    if channel == "sms" and kind == "webhook":
+        return WebhookSender(environ["PHYSIO_SMS_WEBHOOK_URL"], environ.get("PHYSIO_SMS_WEBHOOK_TOKEN"))
+    raise ValueError(f"Unknown {channel} backend: {kind}")
+
+
+# Fake SMTP server
+
+class SmtpSink:
+    """A minimal SMTP server that stores every message in an outbox.
+
+    Point `PHYSIO_SMTP_HOST`/`PHYSIO_SMTP_PORT` at it to exercise the
+    real SMTP path without sending mail. `delay` slows every message
+    down and `fail_rate` rejects a share of them with a temporary error,
+    to see the queue retry. Accepts any AUTH PLAIN login; no TLS.
+    """
+
+    def __init__(self, outbox: OutboxSender, delay: float = 0.0, fail_rate: float = 0.0):
+        self.outbox = outbox
+        self.delay = delay
+        self.fail_rate = fail_rate
+        self.received = 0
+        self.rejected = 0
+
+    async def start(self, host: str = "127.0.0.1", port: int = 1025):
+        return await asyncio.start_server(self._session, host, port)
+
+    async def _session(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        async def reply(line: str):
+            writer.write(line.encode() + b"\r\n")
+            await writer.drain()
+
+        recipients = []
+        await reply("220 physiohealth-sink ESMTP")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                verb = line[:4].decode("ascii", "replace").upper()
+                if verb == "EHLO":
+                    await reply("250-physiohealth-sink")
+                    await reply("250 AUTH PLAIN")
+                elif verb == "HELO":
+                    await reply("250 physiohealth-sink")
+                elif verb == "AUTH":
+                    await reply("235 Authentication successful")
+                elif verb == "MAIL":
+                    recipients = []
+                    await reply("250 OK")
+                elif verb == "RCPT":
+                    recipients.append(line.decode().partition(":")[2].strip().strip("<>"))
+                    await reply("250 OK")
+                elif verb == "DATA":
+                    await reply("354 End data with <CR><LF>.<CR><LF>")
+                    data = bytearray()
+                    while True:
+                        chunk = await reader.readline()
+                        if chunk in (b".\r\n", b".\n", b""):
+                            break
+                        data += chunk[1:] if chunk.startswith(b"..") else chunk
+                    await reply(await self._deliver(bytes(data), recipients))
+                elif verb == "RSET":
+                    recipients = []
+                    await reply("250 OK")
+                elif verb == "NOOP":
+                    await reply("250 OK")
+                elif verb == "QUIT":
+                    await reply("221 Bye")
+                    break
+                else:
+                    await reply("502 Command not implemented")
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _deliver(self, data: bytes, recipients: list) -> str:
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if random.random() < self.fail_rate:
+            self.rejected += 1
+            return "451 Temporary failure, try again later"
+        email = message_from_bytes(data, policy=policy.default)
+        body = email.get_body(("plain",))
+        self.outbox.send({"to": ", ".join(recipients), "from": email["From"],
+                          "subject": email["Subject"],
+                          "body": body.get_content() if body is not None else ""})
+        self.received += 1
+        return "250 Message accepted"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake SMTP server storing mail in an outbox")
+    parser.add_argument("command", choices=["sink"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1025)
+    parser.add_argument("--outbox", default=os.path.join("data", "outbox"))
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds to hold each message")
+    parser.add_argument("--fail-rate", type=float, default=0.0,
+                        help="share of messages rejected with a temporary error")
+    args = parser.parse_args()
+
+    async def serve():
+        sink = SmtpSink(OutboxSender(args.outbox, "smtp"), args.delay, args.fail_rate)
+        server = await sink.start(args.host, args.port)
+        print(f"SMTP sink on {args.host}:{args.port}, writing to "
+              f"{os.path.join(args.outbox, 'smtp.jsonl')}", flush=True)
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
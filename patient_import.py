@@ -0,0 +1,290 @@
+"""
+PhysioHealth - Bulk patient import
+Streams JSON or CSV exports, validates rows in batches and appends them in chunks
+
+Usage: python patient_import.py export.csv [--format csv|json] [--batch-size 1000]
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import re
+import sys
+import threading
+import time
+from itertools import islice
+from typing import BinaryIO, Callable, Iterator, List, Optional, Tuple
+
+from pydantic import TypeAdapter, ValidationError
+
+from patient_repo import PatientRepository
+from pydanric import Patient
+
+try:
+    import fcntl
+except ImportError:  # Windows: imports are only serialised within a process
+    fcntl = None
+
+FORMATS = ("json", "csv")
+
+# Cap on the row errors kept in a report; the rest are only counted
+MAX_REPORTED_ERRORS = 100
+
+_SEPARATORS = re.compile(r"[\s,\[\]]*")
+_PATIENT_BATCH = TypeAdapter(List[Patient])
+
+
+# Longest single JSON item accepted, in characters; a patient record is
+# well under 1 KB, so anything near this is a malformed or hostile upload
+MAX_JSON_ITEM_CHARS = 1 << 20
+
+
+class CountingReader(io.RawIOBase):
+    """Binary stream wrapper counting the bytes read so far"""
+
+    def __init__(self, stream: BinaryIO):
+        self.stream = stream
+        self.count = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        size = self.stream.readinto(buffer)
+        self.count += size or 0
+        return size
+
+
+def iter_json_records(stream, chunk_size: int = 1 << 16,
+                      max_item_chars: int = MAX_JSON_ITEM_CHARS) -> Iterator[object]:
+    """Yield the items of a JSON array (or a JSON Lines file) one at a time.
+
+    Only the current item and one read chunk are held in memory; an item
+    still incomplete after `max_item_chars` raises ValueError.
+    """
+    decoder = json.JSONDecoder()
+    buffer, position, eof = "", 0, False
+    while True:
+        position = _SEPARATORS.match(buffer, position).end()
+        if position < len(buffer):
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError as exc:
+                if eof:
+                    raise ValueError(f"Invalid JSON: {exc}") from None
+                if len(buffer) - position > max_item_chars:
+                    raise ValueError(f"Invalid JSON: an item is longer than {max_item_chars} "
+                                     f"characters") from None
+            else:
+                yield item
+                continue
+        elif eof:
+            return
+        # Need more input: keep the unparsed tail and read the next chunk
+        chunk = stream.read(chunk_size)
+        eof = not chunk
+        buffer, position = buffer[position:] + chunk, 0
+
+
+def iter_csv_records(stream) -> Iterator[dict]:
+    """Yield CSV rows as dicts, with empty cells treated as missing"""
+    for row in csv.DictReader(stream):
+        yield {key: value for key, value in row.items()
+               if key is not None and value not in (None, "")}
+
+
+def validate_batch(rows: List[object]) -> Tuple[List[Patient], List[Tuple[int, str]]]:
+    """Validate rows with a single adapter call; returns valid patients and
+    (row index, message) for the rejected ones"""
+    try:
+        return _PATIENT_BATCH.validate_python(rows), []
+    except ValidationError as exc:
+        failed = {}
+        for error in exc.errors():
+            index = error["loc"][0]
+            field = ".".join(str(part) for part in error["loc"][1:])
+            failed.setdefault(index, f"{field}: {error['msg']}" if field else error["msg"])
+    valid_rows = [row for index, row in enumerate(rows) if index not in failed]
+    return _PATIENT_BATCH.validate_python(valid_rows), sorted(failed.items())
+
+
+class ImportReport:
+    """Progress and outcome of one import"""
+
+    def __init__(self, total_bytes: Optional[int] = None):
+        self.total_bytes = total_bytes
+        self.bytes_read = 0
+        self.rows = 0
+        self.imported = 0
+        self.rejected = 0
+        self.errors: List[dict] = []
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.failure: Optional[str] = None
+
+    def reject(self, row: int, message: str):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row, "error": message})
+
+    def to_dict(self) -> dict:
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        return {
+            "status": "failed" if self.failure else "done" if self.finished_at else "running",
+            "rows": self.rows,
+            "imported": self.imported,
+            "rejected": self.rejected,
+            "bytesRead": self.bytes_read,
+            "totalBytes": self.total_bytes,
+            "seconds": round(elapsed, 3),
+            "rowsPerSecond": round(self.rows / elapsed) if elapsed else None,
+            "errors": self.errors,
+            "failure": self.failure,
+        }
+
+
+def import_patients(stream: BinaryIO, fmt: str, repo: PatientRepository,
+                    batch_size: int = 1000, report: Optional[ImportReport] = None,
+                    on_progress: Optional[Callable[[ImportReport], None]] = None) -> ImportReport:
+    """Stream the UTF-8 file `stream` (opened in binary mode) into `repo`,
+    one validated batch per append.
+
+    Rows without a `patient_id` get the next free one; rows whose id
+    already exists are rejected. Rows are numbered from 1 in file order.
+    Progress is counted in bytes of `stream`, like `total_bytes`.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format '{fmt}'")
+    report = report or ImportReport()
+    reader = CountingReader(stream)
+    text = io.TextIOWrapper(io.BufferedReader(reader), encoding="utf-8-sig", newline="")
+    rows = iter_json_records(text) if fmt == "json" else iter_csv_records(text)
+    try:
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            first_row = report.rows + 1
+            report.rows += len(batch)
+            patients, failed = validate_batch(batch)
+            failed_rows = dict(failed)
+            valid_rows = [i for i in range(len(batch)) if i not in failed_rows]
+            for index, message in failed:
+                report.reject(first_row + index, message)
+
+            # Ids are assigned and checked by the repository, under its file lock
+            records = [{"patient_id": patient.patient_id,
+                        **patient.model_dump(mode="json", exclude_none=True)}
+                       for patient in patients]
+            skipped = repo.append(records)
+            for position in skipped:
+                report.reject(first_row + valid_rows[position],
+                              f"patient_id {records[position]['patient_id']} already exists")
+            report.imported += len(records) - len(skipped)
+            report.bytes_read = reader.count
+            if on_progress:
+                on_progress(report)
+    except Exception as exc:
+        report.failure = str(exc)
+        raise
+    finally:
+        report.bytes_read = reader.count
+        report.finished_at = time.time()
+    return report
+
+
+def guess_format(filename: str) -> str:
+    return "csv" if filename.lower().endswith(".csv") else "json"
+
+
+class ImportJobs:
+    """Background imports tracked by id, one running at a time.
+
+    The one-at-a-time rule holds across processes: a running import keeps
+    an exclusive, non-blocking lock on `<patients file>.import.lock`.
+    """
+
+    def __init__(self, repo: PatientRepository, batch_size: int = 1000):
+        self.repo = repo
+        self.batch_size = batch_size
+        self.jobs = {}
+        self._lock = threading.Lock()
+        self._running: Optional[str] = None
+
+    def _acquire(self):
+        """The open, locked import lock file; raises RuntimeError if busy"""
+        if self._running is not None:
+            raise RuntimeError(f"Import {self._running} is still running")
+        lock_file = open(self.repo.path + ".import.lock", "a")
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock_file.close()
+                raise RuntimeError("Another worker is running an import") from None
+        return lock_file
+
+    def check_idle(self):
+        """Raise RuntimeError if an import is running in any process"""
+        with self._lock:
+            self._acquire().close()
+
+    def start(self, path: str, fmt: str, remove_after: bool = False) -> str:
+        """Import `path` on a worker thread; raises RuntimeError if busy"""
+        with self._lock:
+            report = ImportReport(total_bytes=os.path.getsize(path))
+            lock_file = self._acquire()
+            job_id = f"IMP{int(time.time() * 1000)}"
+            self.jobs[job_id] = report
+            self._running = job_id
+        threading.Thread(target=self._run, args=(job_id, path, fmt, remove_after, lock_file),
+                         name=f"import-{job_id}", daemon=True).start()
+        return job_id
+
+    def _run(self, job_id: str, path: str, fmt: str, remove_after: bool, lock_file):
+        try:
+            with open(path, "rb") as f:
+                import_patients(f, fmt, self.repo, self.batch_size, report=self.jobs[job_id])
+        except Exception:
+            pass  # recorded on the report
+        finally:
+            if remove_after:
+                os.remove(path)
+            with self._lock:
+                self._running = None
+                lock_file.close()  # releases the flock
+
+    def get(self, job_id: str) -> Optional[ImportReport]:
+        return self.jobs.get(job_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import patients into the patients file")
+    parser.add_argument("source", help="JSON array, JSON Lines or CSV export")
+    parser.add_argument("--format", choices=FORMATS, help="defaults to the file extension")
+    parser.add_argument("--target", default=os.environ.get("PHYSIO_PATIENTS_FILE", "patients.json"))
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    def progress(report: ImportReport):
+        done = f"{report.bytes_read / report.total_bytes:.0%}" if report.total_bytes else ""
+        print(f"\r{done} rows={report.rows} imported={report.imported} "
+              f"rejected={report.rejected}", end="", file=sys.stderr, flush=True)
+
+    repo = PatientRepository(args.target)
+    report = ImportReport(total_bytes=os.path.getsize(args.source))
+    with open(args.source, "rb") as f:
+        import_patients(f, args.format or guess_format(args.source), repo,
+                        args.batch_size, report=report, on_progress=progress)
+    print(file=sys.stderr)
+    summary = report.to_dict()
+    for error in summary.pop("errors"):
+        print(f"row {error['row']}: {error['error']}", file=sys.stderr)
+    print(json.dumps(summary))
+    return 1 if report.rejected else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
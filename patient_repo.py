@@ -0,0 +1,243 @@
+"""
+PhysioHealth - Patient repository
+Cached patient records with an id index and lazily built sort orders
+"""
+
+import json
+import os
+import threading
+from array import array
+from itertools import chain, islice
+from typing import BinaryIO, Dict, Iterator, List, Optional, Set, Tuple
+
+from fast_json import dumps
+from records import PatientRecord
+from shared_cache import file_lock, write_cache
+
+# Fields the /patients listing can be sorted on
+SORTABLE_FIELDS = (
+    "patient_id", "name", "age", "gender", "disease",
+    "blood_group", "admission_date", "readmitted",
+    "height", "weight", "bmi",
+)
+
+
+def _array_end(f: BinaryIO) -> Tuple[int, bool]:
+    """Offset of a JSON array file's closing bracket, and whether it is empty"""
+    size = f.seek(0, os.SEEK_END)
+    position = size
+    tail = b""
+    while position > 0:
+        step = min(4096, position)
+        position -= step
+        f.seek(position)
+        tail = f.read(step) + tail
+        # Stop once the last non-blank byte before the bracket is in view
+        if tail.rstrip()[:-1].rstrip():
+            break
+    stripped = tail.rstrip()
+    if not stripped.endswith(b"]"):
+        raise ValueError("patients file is not a JSON array")
+    end = position + len(stripped) - 1
+    return end, stripped[:-1].rstrip().endswith(b"[")
+
+
+class PatientRepository:
+    """Patient records loaded once and reloaded when the file changes.
+
+    Records are kept in file order with a `patient_id` -> position index.
+    Sort orders are built the first time a field is sorted on and stored
+    as compact arrays of positions; all of them are dropped when the
+    file's mtime or size changes. Records missing the sort field come
+    last in either direction.
+
+    Records are held as slotted `PatientRecord`s, built straight from the
+    JSON parser; callers convert them with `as_dict` for responses.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._records: List[PatientRecord] = []
+        self._by_id: Dict[int, int] = {}
+        self._max_id = 0
+        # field -> (positions sorted ascending, number with the field set)
+        self._orders: Dict[str, Tuple[array, int]] = {}
+        self._version: Optional[Tuple[int, int]] = None
+        self._loaded = False
+        # Bumped on every full reload; appends keep the same generation
+        self.generation = 0
+
+    def _file_version(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self, version: Optional[Tuple[int, int]]):
+        if version is None:
+            records = []
+        else:
+            with open(self.path, "r", encoding="utf-8") as f:
+                records = json.load(f, object_hook=PatientRecord.from_dict)
+        self._records = records
+        self._by_id = {}
+        for position, record in enumerate(records):
+            patient_id = record.get("patient_id")
+            if patient_id is not None:
+                self._by_id[patient_id] = position
+        self._max_id = max(self._by_id, default=0)
+        self._orders = {}
+        self._version = version
+        self._loaded = True
+        self.generation += 1
+
+    def refresh(self) -> bool:
+        """Reload if the file changed since the last load"""
+        version = self._file_version()
+        if self._loaded and version == self._version:
+            return False
+        with self._lock:
+            if self._loaded and version == self._version:
+                return False
+            self._load(version)
+            return True
+
+    def source(self) -> tuple:
+        """The file's (mtime, size), or () if it does not exist"""
+        return self._file_version() or ()
+
+    def all(self) -> List[PatientRecord]:
+        self.refresh()
+        return self._records
+
+    def __len__(self) -> int:
+        self.refresh()
+        return len(self._records)
+
+    def get(self, patient_id: int) -> Optional[PatientRecord]:
+        self.refresh()
+        position = self._by_id.get(patient_id)
+        return None if position is None else self._records[position]
+
+    def ids(self) -> Set[int]:
+        self.refresh()
+        return set(self._by_id)
+
+    def next_id(self) -> int:
+        self.refresh()
+        return self._max_id + 1
+
+    def append(self, records: List[dict]) -> List[int]:
+        """Append records to the JSON array in place, without rewriting it.
+
+        Records without a `patient_id` are given the next free one; records
+        whose id is taken are left out, and their positions in `records`
+        are returned. Ids are picked under an exclusive lock on
+        `<path>.lock`, after catching up with the file, so processes
+        appending at the same time never hand out the same id.
+
+        The closing bracket is overwritten by the new records followed by
+        a fresh one, so each call costs O(len(records)) regardless of the
+        file size. If the in-memory view was current it is extended in
+        place; otherwise it is reloaded on next access.
+        """
+        if not records:
+            return []
+        with self._write_lock, file_lock(self.path + ".lock"):
+            # Another process may have appended since the last read
+            self.refresh()
+            by_id = self._by_id
+            next_id = self._max_id + 1
+            added: Set[int] = set()
+            kept, skipped = [], []
+            for position, record in enumerate(records):
+                patient_id = record.get("patient_id")
+                if patient_id is None:
+                    while next_id in by_id or next_id in added:
+                        next_id += 1
+                    record["patient_id"] = patient_id = next_id
+                elif patient_id in by_id or patient_id in added:
+                    skipped.append(position)
+                    continue
+                added.add(patient_id)
+                kept.append(record)
+            if not kept:
+                return skipped
+            body = ",\n".join("  " + dumps(record).decode("utf-8") for record in kept)
+            if not os.path.exists(self.path):
+                with open(self.path, "w", encoding="utf-8") as f:
+                    f.write("[]\n")
+            before = self._file_version()
+            with open(self.path, "r+b") as f:
+                end, empty = _array_end(f)
+                f.seek(end)
+                f.write(("\n" if empty else ",\n").encode("utf-8"))
+                f.write(body.encode("utf-8"))
+                f.write(b"\n]\n")
+                f.truncate()
+                f.flush()
+                os.fsync(f.fileno())
+            with self._lock:
+                if self._loaded and before == self._version:
+                    for record in map(PatientRecord.from_dict, kept):
+                        if record.get("patient_id") is not None:
+                            self._by_id[record["patient_id"]] = len(self._records)
+                        self._records.append(record)
+                    self._max_id = max(self._max_id, max(added))
+                    self._orders = {}
+                    self._version = self._file_version()
+        return skipped
+
+    def _order(self, field: str) -> Tuple[List[PatientRecord], array, int]:
+        self.refresh()
+        with self._lock:
+            records = self._records
+            cached = self._orders.get(field)
+            if cached is None:
+                present = [i for i, r in enumerate(records) if r.get(field) is not None]
+                missing = [i for i, r in enumerate(records) if r.get(field) is None]
+                try:
+                    present.sort(key=lambda i: records[i][field])
+                except TypeError:
+                    # Mixed value types: group by type name, then by value
+                    present.sort(key=lambda i: (type(records[i][field]).__name__,
+                                                str(records[i][field])))
+                cached = (array("L", present + missing), len(present))
+                # Other fields come from callers and are not worth keeping
+                if field in SORTABLE_FIELDS:
+                    self._orders[field] = cached
+        return (records, *cached)
+
+    def iter_sorted(self, field: str, descending: bool = False) -> Iterator[PatientRecord]:
+        records, order, present = self._order(field)
+        if descending:
+            positions = chain((order[i] for i in range(present - 1, -1, -1)),
+                              (order[i] for i in range(present, len(order))))
+        else:
+            positions = order
+        for position in positions:
+            yield records[position]
+
+    def sorted(self, field: str, descending: bool = False,
+               limit: Optional[int] = None) -> List[PatientRecord]:
+        return list(islice(self.iter_sorted(field, descending), limit))
+
+    def write_cache(self, path: str) -> int:
+        """Write the records, id index and every sort order as a shared cache file"""
+        while True:
+            self.refresh()
+            generation = self.generation
+            records = self._records
+            count = len(records)
+            version = self._version
+            orders = {field: self._order(field)[1:] for field in SORTABLE_FIELDS}
+            # Retry if the file was reloaded or appended to meanwhile
+            if self.generation == generation and len(self._records) == count:
+                break
+        keys = [record.get("patient_id") for record in records]
+        keys = [key if type(key) is int else None for key in keys]
+        return write_cache(path, [dumps(record) for record in records], keys, orders,
+                           version or ())
@@ -0,0 +1,161 @@
+"""
+PhysioHealth - Patient statistics
+Columnar NumPy view of the patient records for group-by and histogram queries
+"""
+
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from patient_repo import PatientRepository
+
+# Fields stored as categorical codes
+CATEGORICAL_FIELDS = ("gender", "disease", "blood_group")
+
+# Code used for a missing or unparseable value in every column
+MISSING = -1
+
+
+def month_code(value) -> int:
+    """Months since year 0 for a YYYY-MM-DD date string"""
+    try:
+        return int(value[:4]) * 12 + int(value[5:7]) - 1
+    except (TypeError, ValueError):
+        return MISSING
+
+
+class PatientColumns:
+    """Patient records as NumPy arrays, one per field.
+
+    Categorical fields are stored as int32 codes into a per-field list of
+    categories, ages as int16, admission dates as month numbers and
+    `readmitted` as 0/1. The arrays are built from the repository once;
+    when the repository only grew by appends (same generation), `refresh`
+    encodes just the new records. A full reload rebuilds everything.
+    """
+
+    def __init__(self, repo: PatientRepository):
+        self.repo = repo
+        self._lock = threading.Lock()
+        self._generation: Optional[int] = None
+        self._size = 0
+        self._reset()
+
+    def _reset(self):
+        self.categories: Dict[str, List[str]] = {field: [] for field in CATEGORICAL_FIELDS}
+        self._codes: Dict[str, Dict[str, int]] = {field: {} for field in CATEGORICAL_FIELDS}
+        self.columns: Dict[str, np.ndarray] = {
+            "age": np.empty(0, dtype=np.int16),
+            "admission_month": np.empty(0, dtype=np.int32),
+            "readmitted": np.empty(0, dtype=np.int8),
+            **{field: np.empty(0, dtype=np.int32) for field in CATEGORICAL_FIELDS},
+        }
+        self._size = 0
+
+    def refresh(self) -> "PatientColumns":
+        records = self.repo.all()
+        with self._lock:
+            if self.repo.generation != self._generation or len(records) < self._size:
+                self._reset()
+                self._generation = self.repo.generation
+            if len(records) > self._size:
+                self._extend(records[self._size:])
+        return self
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _code(self, field: str, value) -> int:
+        if value is None:
+            return MISSING
+        codes = self._codes[field]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(codes)
+            self.categories[field].append(value)
+        return code
+
+    def _extend(self, records: List[dict]):
+        ages, months, readmitted = [], [], []
+        codes = {field: [] for field in CATEGORICAL_FIELDS}
+        for record in records:
+            age = record.get("age")
+            ages.append(age if type(age) is int and 0 <= age < 2 ** 15 else MISSING)
+            months.append(month_code(record.get("admission_date")))
+            readmitted.append(1 if record.get("readmitted") is True else 0)
+            for field in CATEGORICAL_FIELDS:
+                codes[field].append(self._code(field, record.get(field)))
+
+        new = {
+            "age": np.array(ages, dtype=np.int16),
+            "admission_month": np.array(months, dtype=np.int32),
+            "readmitted": np.array(readmitted, dtype=np.int8),
+            **{field: np.array(codes[field], dtype=np.int32) for field in CATEGORICAL_FIELDS},
+        }
+        # Swap in the extended columns together so queries see a consistent set
+        self.columns = {name: np.concatenate((self.columns[name], column))
+                        for name, column in new.items()}
+        self._size += len(records)
+
+    # Queries
+    def counts(self, field: str) -> Dict[str, int]:
+        """Number of patients per category (or per readmitted flag)"""
+        columns = self.columns
+        if field == "readmitted":
+            readmitted = int(columns["readmitted"].sum())
+            return {"true": readmitted, "false": len(columns["readmitted"]) - readmitted}
+        codes = columns[field]
+        counts = np.bincount(codes[codes != MISSING], minlength=len(self.categories[field]))
+        result = dict(zip(self.categories[field], counts.tolist()))
+        missing = int(np.count_nonzero(codes == MISSING))
+        if missing:
+            result["unknown"] = missing
+        return result
+
+    def readmission_rates(self, field: str) -> List[dict]:
+        """Patients, readmissions and readmission rate per category"""
+        columns = self.columns
+        codes = columns[field]
+        known = codes != MISSING
+        size = len(self.categories[field])
+        totals = np.bincount(codes[known], minlength=size)
+        readmitted = np.bincount(codes[known], weights=columns["readmitted"][known],
+                                 minlength=size).astype(np.int64)
+        return [
+            {field: category, "patients": int(total), "readmitted": int(again),
+             "rate": round(again / total, 4) if total else None}
+            for category, total, again in zip(self.categories[field], totals, readmitted)
+        ]
+
+    def age_histogram(self, bin_width: int = 10) -> List[dict]:
+        ages = self.columns["age"]
+        counts = np.bincount(ages[ages != MISSING] // bin_width)
+        return [{"from": i * bin_width, "to": (i + 1) * bin_width - 1, "count": int(count)}
+                for i, count in enumerate(counts)]
+
+    def admissions_per_month(self) -> Dict[str, int]:
+        """Admissions per calendar month, including empty months in between"""
+        months = self.columns["admission_month"]
+        months = months[months != MISSING]
+        if not len(months):
+            return {}
+        first = int(months.min())
+        counts = np.bincount(months - first)
+        return {f"{(first + i) // 12:04d}-{(first + i) % 12 + 1:02d}": int(count)
+                for i, count in enumerate(counts)}
+
+    def summary(self) -> dict:
+        columns = self.columns
+        ages = columns["age"][columns["age"] != MISSING]
+        size = len(columns["age"])
+        return {
+            "patients": size,
+            "readmissionRate": round(float(columns["readmitted"].mean()), 4) if size else None,
+            "age": {
+                "min": int(ages.min()),
+                "max": int(ages.max()),
+                "mean": round(float(ages.mean()), 2),
+                "median": float(np.median(ages)),
+            } if len(ages) else None,
+        }
@@ -1,7 +1,36 @@
-def insert_patient_data(name, age):
-     print(name)
-     print(age)
-     print('inserted into database')
+"""
+PhysioHealth - Patient model
+Pydantic model for patient records and single-record inserts
+"""
 
-     insert_patient_data('John Doe', 30)
+from datetime import date
+from typing import Literal, Optional
 
+from pydantic import BaseModel, ConfigDict, Field
+
+
+class Patient(BaseModel):
+    # Hospital exports carry extra columns; only known fields are stored
+    model_config = ConfigDict(extra="ignore", str_strip_whitespace=True)
+
+    patient_id: Optional[int] = Field(None, ge=1)
+    name: str = Field(..., min_length=1)
+    age: int = Field(..., ge=0, le=130)
+    gender: str
+    disease: str
+    blood_group: Optional[Literal["A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-"]] = None
+    admission_date: date
+    readmitted: bool = False
+    height: Optional[float] = Field(None, gt=0)
+    weight: Optional[float] = Field(None, gt=0)
+    bmi: Optional[float] = Field(None, gt=0)
+
+
+def insert_patient_data(repo, name: str, age: int, **fields) -> dict:
+    """Validate one patient and append it to the repository's file"""
+    patient = Patient(name=name, age=age, **fields)
+    # The repository assigns a missing id, or refuses a taken one, under its file lock
+    record = {"patient_id": patient.patient_id, **patient.model_dump(mode="json", exclude_none=True)}
+    if repo.append([record]):
+        raise ValueError(f"patient_id {patient.patient_id} already exists")
+    return record
@@ -0,0 +1,244 @@
+"""
+PhysioHealth - Rate limiting
+Per-client, per-route token buckets for the unauthenticated write endpoints
+"""
+
+import asyncio
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from fast_json import dumps
+
+
+class RateLimit:
+    """`burst` requests at once, refilled at `burst` per `period` seconds"""
+
+    __slots__ = ("name", "burst", "period", "interval", "tolerance")
+
+    def __init__(self, name: str, burst: int, period: float):
+        if burst < 1 or period <= 0:
+            raise ValueError(f"Invalid rate limit for {name}: {burst}/{period}")
+        self.name = name
+        self.burst = burst
+        self.period = period
+        # Buckets are kept in GCRA form: one "theoretical arrival time" per
+        # client, which behaves exactly like a token bucket of `burst` tokens
+        self.interval = period / burst
+        self.tolerance = self.interval * (burst - 1)
+
+    @classmethod
+    def parse(cls, name: str, spec: str) -> "RateLimit":
+        """`30/60` -> 30 requests per 60 seconds"""
+        burst, _, period = spec.partition("/")
+        try:
+            return cls(name, int(burst), float(period or 1))
+        except ValueError:
+            raise ValueError(f"Invalid rate limit for {name}: {spec!r}") from None
+
+    def take(self, tat: Optional[float], now: float) -> Tuple[Optional[float], float]:
+        """(new arrival time to store or None if refused, seconds to wait)"""
+        tat = now if tat is None or tat < now else tat
+        wait = tat - now - self.tolerance
+        if wait > 0:
+            return None, wait
+        return tat + self.interval, 0.0
+
+
+class BucketStore:
+    """Holds one arrival time per (route, client) key"""
+
+    # Whether `take` does I/O and has to run off the event loop
+    blocking = False
+
+    def take(self, limit: RateLimit, key: str, now: float) -> float:
+        """Take a token; returns 0 if allowed, else the seconds until one is free"""
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {}
+
+    def close(self):
+        pass
+
+
+class MemoryBuckets(BucketStore):
+    """Buckets in one dict, for a single worker.
+
+    A bucket whose arrival time has passed is full again, which is the
+    same as having no entry, so those are swept out whenever the dict
+    has doubled since the last sweep. Beyond `max_keys` the oldest
+    entries are dropped as well.
+    """
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._tats: Dict[str, float] = {}
+        self._sweep_at = 1024
+        self.allowed = 0
+        self.limited = 0
+
+    def take(self, limit: RateLimit, key: str, now: float) -> float:
+        tats = self._tats
+        tat, wait = limit.take(tats.get(key), now)
+        if tat is None:
+            self.limited += 1
+            return wait
+        tats[key] = tat
+        self.allowed += 1
+        if len(tats) >= self._sweep_at:
+            self._sweep(now)
+        return 0.0
+
+    def _sweep(self, now: float):
+        tats = {key: tat for key, tat in self._tats.items() if tat > now}
+        if len(tats) > self.max_keys:
+            tats = dict(list(tats.items())[-self.max_keys:])
+        self._tats = tats
+        self._sweep_at = max(1024, 2 * len(tats))
+
+    def stats(self) -> dict:
+        return {"backend": "memory", "keys": len(self._tats),
+                "allowed": self.allowed, "limited": self.limited}
+
+
+class SqliteBuckets(BucketStore):
+    """Buckets in a SQLite table shared by all workers on the host.
+
+    Each take is one short write transaction, which can wait on another
+    worker's lock, so the middleware runs it in a thread. The data is
+    disposable, so the database runs without fsync.
+    """
+
+    blocking = True
+
+    def __init__(self, db_path: str, sweep_every: int = 1000):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.db_path = db_path
+        self.sweep_every = sweep_every
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=5,
+                                     isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=OFF")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            " key TEXT PRIMARY KEY,"
+            " tat REAL NOT NULL) WITHOUT ROWID"
+        )
+        self._takes = 0
+        self.allowed = 0
+        self.limited = 0
+
+    def take(self, limit: RateLimit, key: str, now: float) -> float:
+        with self._lock:
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT tat FROM buckets WHERE key = ?", (key,)).fetchone()
+                tat, wait = limit.take(row[0] if row else None, now)
+                if tat is not None:
+                    conn.execute("INSERT OR REPLACE INTO buckets (key, tat) VALUES (?, ?)", (key, tat))
+                self._takes += 1
+                if self._takes % self.sweep_every == 0:
+                    conn.execute("DELETE FROM buckets WHERE tat <= ?", (now,))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        if tat is None:
+            self.limited += 1
+            return wait
+        self.allowed += 1
+        return 0.0
+
+    def stats(self) -> dict:
+        with self._lock:
+            keys = self._conn.execute("SELECT COUNT(*) FROM buckets").fetchone()[0]
+        return {"backend": "sqlite", "keys": keys, "allowed": self.allowed, "limited": self.limited}
+
+    def close(self):
+        self._conn.close()
+
+
+def create_buckets(kind: str, data_dir: str) -> BucketStore:
+    if kind == "memory":
+        return MemoryBuckets()
+    if kind == "sqlite":
+        return SqliteBuckets(os.path.join(data_dir, "ratelimit.db"))
+    raise ValueError(f"Unknown rate limit backend: {kind}")
+
+
+class RateLimiter:
+    """Limits per (method, path) and client address.
+
+    The client is the socket peer. Behind `trusted_proxies` reverse proxies
+    (Render's or ngrok's) it is the X-Forwarded-For entry that many hops
+    from the right: each proxy appends the address it received the request
+    from, so entries further left were written by the client and can be
+    anything. A request that came through fewer proxies than that is keyed
+    on its leftmost entry, or on the peer if it has none.
+    """
+
+    def __init__(self, store: BucketStore, trusted_proxies: int = 0):
+        self.store = store
+        self.trusted_proxies = trusted_proxies
+        self.limits: Dict[Tuple[str, str], RateLimit] = {}
+
+    def limit(self, method: str, path: str, rate: RateLimit):
+        self.limits[(method, path)] = rate
+
+    def client(self, scope) -> str:
+        if self.trusted_proxies:
+            forwarded = [address.strip()
+                         for name, value in scope["headers"] if name == b"x-forwarded-for"
+                         for address in value.decode("latin-1").split(",")]
+            forwarded = [address for address in forwarded if address]
+            if forwarded:
+                return forwarded[-min(self.trusted_proxies, len(forwarded))]
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    async def check(self, scope) -> float:
+        """0 if the request may proceed, else seconds until it may be retried"""
+        rate = self.limits.get((scope["method"], scope["path"]))
+        if rate is None:
+            return 0.0
+        key = f"{rate.name} {self.client(scope)}"
+        if self.store.blocking:
+            return await asyncio.to_thread(self.store.take, rate, key, time.time())
+        return self.store.take(rate, key, time.time())
+
+    def stats(self) -> dict:
+        return dict(self.store.stats(), limits={
+            f"{method} {path}": f"{rate.burst}/{rate.period:g}s"
+            for (method, path), rate in self.limits.items()
+        })
+
+
+TOO_MANY_REQUESTS = dumps({"detail": "Too many requests, please try again later"})
+
+
+class RateLimitMiddleware:
+    """Pure ASGI middleware answering limited requests with 429 before routing"""
+
+    def __init__(self, app, limiter: RateLimiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            wait = await self.limiter.check(scope)
+            if wait:
+                await send({
+                    "type": "http.response.start", "status": 429,
+                    "headers": [(b"content-type", b"application/json"),
+                                (b"content-length", str(len(TOO_MANY_REQUESTS)).encode()),
+                                (b"retry-after", str(math.ceil(wait)).encode())],
+                })
+                await send({"type": "http.response.body", "body": TOO_MANY_REQUESTS})
+                return
+        await self.app(scope, receive, send)
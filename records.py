@@ -0,0 +1,104 @@
+"""
+PhysioHealth - Compact records
+Slotted record classes with interned values for data kept resident in memory
+"""
+
+import sys
+from typing import Dict, Optional, Tuple
+
+# Marks a field absent from the source dict, so `to_dict` round-trips exactly
+_ABSENT = object()
+
+
+class CompactRecord:
+    """A flat record stored in slots instead of a per-record dict.
+
+    Subclasses list their `FIELDS`; values of the `INTERNED` fields are
+    shared through a per-class pool, so repeated doctors, services, dates
+    and the like are stored once. Keys outside `FIELDS` are kept in
+    `_extra`. Records convert back to plain dicts with `to_dict` at the
+    response boundary and support `get` for filters in between.
+    """
+
+    __slots__ = ("_extra",)
+    FIELDS: Tuple[str, ...] = ()
+    INTERNED: Tuple[str, ...] = ()
+    _fields: frozenset = frozenset()
+    _interned: frozenset = frozenset()
+    _pool: Dict[tuple, object] = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._fields = frozenset(cls.FIELDS)
+        cls._interned = frozenset(cls.INTERNED)
+        cls._pool = {}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "CompactRecord":
+        record = cls.__new__(cls)
+        pool = cls._pool
+        for field in cls.FIELDS:
+            value = data.get(field, _ABSENT)
+            if field in cls._interned and value is not _ABSENT:
+                if type(value) is str:
+                    value = sys.intern(value)
+                else:
+                    # Keyed by type too, so 1000 and 1000.0 stay distinct
+                    try:
+                        value = pool.setdefault((type(value), value), value)
+                    except TypeError:  # unhashable; stored as is
+                        pass
+            setattr(record, field, value)
+        extra = {key: value for key, value in data.items() if key not in cls._fields}
+        record._extra = extra or None
+        return record
+
+    def get(self, key: str, default=None):
+        if key in self._fields:
+            value = getattr(self, key)
+            return default if value is _ABSENT else value
+        if self._extra:
+            return self._extra.get(key, default)
+        return default
+
+    def __getitem__(self, key: str):
+        value = self.get(key, _ABSENT)
+        if value is _ABSENT:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key, _ABSENT) is not _ABSENT
+
+    def to_dict(self) -> dict:
+        data = {}
+        for field in self.FIELDS:
+            value = getattr(self, field)
+            if value is not _ABSENT:
+                data[field] = value
+        if self._extra:
+            data.update(self._extra)
+        return data
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+class AppointmentRecord(CompactRecord):
+    FIELDS = ("name", "email", "phone", "doctor", "service", "date", "time",
+              "isRegularPatient", "originalPrice", "discount", "finalPrice",
+              "bookingId", "createdAt")
+    INTERNED = ("doctor", "service", "date", "time", "originalPrice", "discount", "finalPrice")
+    __slots__ = FIELDS
+
+
+class PatientRecord(CompactRecord):
+    FIELDS = ("patient_id", "name", "age", "gender", "disease", "blood_group",
+              "admission_date", "readmitted", "height", "weight", "bmi")
+    INTERNED = ("gender", "disease", "blood_group", "admission_date", "age")
+    __slots__ = FIELDS
+
+
+def as_dict(record) -> Optional[dict]:
+    """Plain dict for a compact record; dicts and None pass through"""
+    return record.to_dict() if isinstance(record, CompactRecord) else record
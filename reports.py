@@ -0,0 +1,137 @@
+"""
+PhysioHealth - Booking reports
+Revenue rollups per day, doctor and service, kept in step with the appointments log
+
+Usage: python reports.py [--by day|doctor|service] [--from YYYY-MM-DD] [--to YYYY-MM-DD]
+"""
+
+import argparse
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from storage import DELETE_OP, create_engine
+
+DIMENSIONS = ("day", "doctor", "service")
+
+
+class Bucket:
+    """Running totals for one group of appointments"""
+
+    __slots__ = ("bookings", "gross", "discount", "regular")
+
+    def __init__(self):
+        self.bookings = 0
+        self.gross = 0.0
+        self.discount = 0.0
+        self.regular = 0
+
+    def add(self, other: "Bucket", sign: int = 1):
+        self.bookings += sign * other.bookings
+        self.gross += sign * other.gross
+        self.discount += sign * other.discount
+        self.regular += sign * other.regular
+
+    def to_dict(self) -> dict:
+        return {
+            "bookings": self.bookings,
+            "grossRevenue": round(self.gross, 2),
+            "discountGiven": round(self.discount, 2),
+            "netRevenue": round(self.gross - self.discount, 2),
+            "regularPatients": self.regular,
+            "regularShare": round(self.regular / self.bookings, 4) if self.bookings else None,
+        }
+
+
+def contribution(record: dict) -> Tuple[Tuple[str, str, str], Bucket]:
+    """Rollup cell key and totals for one appointment record"""
+    bucket = Bucket()
+    bucket.bookings = 1
+    bucket.gross = float(record.get("originalPrice") or 0)
+    bucket.discount = float(record.get("discount") or 0)
+    bucket.regular = 1 if record.get("isRegularPatient") else 0
+    key = (record.get("date") or "", record.get("doctor") or "", record.get("service") or "")
+    return key, bucket
+
+
+class RevenueRollups:
+    """Booking totals per (day, doctor, service) cell.
+
+    `apply` is subscribed to the appointments log, so every booking adds
+    its contribution to one cell and every cancellation subtracts it
+    again. Reports aggregate cells, so they cost O(cells) however many
+    appointments there are. `rebuild` recomputes everything from a full
+    list of records.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cells: Dict[Tuple[str, str, str], Bucket] = {}
+        # bookingId -> contributions, so tombstones can be subtracted
+        self._by_id: Dict[str, List[Tuple[Tuple[str, str, str], Bucket]]] = {}
+
+    def apply(self, entries: list, rebuilt: bool = False):
+        with self._lock:
+            if rebuilt:
+                self._cells.clear()
+                self._by_id.clear()
+            for entry in entries:
+                if DELETE_OP in entry:
+                    booked = self._by_id.get(entry[DELETE_OP]["value"])
+                    if booked:
+                        key, bucket = booked.pop(0)
+                        self._cells[key].add(bucket, -1)
+                        if not self._cells[key].bookings:
+                            del self._cells[key]
+                        if not booked:
+                            del self._by_id[entry[DELETE_OP]["value"]]
+                    continue
+                key, bucket = contribution(entry)
+                self._cells.setdefault(key, Bucket()).add(bucket)
+                self._by_id.setdefault(entry.get("bookingId"), []).append((key, bucket))
+
+    def rebuild(self, records: list):
+        self.apply(records, rebuilt=True)
+
+    def report(self, by: Optional[str] = None, date_from: Optional[str] = None,
+               date_to: Optional[str] = None) -> Tuple[dict, List[dict]]:
+        """Overall totals and, when `by` is given, totals per group"""
+        position = DIMENSIONS.index(by) if by else None
+        total = Bucket()
+        groups: Dict[str, Bucket] = {}
+        with self._lock:
+            for key, bucket in self._cells.items():
+                if (date_from and key[0] < date_from) or (date_to and key[0] > date_to):
+                    continue
+                total.add(bucket)
+                if position is not None:
+                    groups.setdefault(key[position], Bucket()).add(bucket)
+        rows = [{by: name, **groups[name].to_dict()} for name in sorted(groups)]
+        return total.to_dict(), rows
+
+    def stats(self) -> dict:
+        return {"cells": len(self._cells), "bookings": len(self._by_id)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute booking reports from the appointments log")
+    parser.add_argument("--by", choices=DIMENSIONS)
+    parser.add_argument("--from", dest="date_from")
+    parser.add_argument("--to", dest="date_to")
+    parser.add_argument("--storage", default=os.environ.get("PHYSIO_STORAGE", "jsonl"))
+    parser.add_argument("--data-dir", default="data")
+    args = parser.parse_args()
+
+    storage = create_engine(args.storage, args.data_dir)
+    rollups = RevenueRollups()
+    try:
+        rollups.rebuild(storage.load("appointments"))
+    finally:
+        storage.close()
+    total, groups = rollups.report(args.by, args.date_from, args.date_to)
+    print(json.dumps({"total": total, "groups": groups} if args.by else total, indent=2))
+
+
+if __name__ == "__main__":
+    main()
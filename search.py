@@ -0,0 +1,212 @@
+"""
+PhysioHealth - Message search
+Full-text search over contact messages and chat history (SQLite FTS5)
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+from datetime import date, timedelta
+from typing import Iterable, List, Optional, Tuple
+
+from fast_json import RawJSON, dumps
+from storage import DELETE_OP
+
+# Fields indexed per kind of document, and the field holding its timestamp
+KINDS = {
+    "contact": (("name", "email", "subject", "message"), "createdAt"),
+    "chat": (("message", "response"), "timestamp"),
+}
+
+TOKEN = re.compile(r"\w+\*?", re.UNICODE)
+
+# Bumped when document keys change; an older index is dropped and rebuilt
+# from the contacts log and the chat segments on the next start
+SCHEMA_VERSION = 2
+
+
+def fts_query(text: str) -> Optional[str]:
+    """User query -> FTS5 query where every word must match.
+
+    Words are quoted so FTS5 operators in the input are taken literally;
+    a trailing `*` makes a word a prefix match (`physio*`).
+    """
+    terms = []
+    for token in TOKEN.findall(text):
+        word = token.rstrip("*")
+        if word:
+            terms.append(f'"{word}"*' if token.endswith("*") else f'"{word}"')
+    return " ".join(terms) or None
+
+
+class MessageSearch:
+    """An FTS5 index over stored messages, shared by all workers.
+
+    `documents` keeps each message's JSON with its kind, key and
+    timestamp; `documents_fts` is a contentless FTS5 table over the
+    indexed fields, keyed by the document's rowid. Documents are inserted
+    with INSERT OR IGNORE on (kind, key), so every worker can feed the
+    same messages (e.g. contacts polled from the shared log) without
+    duplicates. The key is the message id plus a digest of the message,
+    so messages that share an id (older clients chose their own) are
+    still indexed separately. Results come newest first, and the rowid
+    of the last result is the cursor for the next page.
+    """
+
+    def __init__(self, db_path: str):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            if self._conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+                for table in ("documents", "days", "documents_fts"):
+                    self._conn.execute(f"DROP TABLE IF EXISTS {table}")
+                self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " docid INTEGER PRIMARY KEY,"
+            " kind TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " created TEXT NOT NULL,"
+            " data TEXT NOT NULL,"
+            " UNIQUE (kind, key))"
+        )
+        # Lowest and highest docid per day, to turn a date range into a rowid range
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS days ("
+            " kind TEXT NOT NULL,"
+            " day TEXT NOT NULL,"
+            " low INTEGER NOT NULL,"
+            " high INTEGER NOT NULL,"
+            " PRIMARY KEY (kind, day)) WITHOUT ROWID"
+        )
+        self._conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5("
+            " body, content='', prefix='2 3', tokenize='unicode61 remove_diacritics 2')"
+        )
+        self._conn.commit()
+        self.indexed = 0
+
+    @staticmethod
+    def document_key(kind: str, record: dict) -> str:
+        """`<id or timestamp>:<digest of the whole message>`"""
+        # Chat messages logged before they had IDs go by their timestamp
+        prefix = record.get("id") or record.get(KINDS[kind][1]) or ""
+        canonical = json.dumps(record, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return f"{prefix}:{hashlib.blake2b(canonical.encode('utf-8'), digest_size=8).hexdigest()}"
+
+    def add(self, kind: str, records: Iterable[dict]) -> int:
+        """Index records of one kind in a single transaction; returns how many were new"""
+        fields, time_field = KINDS[kind]
+        added = 0
+        days = {}
+        with self._lock, self._conn:
+            for record in records:
+                created = record.get(time_field) or ""
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO documents (kind, key, created, data) VALUES (?, ?, ?, ?)",
+                    (kind, self.document_key(kind, record), created, dumps(record).decode("utf-8")),
+                )
+                if cursor.rowcount:
+                    docid = cursor.lastrowid
+                    body = "\n".join(str(record.get(field) or "") for field in fields)
+                    self._conn.execute("INSERT INTO documents_fts (rowid, body) VALUES (?, ?)",
+                                       (docid, body))
+                    low, high = days.get(created[:10], (docid, docid))
+                    days[created[:10]] = (min(low, docid), max(high, docid))
+                    added += 1
+            self._conn.executemany(
+                "INSERT INTO days (kind, day, low, high) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT (kind, day) DO UPDATE"
+                " SET low = MIN(low, excluded.low), high = MAX(high, excluded.high)",
+                [(kind, day, low, high) for day, (low, high) in days.items()],
+            )
+        self.indexed += added
+        return added
+
+    def count(self, kind: str) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM documents WHERE kind = ?", (kind,)
+            ).fetchone()[0]
+
+    def contains(self, kind: str, record: dict) -> bool:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM documents WHERE kind = ? AND key = ?",
+                (kind, self.document_key(kind, record)),
+            ).fetchone() is not None
+
+    def search(self, kind: str, text: str, date_from: Optional[str] = None,
+               date_to: Optional[str] = None, limit: int = 50,
+               after: Optional[str] = None) -> Tuple[List[RawJSON], Optional[str]]:
+        """Matching documents, newest first, and the cursor for the next page"""
+        query = fts_query(text)
+        if query is None:
+            return [], None
+        if after is not None and not after.isdigit():
+            raise ValueError("Invalid cursor")
+        sql = ["SELECT d.docid, d.data FROM documents_fts f JOIN documents d ON d.docid = f.rowid"
+               " WHERE documents_fts MATCH ? AND d.kind = ?"]
+        params: list = [query, kind]
+        if after is not None:
+            sql.append("AND f.rowid < ?")
+            params.append(int(after))
+        if date_from:
+            sql.append("AND d.created >= ?")
+            params.append(date_from)
+        if date_to:
+            # Inclusive of the whole day, for both dates and timestamps
+            sql.append("AND d.created < ?")
+            params.append((date.fromisoformat(date_to) + timedelta(days=1)).isoformat())
+        sql.append("ORDER BY f.rowid DESC LIMIT ?")
+        params.append(limit + 1)
+        with self._lock:
+            if date_from or date_to:
+                # Only scan the rowids of documents from the days in range
+                low, high = self._conn.execute(
+                    "SELECT MIN(low), MAX(high) FROM days WHERE kind = ? AND day >= ? AND day <= ?",
+                    (kind, (date_from or "")[:10], (date_to or "\uffff")[:10]),
+                ).fetchone()
+                if low is None:
+                    return [], None
+                sql.insert(1, "AND f.rowid BETWEEN ? AND ?")
+                params[2:2] = [low, high]
+            rows = self._conn.execute(" ".join(sql), params).fetchall()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = str(rows[-1][0])
+        return [RawJSON(data.encode("utf-8")) for _, data in rows], next_cursor
+
+    # Feeds
+    def apply_contacts(self, entries: list, rebuilt: bool = False):
+        """Storage listener for the contacts log"""
+        records = [entry for entry in entries if DELETE_OP not in entry]
+        if rebuilt and records and self.count("contact") >= len(records) \
+                and self.contains("contact", records[-1]):
+            # Startup or compaction: everything is indexed already
+            return
+        self.add("contact", records)
+
+    def add_chats(self, entries: list):
+        """ChatLogger flush hook"""
+        self.add("chat", entries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._conn.execute(
+                "SELECT kind, COUNT(*) FROM documents GROUP BY kind"
+            ).fetchall())
+        return {"documents": counts, "indexed": self.indexed}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
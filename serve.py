@@ -0,0 +1,69 @@
+"""
+PhysioHealth - Production server
+The clinic API (app.py) and the patient API (main.py) as one ASGI app,
+served by uvicorn with several worker processes
+
+Usage: python serve.py [--workers 4] [--host 0.0.0.0] [--port 8000]
+"""
+
+import argparse
+import os
+from contextlib import AsyncExitStack, asynccontextmanager
+
+# The patient API is mounted under this prefix; everything else is the clinic app
+PATIENT_API_PREFIX = os.environ.get("PHYSIO_PATIENT_API_PREFIX", "/patient-api")
+
+
+def create_app():
+    """The combined app, built in each worker process (uvicorn `factory=True`).
+
+    Both apps' lifespans run on startup and shutdown; Starlette does not
+    run the lifespan of a mounted app by itself.
+    """
+    from starlette.applications import Starlette
+    from starlette.routing import Mount
+
+    from app import app as clinic_app
+    from main import app as patient_app
+
+    @asynccontextmanager
+    async def lifespan(_):
+        async with AsyncExitStack() as stack:
+            for sub_app in (clinic_app, patient_app):
+                await stack.enter_async_context(sub_app.router.lifespan_context(sub_app))
+            yield
+
+    return Starlette(routes=[Mount(PATIENT_API_PREFIX, app=patient_app),
+                             Mount("/", app=clinic_app)],
+                     lifespan=lifespan)
+
+
+def configure_workers(workers: int):
+    """Settings every worker needs to share state with the others.
+
+    Set before uvicorn starts the workers, which inherit the environment;
+    explicit settings win.
+    """
+    # Read endpoints of the patient API serve one memory-mapped copy of the records
+    os.environ.setdefault("PHYSIO_SHARED_CACHE", "1")
+    if workers > 1:
+        # Rate limits have to be counted across workers to mean anything
+        os.environ.setdefault("PHYSIO_RATE_LIMIT_BACKEND", "sqlite")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", "8000")))
+    parser.add_argument("--workers", type=int,
+                        default=int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 1)))
+    args = parser.parse_args()
+    configure_workers(args.workers)
+
+    import uvicorn
+    uvicorn.run("serve:create_app", factory=True, host=args.host, port=args.port,
+                workers=args.workers, proxy_headers=True)
+
+
+if __name__ == "__main__":
+    main()
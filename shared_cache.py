@@ -0,0 +1,227 @@
+"""
+PhysioHealth - Shared read cache
+Read-only record files memory-mapped by every worker process
+"""
+
+import bisect
+import json
+import mmap
+import os
+import struct
+import threading
+from array import array
+from contextlib import contextmanager
+from itertools import chain, islice
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from fast_json import RawJSON
+from storage import fsync_dir
+
+try:
+    import fcntl
+except ImportError:  # Windows: rebuilds are only serialised within a process
+    fcntl = None
+
+MAGIC = b"PHCACHE1"
+# Magic, then the length of the JSON header that follows it
+PREAMBLE = struct.Struct("<8sI")
+
+
+@contextmanager
+def file_lock(path: str):
+    with open(path, "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def write_cache(path: str, records: List[bytes], keys: List[Optional[int]],
+                orders: Dict[str, Tuple[array, int]], source) -> int:
+    """Write encoded records, a key index and sort orders as one mappable file.
+
+    The records are laid out as a JSON array, so the whole list can be
+    served as one slice. `keys[i]` is record i's integer key (or None),
+    `orders` maps a field to (record positions in sorted order, number of
+    records that have the field), and `source` identifies the data the
+    file was built from. Written to a temporary file and renamed over
+    `path`, so readers only ever map complete files.
+    """
+    keyed = sorted((key, position) for position, key in enumerate(keys) if key is not None)
+    sections = [
+        ("offsets", array("Q")),
+        ("keys", array("q", [key for key, _ in keyed])),
+        ("key_positions", array("L", [position for _, position in keyed])),
+    ]
+    offsets = sections[0][1]
+    for field, (positions, _) in orders.items():
+        sections.append((f"order:{field}", array("L", positions)))
+
+    body = bytearray(b"[")
+    for position, record in enumerate(records):
+        if position:
+            body += b","
+        offsets.append(len(body))
+        body += record
+    # Record i ends one byte (its separator) before record i + 1 starts
+    offsets.append(len(body) + 1)
+    body += b"]"
+
+    # Section offsets are relative to the end of the header, each 8-byte aligned
+    layout = {}
+    position = 0
+    for name, values in sections:
+        layout[name] = [position, len(values)]
+        position += len(values) * values.itemsize
+        position += -position % 8
+    layout["body"] = [position, len(body)]
+    header = json.dumps({
+        "count": len(records), "source": list(source), "sections": layout,
+        "orders": {field: present for field, (_, present) in orders.items()},
+        "types": {name: values.typecode for name, values in sections},
+    }).encode("utf-8")
+    header += b" " * (-(PREAMBLE.size + len(header)) % 8)
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(PREAMBLE.pack(MAGIC, len(header)))
+        f.write(header)
+        start = f.tell()
+        for name, values in sections:
+            f.seek(start + layout[name][0])
+            values.tofile(f)
+        f.seek(start + layout["body"][0])
+        f.write(body)
+        f.flush()
+        os.fsync(f.fileno())
+        size = f.tell()
+    os.replace(tmp_path, path)
+    fsync_dir(os.path.dirname(path) or ".")
+    return size
+
+
+class MappedRecords:
+    """A cache file written by `write_cache`, mapped read-only.
+
+    Every worker maps the same file, so its pages live once in the OS
+    page cache however many processes serve from it. Records come out as
+    their stored JSON bytes (wrapped in RawJSON for responses) and are
+    never parsed into per-worker objects.
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.inode = os.fstat(f.fileno()).st_ino
+        magic, header_size = PREAMBLE.unpack_from(self._map)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a shared cache file")
+        start = PREAMBLE.size + header_size
+        header = json.loads(self._map[PREAMBLE.size:start])
+        self.count = header["count"]
+        self.source = tuple(header["source"])
+        self.present = header["orders"]
+        view = memoryview(self._map)
+        self._sections = {}
+        for name, (offset, length) in header["sections"].items():
+            if name == "body":
+                self._body = (start + offset, start + offset + length)
+                continue
+            typecode = header["types"][name]
+            size = array(typecode).itemsize
+            self._sections[name] = view[start + offset:start + offset + length * size].cast(typecode)
+        self._offsets = self._sections["offsets"]
+        self._keys = self._sections["keys"]
+
+    def __len__(self) -> int:
+        return self.count
+
+    def record(self, position: int) -> bytes:
+        base = self._body[0]
+        return self._map[base + self._offsets[position]:base + self._offsets[position + 1] - 1]
+
+    def get(self, key: int) -> Optional[bytes]:
+        i = bisect.bisect_left(self._keys, key)
+        if i == len(self._keys) or self._keys[i] != key:
+            return None
+        return self.record(self._sections["key_positions"][i])
+
+    def json_array(self) -> bytes:
+        """Every record as one JSON array"""
+        return self._map[self._body[0]:self._body[1]]
+
+    def has_order(self, field: str) -> bool:
+        return field in self.present
+
+    def sorted(self, field: str, descending: bool = False,
+               limit: Optional[int] = None) -> List[RawJSON]:
+        """Records sorted on `field`; records without it come last either way"""
+        order = self._sections[f"order:{field}"]
+        present = self.present[field]
+        if descending:
+            positions: Iterable[int] = (order[i] for i in chain(range(present - 1, -1, -1),
+                                                                range(present, len(order))))
+        else:
+            positions = order
+        return [RawJSON(self.record(position)) for position in islice(positions, limit)]
+
+
+class SharedCache:
+    """Keeps a `MappedRecords` in step with the data it was built from.
+
+    `current()` compares the mapped file's source with `source()` (e.g.
+    the data file's mtime and size). When they differ it maps the cache
+    file again if another worker has already rebuilt it, or else calls
+    `build(path)` to rebuild it, holding a lock file so only one process
+    does so at a time.
+    """
+
+    def __init__(self, path: str, source: Callable[[], tuple], build: Callable[[str], None]):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.source = source
+        self.build = build
+        self._view: Optional[MappedRecords] = None
+        self._lock = threading.Lock()
+        self.builds = 0
+        self.maps = 0
+
+    def current(self) -> MappedRecords:
+        source = tuple(self.source())
+        view = self._view
+        if view is not None and view.source == source:
+            return view
+        with self._lock:
+            view = self._map_if(source)
+            if view is None:
+                with file_lock(self.path + ".lock"):
+                    view = self._map_if(source)
+                    if view is None:
+                        self.build(self.path)
+                        self.builds += 1
+                        # Mapped even if the data moved on meanwhile; the
+                        # next call notices and rebuilds again
+                        view = self._map_if(None)
+            self._view = view
+        return view
+
+    def _map_if(self, source: Optional[tuple]) -> Optional[MappedRecords]:
+        """The cache file, if it was built from `source` (any source if None)"""
+        view = self._view
+        try:
+            if view is None or os.stat(self.path).st_ino != view.inode:
+                view = MappedRecords(self.path)
+                self.maps += 1
+        except (FileNotFoundError, ValueError):
+            return None
+        if source is not None and view.source != source:
+            return None
+        return view
+
+    def stats(self) -> dict:
+        view = self._view
+        return {"path": self.path, "records": len(view) if view else 0,
+                "builds": self.builds, "maps": self.maps}
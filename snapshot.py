@@ -0,0 +1,423 @@
+"""
+PhysioHealth - Snapshots
+Online, incremental, compressed backups of the data directory
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from datetime import datetime
+from typing import Iterator, List, Optional
+
+from ids import new_id
+from storage import StorageEngine, create_engine, fsync_dir
+
+# Collections held by the storage engine
+COLLECTIONS = ("appointments", "contacts")
+# Small files copied whole (and skipped when unchanged since the parent)
+EXTRA_FILES = ("catalog.json",)
+# Indexes rebuilt from the restored data on the next start
+DERIVED_FILES = ("search.db", "search.db-wal", "search.db-shm")
+
+MANIFEST = "manifest.json"
+# Files are stored in gzip parts of at most this many bytes, so parts
+# can be compressed and restored in parallel
+PART_BYTES = 64 * 1024 * 1024
+CHUNK_BYTES = 1024 * 1024
+# Tail of an append-only file compared to tell that it has only grown
+MARK_BYTES = 64 * 1024
+DEFAULT_LEVEL = 3
+
+_snapshot_lock = threading.Lock()
+
+
+class Source:
+    """An open file being snapshotted; only its first `size` bytes are copied"""
+
+    def __init__(self, name: str, f, size: int, identity: Optional[int]):
+        self.name = name
+        self.f = f
+        self.size = size
+        self.identity = identity
+        # Parts are read from several threads through one file position
+        self._lock = threading.Lock()
+
+    def read(self, offset: int, length: int) -> Iterator[bytes]:
+        end = offset + length
+        while offset < end:
+            with self._lock:
+                self.f.seek(offset)
+                chunk = self.f.read(min(CHUNK_BYTES, end - offset))
+            if not chunk:
+                raise ValueError(f"{self.name} shrank while being copied")
+            offset += len(chunk)
+            yield chunk
+
+    def sha256(self, offset: int, length: int) -> str:
+        digest = hashlib.sha256()
+        for chunk in self.read(offset, length):
+            digest.update(chunk)
+        return digest.hexdigest()
+
+    def mark(self, size: int) -> str:
+        start = max(0, size - MARK_BYTES)
+        return self.sha256(start, size - start)
+
+
+def complete_lines(f, size: int) -> int:
+    """Size of `f` up to its last newline, leaving out a line being written"""
+    end = size
+    while end > 0:
+        start = max(0, end - CHUNK_BYTES)
+        f.seek(start)
+        newline = f.read(end - start).rfind(b"\n")
+        if newline >= 0:
+            return start + newline + 1
+        end = start
+    return 0
+
+
+def _open_chat_segments(stack: ExitStack, chat_dir: str) -> List[Source]:
+    """Chat segments are append-only, so they are snapshotted like logs"""
+    try:
+        names = sorted(n for n in os.listdir(chat_dir) if n.startswith("chat-") and n.endswith(".jsonl"))
+    except FileNotFoundError:
+        return []
+    sources = []
+    for name in names:
+        f = stack.enter_context(open(os.path.join(chat_dir, name), "rb"))
+        stat = os.fstat(f.fileno())
+        sources.append(Source(f"chat/{name}", f, complete_lines(f, stat.st_size), stat.st_ino))
+    return sources
+
+
+def _open_files(stack: ExitStack, data_dir: str, names) -> List[Source]:
+    sources = []
+    for name in names:
+        try:
+            f = stack.enter_context(open(os.path.join(data_dir, name), "rb"))
+        except FileNotFoundError:
+            continue
+        sources.append(Source(name, f, os.fstat(f.fileno()).st_size, None))
+    return sources
+
+
+def _plan(source: Source, previous: Optional[dict]) -> dict:
+    """Manifest entry for `source`, reusing the parent snapshot's parts where possible.
+
+    An append-only file with the same identity that has not shrunk, and
+    still ends its old length with the same bytes, keeps the parent's
+    parts and only needs its new bytes copied. Other files are reused
+    whole when their hash is unchanged.
+    """
+    entry = {"size": source.size, "parts": []}
+    if source.identity is not None:
+        entry["identity"] = source.identity
+        entry["mark"] = source.mark(source.size)
+        if previous and previous.get("identity") == source.identity \
+                and previous["size"] <= source.size \
+                and source.mark(previous["size"]) == previous["mark"]:
+            entry["parts"] = list(previous["parts"])
+    else:
+        entry["sha256"] = source.sha256(0, source.size)
+        if previous and previous.get("sha256") == entry["sha256"]:
+            entry["parts"] = list(previous["parts"])
+    return entry
+
+
+def _write_part(source: Source, offset: int, length: int, path: str, level: int) -> dict:
+    digest = hashlib.sha256()
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # gzip framing
+    with open(path, "wb") as out:
+        for chunk in source.read(offset, length):
+            digest.update(chunk)
+            out.write(compressor.compress(chunk))
+        out.write(compressor.flush())
+        out.flush()
+        os.fsync(out.fileno())
+        stored = out.tell()
+    return {"file": os.path.basename(path), "offset": offset, "length": length,
+            "sha256": digest.hexdigest(), "stored": stored}
+
+
+def list_snapshots(dest: str) -> List[dict]:
+    """Manifests of the complete snapshots in `dest`, oldest first, without file lists"""
+    try:
+        names = sorted(n for n in os.listdir(dest) if not n.startswith("."))
+    except FileNotFoundError:
+        return []
+    snapshots = []
+    for name in names:
+        try:
+            manifest = read_manifest(dest, name)
+        except (FileNotFoundError, ValueError):
+            continue
+        manifest.pop("files")
+        snapshots.append(manifest)
+    return snapshots
+
+
+def read_manifest(dest: str, snapshot_id: str) -> dict:
+    if snapshot_id == "latest":
+        snapshots = list_snapshots(dest)
+        if not snapshots:
+            raise FileNotFoundError(f"No snapshots in {dest}")
+        snapshot_id = snapshots[-1]["id"]
+    if os.path.basename(snapshot_id) != snapshot_id or snapshot_id.startswith("."):
+        raise ValueError(f"Invalid snapshot id: {snapshot_id!r}")
+    with open(os.path.join(dest, snapshot_id, MANIFEST), "rb") as f:
+        return json.load(f)
+
+
+def _chain(snapshots: List[dict], snapshot_id: str) -> List[str]:
+    """`snapshot_id` and its ancestors, newest first, as far as they exist"""
+    parents = {snapshot["id"]: snapshot["parent"] for snapshot in snapshots}
+    chain = []
+    while snapshot_id in parents and snapshot_id not in chain:
+        chain.append(snapshot_id)
+        snapshot_id = parents[snapshot_id]
+    return chain
+
+
+def create_snapshot(storage: StorageEngine, data_dir: str, dest: str, full: bool = False,
+                    level: int = DEFAULT_LEVEL, workers: int = 1,
+                    chat_dir: Optional[str] = None, max_chain: Optional[int] = None) -> dict:
+    """Copy the data directory into a new snapshot under `dest` while writes go on.
+
+    The storage collections are captured at one instant, and chat
+    segments up to their last complete line. Unless `full` is set the
+    snapshot is incremental: it only stores what changed since the
+    latest snapshot in `dest` and refers to that snapshot's parts for
+    the rest. With `max_chain`, a snapshot that would make the chain of
+    incremental snapshots longer than that is taken in full instead, so
+    `prune_snapshots` can drop older chains. The snapshot is written to
+    a hidden directory and renamed into place once complete; returns its
+    manifest without file lists.
+    """
+    chat_dir = chat_dir or os.path.join(data_dir, "chat")
+    with _snapshot_lock:
+        started = time.perf_counter()
+        os.makedirs(dest, exist_ok=True)
+        snapshots = [] if full else list_snapshots(dest)
+        if snapshots and max_chain and len(_chain(snapshots, snapshots[-1]["id"])) >= max_chain:
+            snapshots = []
+        parent = read_manifest(dest, snapshots[-1]["id"]) if snapshots else None
+        snapshot_id = new_id()
+        work_dir = os.path.join(dest, f".{snapshot_id}.partial")
+        os.makedirs(work_dir)
+        try:
+            with ExitStack() as stack:
+                sources = [Source(name, f, size, identity) for name, f, size, identity
+                           in stack.enter_context(storage.snapshot_files(list(COLLECTIONS)))]
+                sources += _open_chat_segments(stack, chat_dir)
+                sources += _open_files(stack, data_dir, EXTRA_FILES)
+
+                files = {}
+                jobs = []
+                for source in sources:
+                    entry = _plan(source, parent["files"].get(source.name) if parent else None)
+                    files[source.name] = entry
+                    copied = entry["parts"][-1]["offset"] + entry["parts"][-1]["length"] \
+                        if entry["parts"] else 0
+                    for offset in range(copied, source.size, PART_BYTES):
+                        jobs.append((entry, source, offset, min(PART_BYTES, source.size - offset)))
+
+                with ThreadPoolExecutor(max(1, workers)) as pool:
+                    futures = [
+                        pool.submit(_write_part, source, offset, length,
+                                    os.path.join(work_dir, f"{number:05d}.gz"), level)
+                        for number, (_, source, offset, length) in enumerate(jobs)
+                    ]
+                    for (entry, _, _, _), future in zip(jobs, futures):
+                        entry["parts"].append(dict(future.result(), snapshot=snapshot_id))
+
+            manifest = {
+                "id": snapshot_id,
+                "parent": parent["id"] if parent else None,
+                "createdAt": datetime.now().isoformat(timespec="seconds"),
+                "bytes": sum(entry["size"] for entry in files.values()),
+                "copied": sum(length for _, _, _, length in jobs),
+                "stored": sum(part["stored"] for entry in files.values()
+                              for part in entry["parts"] if part["snapshot"] == snapshot_id),
+                "seconds": round(time.perf_counter() - started, 3),
+                "files": files,
+            }
+            with open(os.path.join(work_dir, MANIFEST), "w", encoding="utf-8") as f:
+                json.dump(manifest, f, indent=1)
+                f.flush()
+                os.fsync(f.fileno())
+            fsync_dir(work_dir)
+            os.rename(work_dir, os.path.join(dest, snapshot_id))
+            fsync_dir(dest)
+        except BaseException:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            raise
+    manifest.pop("files")
+    return manifest
+
+
+def prune_snapshots(dest: str, keep: int) -> List[str]:
+    """Delete all but the `keep` latest snapshots and what they depend on.
+
+    A kept snapshot keeps its whole parent chain, and every snapshot
+    holding one of its parts, so each kept snapshot can still be
+    restored. Returns the ids of the deleted snapshots.
+    """
+    if keep < 1:
+        raise ValueError("keep must be at least 1")
+    with _snapshot_lock:
+        snapshots = list_snapshots(dest)
+        needed = set()
+        for snapshot in snapshots[-keep:]:
+            needed.update(_chain(snapshots, snapshot["id"]))
+            for entry in read_manifest(dest, snapshot["id"])["files"].values():
+                needed.update(part["snapshot"] for part in entry["parts"])
+        removed = []
+        for snapshot in snapshots:
+            if snapshot["id"] in needed:
+                continue
+            # Hidden first, so a half-deleted snapshot is never listed
+            hidden = os.path.join(dest, f".{snapshot['id']}.deleted")
+            os.rename(os.path.join(dest, snapshot["id"]), hidden)
+            shutil.rmtree(hidden)
+            removed.append(snapshot["id"])
+        if removed:
+            fsync_dir(dest)
+    return removed
+
+
+def _restore_part(dest: str, part: dict, target: str):
+    path = os.path.join(dest, part["snapshot"], part["file"])
+    digest = hashlib.sha256()
+    decompressor = zlib.decompressobj(31)
+    written = 0
+    with open(path, "rb") as f, open(target, "r+b") as out:
+        out.seek(part["offset"])
+        while True:
+            chunk = f.read(CHUNK_BYTES)
+            if not chunk:
+                break
+            data = decompressor.decompress(chunk)
+            digest.update(data)
+            out.write(data)
+            written += len(data)
+    if written != part["length"] or digest.hexdigest() != part["sha256"]:
+        raise ValueError(f"Snapshot part {path} is corrupt")
+
+
+def restore_snapshot(dest: str, snapshot_id: str, data_dir: str,
+                     workers: Optional[int] = None) -> dict:
+    """Rebuild the data files from a snapshot; the server must be stopped.
+
+    Every file is restored next to its original as `<name>.restore`,
+    verified part by part against the manifest, synced, and only then
+    renamed over the original, so a failed restore leaves the data
+    directory untouched. Chat segments newer than the snapshot and the
+    derived search index are removed.
+    """
+    started = time.perf_counter()
+    manifest = read_manifest(dest, snapshot_id)
+    targets = {}
+    for name in manifest["files"]:
+        parts = name.split("/")
+        if name.startswith("/") or ".." in parts:
+            raise ValueError(f"Invalid file name in snapshot: {name!r}")
+        targets[name] = os.path.join(data_dir, *parts)
+
+    temporary = []
+    try:
+        jobs = []
+        for name, entry in manifest["files"].items():
+            tmp_path = targets[name] + ".restore"
+            os.makedirs(os.path.dirname(tmp_path), exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                f.truncate(entry["size"])
+            temporary.append(tmp_path)
+            jobs.extend((part, tmp_path) for part in entry["parts"])
+        with ThreadPoolExecutor(workers or os.cpu_count() or 1) as pool:
+            for future in [pool.submit(_restore_part, dest, part, tmp_path) for part, tmp_path in jobs]:
+                future.result()
+        for tmp_path in temporary:
+            with open(tmp_path, "rb+") as f:
+                os.fsync(f.fileno())
+    except BaseException:
+        for tmp_path in temporary:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        raise
+
+    chat_dir = os.path.join(data_dir, "chat")
+    if os.path.isdir(chat_dir):
+        for name in os.listdir(chat_dir):
+            if name.startswith("chat-") and name.endswith(".jsonl") and f"chat/{name}" not in targets:
+                os.remove(os.path.join(chat_dir, name))
+    for name, target in targets.items():
+        if target.endswith(".db"):
+            # A stale write-ahead log would be replayed over the restored database
+            for suffix in ("-wal", "-shm"):
+                if os.path.exists(target + suffix):
+                    os.remove(target + suffix)
+        os.replace(target + ".restore", target)
+    for name in DERIVED_FILES:
+        if os.path.exists(os.path.join(data_dir, name)):
+            os.remove(os.path.join(data_dir, name))
+    fsync_dir(data_dir)
+    if os.path.isdir(chat_dir):
+        fsync_dir(chat_dir)
+    return {"id": manifest["id"], "files": len(targets), "bytes": manifest["bytes"],
+            "parts": len(jobs), "seconds": round(time.perf_counter() - started, 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create, list and restore data snapshots")
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--data-dir", default="data")
+    common.add_argument("--dest", default=os.environ.get("PHYSIO_SNAPSHOT_DIR", "snapshots"))
+    commands = parser.add_subparsers(dest="command", required=True)
+    create = commands.add_parser("create", parents=[common],
+                                 help="snapshot the data directory (safe while serving)")
+    create.add_argument("--full", action="store_true", help="do not reuse the latest snapshot")
+    create.add_argument("--level", type=int, default=DEFAULT_LEVEL, help="gzip level 1-9")
+    create.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    create.add_argument("--keep", type=int, default=None,
+                        help="then prune to this many snapshots (and what they depend on)")
+    commands.add_parser("list", parents=[common], help="list complete snapshots, oldest first")
+    prune = commands.add_parser("prune", parents=[common],
+                                help="delete old snapshots no kept snapshot depends on")
+    prune.add_argument("--keep", type=int, required=True)
+    restore = commands.add_parser("restore", parents=[common],
+                                  help="restore a snapshot (stop the server first)")
+    restore.add_argument("snapshot", help="snapshot id, or `latest`")
+    restore.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.command == "create":
+        storage = create_engine(os.environ.get("PHYSIO_STORAGE", "jsonl"), args.data_dir)
+        try:
+            result = create_snapshot(storage, args.data_dir, args.dest, args.full,
+                                     args.level, args.workers, max_chain=args.keep)
+        finally:
+            storage.close()
+        if args.keep:
+            result["pruned"] = prune_snapshots(args.dest, args.keep)
+        print(json.dumps(result, indent=1))
+    elif args.command == "prune":
+        print(json.dumps({"pruned": prune_snapshots(args.dest, args.keep)}, indent=1))
+    elif args.command == "list":
+        for snapshot in list_snapshots(args.dest):
+            print(f"{snapshot['id']}  {snapshot['createdAt']}  {snapshot['bytes']:>14,} bytes"
+                  f"  {snapshot['stored']:>14,} stored  parent={snapshot['parent']}")
+    else:
+        print(json.dumps(restore_snapshot(args.dest, args.snapshot, args.data_dir, args.workers),
+                         indent=1))
+
+
+if __name__ == "__main__":
+    main()
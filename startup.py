@@ -0,0 +1,297 @@
+"""
+PhysioHealth - Startup
+Deferred warm-up work, readiness reporting and a startup profiler
+
+Usage: python startup.py [--module app] [--path /] [--path /api/services] [--lazy] [--top 15] [--json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+# Line the profiled child process prints its measurements on
+RESULT_MARKER = "PHYSIO_STARTUP_RESULT "
+
+
+def process_started() -> Optional[float]:
+    """Wall-clock time this process started, from /proc (Linux only)"""
+    try:
+        with open("/proc/self/stat") as f:
+            # Fields after the command name; starttime is field 22 overall
+            start_ticks = int(f.read().rpartition(")")[2].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, IndexError, ValueError):
+        return None
+    return time.time() - (uptime - start_ticks / os.sysconf("SC_CLK_TCK"))
+
+
+class StartupProfile:
+    """Seconds from process start to each startup phase.
+
+    Falls back to the time the profile was created where the process
+    start time is unknown, which leaves interpreter start-up and the
+    first imports out.
+    """
+
+    def __init__(self):
+        self.started = process_started() or time.time()
+        self.phases: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def mark(self, phase: str, once: bool = False):
+        with self._lock:
+            if once and phase in self.phases:
+                return
+            self.phases[phase] = round(time.time() - self.started, 4)
+
+    def report(self) -> dict:
+        with self._lock:
+            return {"startedAt": round(self.started, 3), "phases": dict(self.phases)}
+
+
+class Warmup:
+    """Named start-up steps, run in order inline or on a background thread.
+
+    Each step's state and duration is kept for the readiness endpoint,
+    and `wait(name)` lets a request that needs a step hold until it has
+    run. A failed step is logged in the status and does not stop the
+    steps after it.
+    """
+
+    def __init__(self, profile: Optional[StartupProfile] = None):
+        self.profile = profile
+        self._steps: List[tuple] = []
+        self._status: Dict[str, dict] = {}
+        self._events: Dict[str, threading.Event] = {}
+        self._thread: Optional[threading.Thread] = None
+
+    def step(self, name: str, fn: Callable[[], None]):
+        self._steps.append((name, fn))
+        self._status[name] = {"name": name, "state": "pending"}
+        self._events[name] = threading.Event()
+
+    def start(self, background: bool = False):
+        if not background:
+            self.run()
+            return
+        self._thread = threading.Thread(target=self.run, name="warmup", daemon=True)
+        self._thread.start()
+
+    def run(self):
+        for name, fn in self._steps:
+            status = self._status[name]
+            status["state"] = "running"
+            started = time.perf_counter()
+            try:
+                fn()
+                status["state"] = "done"
+            except Exception as exc:
+                status["state"] = "failed"
+                status["error"] = f"{type(exc).__name__}: {exc}"
+            status["seconds"] = round(time.perf_counter() - started, 4)
+            if self.profile is not None:
+                self.profile.mark(f"warmup:{name}")
+            self._events[name].set()
+        if self.profile is not None:
+            self.profile.mark("ready")
+
+    def done(self, name: str) -> bool:
+        return self._events[name].is_set()
+
+    def failed(self, name: str) -> bool:
+        return self._status[name]["state"] == "failed"
+
+    async def wait(self, name: str):
+        event = self._events[name]
+        if not event.is_set():
+            await asyncio.to_thread(event.wait)
+
+    def finished(self) -> bool:
+        return all(event.is_set() for event in self._events.values())
+
+    def ready(self) -> bool:
+        return all(status["state"] == "done" for status in self._status.values())
+
+    def status(self) -> dict:
+        return {"ready": self.ready(), "steps": [dict(status) for status in self._status.values()]}
+
+
+# Plain json: importing fast_json here would pull FastAPI in ahead of the app
+NOT_READY = json.dumps({"detail": "Server is not ready, please retry later"}).encode()
+
+
+class WarmupGate:
+    """Pure ASGI middleware holding requests until the warm-up step they need has run.
+
+    `routes` maps path prefixes to step names; other paths pass straight
+    through. Requests whose step failed get 503. The first response is
+    marked in the startup profile as `first_response`.
+    """
+
+    def __init__(self, app, warmup: Warmup, routes: Dict[str, str]):
+        self.app = app
+        self.warmup = warmup
+        self.routes = routes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        path = scope["path"]
+        for prefix, step in self.routes.items():
+            if not path.startswith(prefix):
+                continue
+            if not self.warmup.done(step):
+                await self.warmup.wait(step)
+            if self.warmup.failed(step):
+                await send({"type": "http.response.start", "status": 503,
+                            "headers": [(b"content-type", b"application/json"),
+                                        (b"content-length", str(len(NOT_READY)).encode()),
+                                        (b"retry-after", b"5")]})
+                await send({"type": "http.response.body", "body": NOT_READY})
+                return
+        await self.app(scope, receive, send)
+        profile = self.warmup.profile
+        if profile is not None and "first_response" not in profile.phases:
+            profile.mark("first_response", once=True)
+
+
+# Profiler
+
+async def _get(app, path: str) -> int:
+    status = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    path, _, query = path.partition("?")
+    await app({"type": "http", "method": "GET", "path": path, "raw_path": path.encode(),
+               "query_string": query.encode(), "headers": [(b"accept-encoding", b"gzip, br")],
+               "root_path": "", "scheme": "http", "server": ("profile", 80),
+               "client": ("127.0.0.1", 1), "http_version": "1.1"},
+              receive, send)
+    return status
+
+
+def _profile_child(module: str, paths: List[str]):
+    """Runs in the profiled process: import, start up, serve `paths` once each"""
+    # An import statement, not importlib, so -X importtime reports it
+    __import__(module)
+    target = sys.modules[module]
+    times = {"imported": time.time()}
+    requests = []
+    app = target.app
+    profile = getattr(target, "startup_profile", None)
+    warmup = getattr(target, "warmup", None)
+
+    async def serve():
+        async with app.router.lifespan_context(app):
+            times["lifespan started"] = time.time()
+            for path in paths:
+                status = await _get(app, path)
+                requests.append({"path": path, "status": status, "at": time.time()})
+            if isinstance(warmup, Warmup):
+                while not warmup.finished():
+                    await asyncio.sleep(0.01)
+
+    asyncio.run(serve())
+    # Relative to the same start time as the app's own profile
+    started = profile.started if isinstance(profile, StartupProfile) else process_started()
+    started = started or times["imported"]
+    result = {name: round(at - started, 4) for name, at in times.items()}
+    result["requests"] = [dict(request, at=round(request["at"] - started, 4)) for request in requests]
+    if isinstance(profile, StartupProfile):
+        result["phases"] = profile.report()["phases"]
+    if isinstance(warmup, Warmup):
+        result["warmup"] = warmup.status()
+    print(RESULT_MARKER + json.dumps(result), flush=True)
+
+
+def parse_importtime(stderr: str, module: str) -> dict:
+    """Self and cumulative microseconds of `module` and of each module it imported first"""
+    pending, modules = [], []
+    root = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|")
+            self_us, cumulative_us = int(self_us), int(cumulative_us)
+        except ValueError:  # the header line
+            continue
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth == 1:
+            pending.append((name.strip(), cumulative_us))
+        elif depth == 0:
+            # A module is printed after everything it imported
+            if name.strip() == module:
+                root = {"self": self_us, "cumulative": cumulative_us}
+                modules = pending
+            pending = []
+    return {"module": root, "imports": modules}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--module", default="app", help="module holding the ASGI `app`")
+    parser.add_argument("--path", action="append", dest="paths",
+                        help="request to time after startup (repeatable; default: / and /api/services)")
+    parser.add_argument("--lazy", action="store_true", help="set PHYSIO_LAZY_STARTUP=1")
+    parser.add_argument("--top", type=int, default=15, help="slowest imports to list")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+    paths = args.paths or ["/", "/api/services"]
+
+    env = dict(os.environ)
+    if args.lazy:
+        env["PHYSIO_LAZY_STARTUP"] = "1"
+    code = f"import startup; startup._profile_child({args.module!r}, {paths!r})"
+    child = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                           capture_output=True, text=True, env=env)
+    results = [line[len(RESULT_MARKER):] for line in child.stdout.splitlines()
+               if line.startswith(RESULT_MARKER)]
+    if child.returncode != 0 or not results:
+        sys.stderr.write(child.stderr[-4000:])
+        sys.exit(child.returncode or 1)
+    report = json.loads(results[-1])
+    imports = parse_importtime(child.stderr, args.module)
+    report["importTime"] = {
+        "module": imports["module"],
+        "slowest": [{"name": name, "cumulative": us}
+                    for name, us in sorted(imports["imports"], key=lambda item: -item[1])[:args.top]],
+    }
+    if args.json:
+        print(json.dumps(report, indent=1))
+        return
+
+    module = imports["module"]
+    print(f"import {args.module}: {module.get('cumulative', 0) / 1000:.0f} ms "
+          f"({module.get('self', 0) / 1000:.0f} ms in the module body)")
+    for item in report["importTime"]["slowest"]:
+        print(f"  {item['cumulative'] / 1000:>8.1f} ms  {item['name']}")
+    print("\nseconds since process start")
+    timeline = [("imported", report["imported"]), ("lifespan started", report["lifespan started"])]
+    timeline += [(name, at) for name, at in report.get("phases", {}).items()]
+    timeline += [(f"GET {r['path']} -> {r['status']}", r["at"]) for r in report["requests"]]
+    for label, at in sorted(timeline, key=lambda item: item[1]):
+        print(f"  {at:>8.3f}  {label}")
+    if "warmup" in report:
+        print("\nwarm-up steps")
+        for step in report["warmup"]["steps"]:
+            print(f"  {step.get('seconds', 0):>8.3f}s  {step['name']} ({step['state']})")
+
+
+if __name__ == "__main__":
+    main()
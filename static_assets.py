@@ -0,0 +1,132 @@
+"""
+PhysioHealth - Static assets
+Fingerprinted, precompressed frontend files served from memory
+
+Usage: python static_assets.py [--directory frontend/physiotherapy] [--cache-dir data/cache/assets]
+"""
+
+import argparse
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+from typing import Dict, Optional
+
+from http_cache import CachedResponse, compress_cached
+
+# Fingerprinted URLs never change content, so browsers may keep them for a year
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+# Pages and unfingerprinted names are revalidated with their ETag every time
+REVALIDATE = "no-cache"
+
+TEXT_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+
+
+def media_type(filename: str) -> str:
+    guessed = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    if guessed.startswith(TEXT_TYPES):
+        guessed += "; charset=utf-8"
+    return guessed
+
+
+def fingerprint(filename: str, body: bytes) -> str:
+    """`styles.css` -> `styles.3f2a9c1d.css`"""
+    stem, ext = os.path.splitext(filename)
+    return f"{stem}.{hashlib.sha256(body).hexdigest()[:8]}{ext}"
+
+
+class StaticAssets:
+    """The frontend directory, built once into cached responses.
+
+    Every asset other than HTML pages gets a content-hashed alias served
+    with immutable caching, and references to it in the pages are
+    rewritten to that alias. Pages keep their names and are revalidated
+    on each visit, which costs a 304 when nothing changed. All bodies
+    are compressed up front (gzip, plus brotli when available) and picked
+    by Accept-Encoding.
+
+    With `lazy=True` nothing is read until the first `get` or `load`,
+    e.g. from a warm-up thread once the server is listening. With a
+    `cache_dir` the compressed variants are kept on disk and reused by
+    the next start (see `compress_cached`).
+    """
+
+    def __init__(self, directory: str, index: str = "index.html", lazy: bool = False,
+                 cache_dir: Optional[str] = None):
+        self.directory = directory
+        self.index = index
+        self.cache_dir = cache_dir
+        self.responses: Dict[str, CachedResponse] = {}
+        self.fingerprints: Dict[str, str] = {}
+        self.built = False
+        self._lock = threading.Lock()
+        if not lazy:
+            self.build()
+
+    def build(self):
+        assets, pages = {}, {}
+        for root, _, files in os.walk(self.directory):
+            for filename in files:
+                path = os.path.join(root, filename)
+                name = os.path.relpath(path, self.directory).replace(os.sep, "/")
+                with open(path, "rb") as f:
+                    (pages if name.endswith(".html") else assets)[name] = f.read()
+
+        responses, fingerprints = {}, {}
+        for name, body in assets.items():
+            hashed = fingerprint(name, body)
+            fingerprints[name] = hashed
+            responses[hashed] = CachedResponse(body, media_type(name), IMMUTABLE,
+                                               variants=compress_cached(body, self.cache_dir))
+            # Same body, so the same compressed variants
+            responses[name] = CachedResponse(body, media_type(name), REVALIDATE,
+                                             variants=responses[hashed].variants)
+
+        # Longest names first so "app.js" cannot match inside "vendor/app.js"
+        names = sorted(fingerprints, key=len, reverse=True)
+        pattern = re.compile(
+            r'((?:src|href)=["\']/?)(' + "|".join(re.escape(n) for n in names) + r')(["\'])'
+        ) if names else None
+        for name, body in pages.items():
+            if pattern is not None:
+                html = pattern.sub(lambda m: m.group(1) + fingerprints[m.group(2)] + m.group(3),
+                                   body.decode("utf-8"))
+                body = html.encode("utf-8")
+            responses[name] = CachedResponse(body, media_type(name), REVALIDATE,
+                                             variants=compress_cached(body, self.cache_dir))
+
+        self.responses, self.fingerprints = responses, fingerprints
+        self.built = True
+
+    def load(self):
+        """Build the responses unless that has been done already"""
+        if not self.built:
+            with self._lock:
+                if not self.built:
+                    self.build()
+
+    def get(self, path: str) -> Optional[CachedResponse]:
+        """Response for a request path, with `/` and directories mapped to the index page"""
+        self.load()
+        path = path.strip("/") or self.index
+        response = self.responses.get(path)
+        if response is None:
+            response = self.responses.get(f"{path}/{self.index}")
+        return response
+
+
+def main():
+    """Precompress the frontend into the cache directory, e.g. at build time"""
+    parser = argparse.ArgumentParser(description="Precompress the frontend files")
+    parser.add_argument("--directory", default="frontend/physiotherapy")
+    parser.add_argument("--cache-dir", default=os.environ.get("PHYSIO_ASSET_CACHE_DIR",
+                                                              os.path.join("data", "cache", "assets")))
+    args = parser.parse_args()
+    assets = StaticAssets(args.directory, cache_dir=args.cache_dir)
+    print(f"{len(assets.responses)} responses, compressed variants in {args.cache_dir}")
+
+
+if __name__ == "__main__":
+    main()
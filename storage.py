@@ -0,0 +1,777 @@
+"""
+PhysioHealth - Storage engines
+Pluggable persistence for appointments and contact messages
+"""
+
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from fast_json import RawJSON, dumps, loads
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process locking only
+    fcntl = None
+
+# Marker written into the log when a record is removed
+DELETE_OP = "_delete"
+
+# Result of an append whose guard refused it
+REJECTED = "rejected"
+
+
+def encode(entry: dict) -> bytes:
+    return dumps(entry) + b"\n"
+
+
+def tombstone(field: str, value) -> dict:
+    return {DELETE_OP: {"field": field, "value": value}}
+
+
+def fsync_dir(path: str):
+    """Make renames and new files in directory `path` survive a crash"""
+    if os.name == "nt":
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def fold(records: list, entries: list) -> list:
+    """Apply log entries (records and tombstones) on top of `records`"""
+    for entry in entries:
+        if DELETE_OP in entry:
+            op = entry[DELETE_OP]
+            for i, record in enumerate(records):
+                if record.get(op["field"]) == op["value"]:
+                    records.pop(i)
+                    break
+        else:
+            records.append(entry)
+    return records
+
+
+class StorageEngine:
+    """Base interface shared by every storage backend.
+
+    Records are plain dicts grouped into named collections
+    (e.g. "appointments", "contacts").
+
+    Writes are described as operations so they can be committed in
+    batches by a single writer:
+
+    - ("append", collection, record[, guard])
+    - ("delete", collection, field, value, record)
+
+    A guard is called as `guard(claims)` while the collection is locked
+    against other processes and after their latest entries have been
+    polled; `claims` is a set shared by the ops of one batch. If it
+    returns False the record is not written and the op's result is
+    REJECTED.
+
+    Listeners registered with `subscribe` see every polled entry in log
+    order, inside the engine lock, before any guard of the next batch.
+
+    `poll` picks up entries committed since the last poll, by this or any
+    other process, and `drain` hands them to the caller in log order, so
+    in-memory indexes follow the data files even when several workers
+    share them.
+    """
+
+    def __init__(self):
+        # Entries read by `poll` but not yet drained; guarded by their own
+        # lock so draining never waits for a commit in progress
+        self._pending: Dict[str, Tuple[list, bool]] = {}
+        self._pending_lock = threading.Lock()
+        self._listeners: Dict[str, List[Callable[[list, bool], None]]] = {}
+        # Optional `observer(operation, seconds, bytes_read, bytes_written)`
+        # called after each storage operation, e.g. for metrics
+        self.observer: Optional[Callable[[str, float, int, int], None]] = None
+
+    def _observe(self, operation: str, started: float, read: int = 0, written: int = 0):
+        if self.observer is not None:
+            self.observer(operation, time.perf_counter() - started, read, written)
+
+    def subscribe(self, collection: str, listener: Callable[[list, bool], None]):
+        """Call `listener(entries, rebuilt)` for every batch of polled entries"""
+        self._listeners.setdefault(collection, []).append(listener)
+
+    def load(self, collection: str) -> list:
+        raise NotImplementedError
+
+    def append(self, collection: str, record: dict):
+        self.apply_batch([("append", collection, record)])
+
+    def delete(self, collection: str, field: str, value,
+               record: Optional[dict] = None) -> Optional[dict]:
+        """Remove the first record whose `field` equals `value`.
+
+        Callers that already hold the record (e.g. from an index) pass it
+        as `record` so engines can skip looking it up.
+        """
+        return self.apply_batch([("delete", collection, field, value, record)])[0]
+
+    def apply_batch(self, ops: list) -> list:
+        """Durably apply a batch of write operations, returning one result per op"""
+        raise NotImplementedError
+
+    def iter_records(self, collection: str, after: Optional[str] = None,
+                     raw: bool = False) -> Iterator[Tuple[str, dict]]:
+        """Yield (cursor, record) in storage order, resuming after `after`.
+
+        Cursors are opaque strings; a cursor that can no longer be
+        resumed raises ValueError. With `raw=True` records are yielded as
+        RawJSON wrapping their stored encoding, for responses that pass
+        them through without re-encoding.
+        """
+        if after and not after.isdigit():
+            raise ValueError("Invalid cursor")
+        records = self.load(collection)
+        start = int(after or 0)
+        wrap = (lambda record: RawJSON(dumps(record), record)) if raw else (lambda record: record)
+        return ((str(position + 1), wrap(records[position])) for position in range(start, len(records)))
+
+    def replace(self, collection: str, records: list):
+        raise NotImplementedError
+
+    def compact(self, collection: str):
+        pass
+
+    def poll(self, collection: str, blocking: bool = True):
+        """Queue entries written to the collection since the last poll.
+
+        This includes entries written by other processes. With
+        `blocking=False` the poll is skipped if a commit is in progress,
+        so it is safe to call from the event loop.
+        """
+        raise NotImplementedError
+
+    def resync(self, collection: str):
+        """Re-read the whole collection and queue it as a rebuild.
+
+        Drainers and listeners then recompute their state from the raw
+        log; entries committed meanwhile are never lost, because the
+        re-read happens under the engine lock.
+        """
+        raise NotImplementedError
+
+    def drain(self, collection: str) -> Tuple[list, bool]:
+        """Return (entries, rebuilt) queued by `poll` since the last drain.
+
+        When `rebuilt` is true, `entries` is the complete set of records
+        and replaces whatever the caller had.
+        """
+        with self._pending_lock:
+            return self._pending.pop(collection, ([], False))
+
+    def snapshot_files(self, collections: List[str]):
+        """Context manager yielding a point-in-time view of the collections.
+
+        Yields a list of (file name, open binary file, size, identity):
+        the first `size` bytes of each file are a consistent copy of the
+        stored data, whatever is written meanwhile. `identity` is set
+        when the file only ever grows in place (an append-only log), so a
+        later snapshot with the same identity can copy just the new bytes.
+        """
+        raise NotImplementedError
+
+    def start(self):
+        """Start any background maintenance work"""
+        pass
+
+    def _queue(self, collection: str, entries: list, rebuilt: bool = False):
+        """Queue entries for `drain`; a rebuild replaces anything pending"""
+        for listener in self._listeners.get(collection, []):
+            listener(entries, rebuilt)
+        with self._pending_lock:
+            if rebuilt:
+                self._pending[collection] = (entries, True)
+                return
+            pending, was_rebuilt = self._pending.get(collection, ([], False))
+            if was_rebuilt:
+                fold(pending, entries)
+            else:
+                pending.extend(entries)
+            self._pending[collection] = (pending, was_rebuilt)
+
+    def import_legacy(self, collection: str, filepath: str):
+        """Import a legacy JSON-array file once, if the collection is empty"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+def read_legacy(filepath: str) -> list:
+    try:
+        with open(filepath, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return []
+
+
+class JsonlEngine(StorageEngine):
+    """Append-only JSON-Lines log, one file per collection.
+
+    New records are appended as a single line, deletions are appended as
+    tombstones, and the log is rewritten (compacted) once dead lines
+    outnumber live ones. Appends from several processes are serialised
+    with an advisory lock on a sidecar `.lock` file.
+    """
+
+    def __init__(self, data_dir: str, compact_interval: float = 300.0,
+                 compact_min_dead: int = 1000):
+        super().__init__()
+        self.data_dir = data_dir
+        self.compact_interval = compact_interval
+        self.compact_min_dead = compact_min_dead
+        self._lock = threading.RLock()
+        self._live: Dict[str, int] = {}
+        self._dead: Dict[str, int] = {}
+        # (inode, byte offset) of the log as far as this process has read it
+        self._seen: Dict[str, Tuple[int, int]] = {}
+        # (inode, scanned offset, field -> deleted values) for streaming reads
+        self._tombstones: Dict[str, Tuple[int, int, Dict[str, Set]]] = {}
+        self._stop = threading.Event()
+        self._compactor: Optional[threading.Thread] = None
+        os.makedirs(data_dir, exist_ok=True)
+
+    def path(self, collection: str) -> str:
+        return os.path.join(self.data_dir, f"{collection}.jsonl")
+
+    @contextmanager
+    def _file_lock(self, collection: str):
+        # Not re-entrant: flock on a second descriptor would block on ourselves
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.path(collection) + ".lock", "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _read_lines(f, offset: int) -> Tuple[list, int]:
+        """Parse complete lines from `offset`, returning entries and the new offset"""
+        f.seek(offset)
+        data = f.read()
+        end = data.rfind(b"\n") + 1
+        entries = [loads(line) for line in data[:end].splitlines() if line.strip()]
+        return entries, offset + end
+
+    def _count(self, collection: str, entries: list):
+        for entry in entries:
+            if DELETE_OP in entry:
+                self._live[collection] = self._live.get(collection, 0) - 1
+                # The removed record and its tombstone are both dead lines
+                self._dead[collection] = self._dead.get(collection, 0) + 2
+            else:
+                self._live[collection] = self._live.get(collection, 0) + 1
+
+    def _read_all(self, collection: str) -> list:
+        try:
+            with open(self.path(collection), "rb") as f:
+                entries, _ = self._read_lines(f, 0)
+        except FileNotFoundError:
+            return []
+        return fold([], entries)
+
+    def load(self, collection: str) -> list:
+        started = time.perf_counter()
+        with self._lock:
+            records = self._read_all(collection)
+        self._observe("load", started)
+        return records
+
+    def _deleted_keys(self, collection: str, inode: int) -> Dict[str, Set]:
+        """Tombstoned (field -> values), scanned incrementally per log file"""
+        with self._lock:
+            cached = self._tombstones.get(collection)
+            if cached is None:
+                cached = (inode, 0, {})
+            elif cached[0] != inode:
+                # Compaction drops tombstones along with their records, but
+                # keys are unique, so what was deleted stays deleted
+                cached = (inode, 0, cached[2])
+            _, offset, deleted = cached
+            with open(self.path(collection), "rb") as f:
+                if os.fstat(f.fileno()).st_ino != inode:
+                    return deleted
+                f.seek(offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    offset += len(line)
+                    if DELETE_OP.encode() in line:
+                        op = loads(line).get(DELETE_OP)
+                        if op:
+                            deleted.setdefault(op["field"], set()).add(op["value"])
+            self._tombstones[collection] = (inode, offset, deleted)
+            return deleted
+
+    def _is_live(self, collection: str, field: str, value) -> bool:
+        """Whether no tombstone for (field, value) has been written yet"""
+        seen = self._seen.get(collection)
+        if seen is None:
+            return False
+        return value not in self._deleted_keys(collection, seen[0]).get(field, ())
+
+    def iter_records(self, collection: str, after: Optional[str] = None,
+                     raw: bool = False) -> Iterator[Tuple[str, dict]]:
+        """Stream records straight from the log without loading it all.
+
+        Cursors are "inode:offset" positions, so they expire when the log
+        is compacted. Deleted records are skipped by key, which assumes
+        the deleted field (bookingId, id) is unique.
+        """
+        try:
+            inode = os.stat(self.path(collection)).st_ino
+        except FileNotFoundError:
+            return iter(())
+        offset = 0
+        if after:
+            cursor_inode, _, cursor_offset = after.partition(":")
+            if not cursor_offset.isdigit() or cursor_inode != str(inode):
+                raise ValueError("Cursor has expired")
+            offset = int(cursor_offset)
+        return self._stream(collection, inode, offset, raw)
+
+    def _stream(self, collection: str, inode: int, offset: int,
+                raw: bool) -> Iterator[Tuple[str, dict]]:
+        deleted = self._deleted_keys(collection, inode)
+        with open(self.path(collection), "rb") as f:
+            if os.fstat(f.fileno()).st_ino != inode:
+                return
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                offset += len(line)
+                if not line.strip():
+                    continue
+                entry = loads(line)
+                if DELETE_OP in entry:
+                    continue
+                if any(entry.get(field) in values for field, values in deleted.items()):
+                    continue
+                yield f"{inode}:{offset}", RawJSON(line, entry) if raw else entry
+
+    def poll(self, collection: str, blocking: bool = True):
+        # Non-blocking polls give up while a commit holds the lock
+        if not self._lock.acquire(blocking):
+            return
+        try:
+            try:
+                f = open(self.path(collection), "rb")
+            except FileNotFoundError:
+                return
+            with f:
+                started = time.perf_counter()
+                stat = os.fstat(f.fileno())
+                seen_inode, offset = self._seen.get(collection, (None, 0))
+                if stat.st_ino != seen_inode:
+                    # First read, or the log was rewritten by another process
+                    entries, offset = self._read_lines(f, 0)
+                    records = fold([], entries)
+                    self._live[collection] = len(records)
+                    self._dead[collection] = len(entries) - len(records)
+                    self._queue(collection, records, rebuilt=True)
+                    self._observe("poll", started, read=offset)
+                elif stat.st_size > offset:
+                    start_offset = offset
+                    entries, offset = self._read_lines(f, offset)
+                    self._count(collection, entries)
+                    self._queue(collection, entries)
+                    self._observe("poll", started, read=offset - start_offset)
+                self._seen[collection] = (stat.st_ino, offset)
+        finally:
+            self._lock.release()
+
+    def resync(self, collection: str):
+        with self._lock:
+            self._seen.pop(collection, None)
+            self.poll(collection)
+
+    def apply_batch(self, ops: list) -> list:
+        results: List[Optional[dict]] = [None] * len(ops)
+        by_collection: Dict[str, List[int]] = {}
+        for i, op in enumerate(ops):
+            by_collection.setdefault(op[1], []).append(i)
+
+        for collection, positions in by_collection.items():
+            with self._file_lock(collection):
+                # Catch up with other processes so guards see their entries
+                self.poll(collection)
+                claims: set = set()
+                deleted: set = set()
+                entries = []
+                for i in positions:
+                    op = ops[i]
+                    if op[0] == "append":
+                        if len(op) > 3 and op[3] is not None and not op[3](claims):
+                            results[i] = REJECTED
+                            continue
+                        entries.append(op[2])
+                    elif op[0] == "delete":
+                        _, _, field, value, record = op
+                        if record is None:
+                            record = next((r for r in self._read_all(collection)
+                                           if r.get(field) == value), None)
+                            if record is None:
+                                continue
+                        elif not self._is_live(collection, field, value):
+                            # Deleted by another worker since the caller looked
+                            continue
+                        if (field, value) in deleted:
+                            continue
+                        deleted.add((field, value))
+                        entries.append(tombstone(field, value))
+                        results[i] = record
+                    else:
+                        raise ValueError(f"Unknown storage operation: {op[0]}")
+                if not entries:
+                    continue
+                started = time.perf_counter()
+                data = b"".join(encode(entry) for entry in entries)
+                with open(self.path(collection), "ab") as f:
+                    # A crash mid-write leaves a torn last line. It was never
+                    # acknowledged, so cut it off instead of appending onto it
+                    complete = self._seen.get(collection, (None, 0))[1]
+                    if f.tell() > complete:
+                        f.truncate(complete)
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._observe("write", started, written=len(data))
+                # Our own entries are drained like everyone else's, in log order
+                self.poll(collection)
+        return results
+
+    def _rewrite(self, collection: str, records: list):
+        started = time.perf_counter()
+        path = self.path(collection)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            for record in records:
+                f.write(encode(record))
+            f.flush()
+            os.fsync(f.fileno())
+            size = f.tell()
+        os.replace(tmp_path, path)
+        fsync_dir(self.data_dir)
+        self._observe("rewrite", started, written=size)
+        self._seen[collection] = (os.stat(path).st_ino, size)
+        self._live[collection] = len(records)
+        self._dead[collection] = 0
+
+    def replace(self, collection: str, records: list):
+        with self._file_lock(collection):
+            self._rewrite(collection, records)
+            self._queue(collection, list(records), rebuilt=True)
+
+    def needs_compaction(self, collection: str) -> bool:
+        dead = self._dead.get(collection, 0)
+        return dead >= self.compact_min_dead and dead > self._live.get(collection, 0)
+
+    def compact(self, collection: str):
+        with self._file_lock(collection):
+            # Queue anything other processes wrote before rewriting the log
+            self.poll(collection)
+            self._rewrite(collection, self._read_all(collection))
+
+    def import_legacy(self, collection: str, filepath: str):
+        with self._file_lock(collection):
+            if os.path.exists(self.path(collection)):
+                return
+            records = read_legacy(filepath)
+            self._rewrite(collection, records)
+            self._queue(collection, list(records), rebuilt=True)
+
+    @contextmanager
+    def snapshot_files(self, collections: List[str]):
+        """Log sizes captured with every collection locked at once.
+
+        The locks are only held while the files are opened; appends after
+        that land beyond the captured sizes, and a compaction replaces the
+        log with a new inode, leaving the open descriptor on the old one.
+        """
+        files = []
+        try:
+            with ExitStack() as locks:
+                # Sorted, so two snapshots never wait on each other's locks
+                for collection in sorted(collections):
+                    locks.enter_context(self._file_lock(collection))
+                for collection in sorted(collections):
+                    try:
+                        f = open(self.path(collection), "rb")
+                    except FileNotFoundError:
+                        continue
+                    stat = os.fstat(f.fileno())
+                    files.append((os.path.basename(f.name), f, stat.st_size, stat.st_ino))
+            yield files
+        finally:
+            for _, f, _, _ in files:
+                f.close()
+
+    # Background compaction
+    def start(self):
+        if self._compactor is not None or self.compact_interval <= 0:
+            return
+        self._stop.clear()
+        self._compactor = threading.Thread(target=self._compact_loop,
+                                           name="jsonl-compactor", daemon=True)
+        self._compactor.start()
+
+    def _compact_loop(self):
+        while not self._stop.wait(self.compact_interval):
+            for collection in list(self._dead):
+                if self.needs_compaction(collection):
+                    self.compact(collection)
+
+    def close(self):
+        self._stop.set()
+        if self._compactor is not None:
+            self._compactor.join()
+            self._compactor = None
+
+
+class SqliteEngine(StorageEngine):
+    """SQLite backend storing each record as a JSON document.
+
+    Deletions are also recorded in a `tombstones` table and full replaces
+    bump a generation counter, so other processes can follow changes.
+    """
+
+    def __init__(self, db_path: str):
+        super().__init__()
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.db_path = db_path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS records ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " collection TEXT NOT NULL,"
+            " data TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS records_collection ON records (collection, seq)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tombstones ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " collection TEXT NOT NULL,"
+            " field TEXT NOT NULL,"
+            " value TEXT)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS generations ("
+            " collection TEXT PRIMARY KEY,"
+            " generation INTEGER NOT NULL)"
+        )
+        self._conn.commit()
+        # (generation, last record seq, last tombstone seq) seen per collection
+        self._seen: Dict[str, Tuple[int, int, int]] = {}
+
+    def _position(self, collection: str) -> Tuple[int, int, int]:
+        row = self._conn.execute(
+            "SELECT"
+            " (SELECT generation FROM generations WHERE collection = ?),"
+            " (SELECT MAX(seq) FROM records WHERE collection = ?),"
+            " (SELECT MAX(seq) FROM tombstones WHERE collection = ?)",
+            (collection, collection, collection),
+        ).fetchone()
+        return row[0] or 0, row[1] or 0, row[2] or 0
+
+    def load(self, collection: str) -> list:
+        started = time.perf_counter()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT data FROM records WHERE collection = ? ORDER BY seq", (collection,)
+            ).fetchall()
+        records = [loads(row[0]) for row in rows]
+        self._observe("load", started, read=sum(len(row[0]) for row in rows))
+        return records
+
+    def iter_records(self, collection: str, after: Optional[str] = None,
+                     raw: bool = False) -> Iterator[Tuple[str, dict]]:
+        """Stream records by sequence number on a separate read connection"""
+        if after and not after.isdigit():
+            raise ValueError("Invalid cursor")
+        return self._stream(collection, int(after or 0), raw)
+
+    def _stream(self, collection: str, after: int, raw: bool) -> Iterator[Tuple[str, dict]]:
+        conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        try:
+            rows = conn.execute(
+                "SELECT seq, data FROM records WHERE collection = ? AND seq > ? ORDER BY seq",
+                (collection, after),
+            )
+            for seq, data in rows:
+                yield str(seq), RawJSON(data.encode("utf-8")) if raw else loads(data)
+        finally:
+            conn.close()
+
+    def poll(self, collection: str, blocking: bool = True):
+        if not self._lock.acquire(blocking):
+            return
+        try:
+            self._poll(collection)
+        finally:
+            self._lock.release()
+
+    def _poll(self, collection: str):
+        # Read-only, so it can run inside a write transaction
+        started = time.perf_counter()
+        position = self._position(collection)
+        seen = self._seen.get(collection)
+        if seen is None or seen[0] != position[0]:
+            self._queue(collection, self.load(collection), rebuilt=True)
+            self._seen[collection] = position
+            return
+        if seen == position:
+            return
+        rows = self._conn.execute(
+            "SELECT data FROM records WHERE collection = ? AND seq > ? AND seq <= ?"
+            " ORDER BY seq",
+            (collection, seen[1], position[1]),
+        ).fetchall()
+        deletes = self._conn.execute(
+            "SELECT field, value FROM tombstones"
+            " WHERE collection = ? AND seq > ? AND seq <= ? ORDER BY seq",
+            (collection, seen[2], position[2]),
+        ).fetchall()
+        entries = [loads(row[0]) for row in rows]
+        entries += [tombstone(field, value) for field, value in deletes]
+        self._queue(collection, entries)
+        self._seen[collection] = position
+        self._observe("poll", started, read=sum(len(row[0]) for row in rows))
+
+    def resync(self, collection: str):
+        with self._lock:
+            self._seen.pop(collection, None)
+            self.poll(collection)
+
+    def apply_batch(self, ops: list) -> list:
+        results: List[Optional[dict]] = [None] * len(ops)
+        collections = {op[1] for op in ops}
+        written = 0
+        started = time.perf_counter()
+        with self._lock:
+            with self._conn:
+                # Take the write lock first so guards see other processes' rows
+                self._conn.execute("BEGIN IMMEDIATE")
+                for collection in collections:
+                    self._poll(collection)
+                claims: set = set()
+                for i, op in enumerate(ops):
+                    if op[0] == "append":
+                        if len(op) > 3 and op[3] is not None and not op[3](claims):
+                            results[i] = REJECTED
+                            continue
+                        data = dumps(op[2]).decode("utf-8")
+                        written += len(data)
+                        self._conn.execute(
+                            "INSERT INTO records (collection, data) VALUES (?, ?)",
+                            (op[1], data),
+                        )
+                    elif op[0] == "delete":
+                        _, collection, field, value, _ = op
+                        row = self._conn.execute(
+                            "SELECT seq, data FROM records WHERE collection = ?"
+                            " AND json_extract(data, ?) = ? ORDER BY seq LIMIT 1",
+                            (collection, f"$.{field}", value),
+                        ).fetchone()
+                        if row is None:
+                            continue
+                        self._conn.execute("DELETE FROM records WHERE seq = ?", (row[0],))
+                        self._conn.execute(
+                            "INSERT INTO tombstones (collection, field, value) VALUES (?, ?, ?)",
+                            (collection, field, value),
+                        )
+                        results[i] = loads(row[1])
+                    else:
+                        raise ValueError(f"Unknown storage operation: {op[0]}")
+            self._observe("write", started, written=written)
+            # Our own entries are drained like everyone else's
+            for collection in collections:
+                self._poll(collection)
+        return results
+
+    def replace(self, collection: str, records: list):
+        started = time.perf_counter()
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM records WHERE collection = ?", (collection,))
+            self._conn.execute("DELETE FROM tombstones WHERE collection = ?", (collection,))
+            rows = [(collection, dumps(r).decode("utf-8")) for r in records]
+            self._conn.executemany("INSERT INTO records (collection, data) VALUES (?, ?)", rows)
+            self._conn.execute(
+                "INSERT INTO generations (collection, generation) VALUES (?, 1)"
+                " ON CONFLICT (collection) DO UPDATE SET generation = generation + 1",
+                (collection,),
+            )
+            self._observe("rewrite", started, written=sum(len(row[1]) for row in rows))
+            self._queue(collection, list(records), rebuilt=True)
+            self._seen[collection] = self._position(collection)
+
+    def import_legacy(self, collection: str, filepath: str):
+        with self._lock:
+            exists = self._conn.execute(
+                "SELECT 1 FROM records WHERE collection = ? LIMIT 1", (collection,)
+            ).fetchone()
+            if exists:
+                return
+            records = read_legacy(filepath)
+            if records:
+                self.replace(collection, records)
+
+    @contextmanager
+    def snapshot_files(self, collections: List[str]):
+        """The whole database, copied with SQLite's online backup API.
+
+        The copy runs on its own connection inside one read transaction,
+        so in WAL mode writers carry on while it is taken.
+        """
+        fd, tmp_path = tempfile.mkstemp(prefix=".snapshot-", suffix=".db",
+                                        dir=os.path.dirname(self.db_path) or ".")
+        os.close(fd)
+        try:
+            source = sqlite3.connect(self.db_path, timeout=30)
+            target = sqlite3.connect(tmp_path)
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+                source.close()
+            with open(tmp_path, "rb") as f:
+                yield [(os.path.basename(self.db_path), f, os.fstat(f.fileno()).st_size, None)]
+        finally:
+            os.remove(tmp_path)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def create_engine(kind: str, data_dir: str) -> StorageEngine:
+    """Build a storage engine by name ("jsonl" or "sqlite")"""
+    if kind == "jsonl":
+        return JsonlEngine(
+            data_dir,
+            compact_interval=float(os.environ.get("PHYSIO_COMPACT_INTERVAL", "300")),
+        )
+    if kind == "sqlite":
+        return SqliteEngine(os.path.join(data_dir, "physiohealth.db"))
+    raise ValueError(f"Unknown storage engine: {kind}")
@@ -0,0 +1,85 @@
+"""
+PhysioHealth - Test fixtures
+The app started once per session in a scratch working directory, and the
+catalog for tests that build the indexes directly
+"""
+
+import json
+import os
+import shutil
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+ADMIN_TOKEN = "test-admin-token"
+
+LEGACY_CHAT = [{"message": "Do you treat frozen shoulder?", "response": "Yes.",
+                "timestamp": "2024-03-05T10:00:00"}]
+
+
+@pytest.fixture(scope="session")
+def catalog() -> dict:
+    with open(os.path.join(ROOT, "data", "catalog.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+@pytest.fixture(scope="session")
+def clinic(tmp_path_factory):
+    """(app module, started TestClient) with its data in a scratch directory.
+
+    app.py configures itself from the working directory and environment
+    when imported, so it is imported once, here. Tests share it and keep
+    apart by using their own patient emails and slots.
+    """
+    workdir = tmp_path_factory.mktemp("clinic")
+    os.makedirs(workdir / "data")
+    shutil.copy(os.path.join(ROOT, "data", "catalog.json"), workdir / "data")
+    shutil.copytree(os.path.join(ROOT, "frontend"), workdir / "frontend")
+    # History logged by the versions before data/chat/ existed
+    with open(workdir / "data" / "chat_history.json", "w", encoding="utf-8") as f:
+        json.dump(LEGACY_CHAT, f)
+    with pytest.MonkeyPatch.context() as patch:
+        patch.chdir(workdir)
+        patch.setenv("PHYSIO_ADMIN_TOKEN", ADMIN_TOKEN)
+        # Every test request comes from the same client
+        patch.setenv("PHYSIO_BOOKING_RATE", "1000000/1")
+        import app
+        from fastapi.testclient import TestClient
+
+        with TestClient(app.app) as client:
+            yield app, client
+
+
+@pytest.fixture(scope="session")
+def patient_api(tmp_path_factory):
+    """(main module, started TestClient) for the patient API, on a copy of patients.json.
+
+    Only the file path is set, so the working directory stays the one the
+    `clinic` app runs in.
+    """
+    workdir = tmp_path_factory.mktemp("patients")
+    shutil.copy(os.path.join(ROOT, "patients.json"), workdir)
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setenv("PHYSIO_PATIENTS_FILE", str(workdir / "patients.json"))
+        import main
+        from fastapi.testclient import TestClient
+
+        with TestClient(main.app) as client:
+            yield main, client
+
+
+@pytest.fixture
+def admin_headers() -> dict:
+    return {"Authorization": f"Bearer {ADMIN_TOKEN}"}
+
+
+def booking(**fields) -> dict:
+    """A valid booking body, with `fields` overriding the defaults"""
+    body = {"name": "Asha Rao", "email": "asha@example.com", "phone": "+91 9800000000",
+            "doctor": "dr-priya", "service": "sports", "date": "2030-01-07", "time": "10:00",
+            "originalPrice": 1500, "finalPrice": 1500}
+    body.update(fields)
+    return body
@@ -0,0 +1,74 @@
+"""
+PhysioHealth - Admin tests
+The admin token, and snapshots taken, pruned and restored
+"""
+
+import os
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from snapshot import create_snapshot, list_snapshots, prune_snapshots, restore_snapshot
+from storage import create_engine
+
+
+def request(host: str, *headers) -> Request:
+    return Request({"type": "http", "method": "GET", "path": "/api/admin/storage",
+                    "headers": [(name.encode(), value.encode()) for name, value in headers],
+                    "client": (host, 5000)})
+
+
+def test_admin_routes_need_the_token(clinic, admin_headers):
+    app, client = clinic
+    assert client.get("/api/admin/snapshots").status_code == 401
+    assert client.get("/api/admin/snapshots", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    assert client.get("/api/admin/snapshots", headers=admin_headers).status_code == 200
+    admin_routes = [route for route in app.app.routes if getattr(route, "path", "").startswith("/api/admin")]
+    assert admin_routes and all(route.dependencies for route in admin_routes)
+
+
+def test_without_a_token_only_direct_local_requests_pass(clinic, monkeypatch):
+    app, _ = clinic
+    monkeypatch.setattr(app, "ADMIN_TOKEN", None)
+    app.require_admin(request("127.0.0.1"), None)
+    app.require_admin(request("::1"), None)
+    for refused in (request("203.0.113.7"),
+                    request("127.0.0.1", ("x-forwarded-for", "203.0.113.7")),
+                    request("127.0.0.1", ("forwarded", "for=203.0.113.7"))):
+        with pytest.raises(HTTPException) as error:
+            app.require_admin(refused, None)
+        assert error.value.status_code == 403
+
+
+def read(data_dir, name: str) -> bytes:
+    with open(os.path.join(str(data_dir), name), "rb") as f:
+        return f.read()
+
+
+def test_pruned_snapshots_still_restore(tmp_path):
+    data_dir, dest = tmp_path / "data", str(tmp_path / "snapshots")
+    engine = create_engine("jsonl", str(data_dir))
+    taken = []
+    for i in range(5):
+        engine.append("appointments", {"bookingId": f"PH{i}"})
+        snapshot = create_snapshot(engine, str(data_dir), dest, max_chain=2)
+        taken.append((snapshot["id"], read(data_dir, "appointments.jsonl")))
+    # Chains of at most two: full, incremental, full, incremental, full
+    assert [s["parent"] is None for s in list_snapshots(dest)] == [True, False, True, False, True]
+    removed = prune_snapshots(dest, keep=2)
+    assert removed == [taken[0][0], taken[1][0]]
+    engine.close()
+    for snapshot_id, contents in taken[2:]:
+        restore_snapshot(dest, snapshot_id, str(data_dir))
+        assert read(data_dir, "appointments.jsonl") == contents
+
+
+def test_snapshot_endpoint_prunes(clinic, admin_headers, monkeypatch):
+    app, client = clinic
+    monkeypatch.setattr(app, "SNAPSHOT_KEEP", 1)
+    first = client.post("/api/admin/snapshot", headers=admin_headers).json()
+    second = client.post("/api/admin/snapshot", params={"full": True}, headers=admin_headers).json()
+    assert first["snapshot"]["id"] in second["pruned"]
+    listed = client.get("/api/admin/snapshots", headers=admin_headers).json()["snapshots"]
+    assert [s["id"] for s in listed] == [second["snapshot"]["id"]]
@@ -0,0 +1,78 @@
+"""
+PhysioHealth - Availability tests
+The slot guard, against the storage engines directly and through the API
+"""
+
+import pytest
+
+from availability import Availability
+from conftest import booking
+from storage import REJECTED, create_engine
+
+ENGINES = ("jsonl", "sqlite")
+
+
+def subscribed(engine, catalog: dict) -> Availability:
+    """Availability bitmaps following `engine`'s appointments log"""
+    availability = Availability(catalog["clinic"]["hours"], catalog["doctors"])
+    engine.subscribe("appointments", availability.apply)
+    engine.poll("appointments")
+    return availability
+
+
+def slot_guard(availability: Availability, day: str = "2030-01-07", time: str = "10:00"):
+    return availability.guard("Dr. Priya Sharma", day, time)
+
+
+def record(booking_id: str, day: str = "2030-01-07", time: str = "10:00") -> dict:
+    return {"bookingId": booking_id, "doctor": "Dr. Priya Sharma", "date": day, "time": time}
+
+
+@pytest.mark.parametrize("kind", ENGINES)
+def test_guard_admits_one_booking_per_slot_in_a_batch(tmp_path, catalog, kind):
+    engine = create_engine(kind, str(tmp_path))
+    availability = subscribed(engine, catalog)
+    results = engine.apply_batch([("append", "appointments", record(f"PH{i}"), slot_guard(availability))
+                                  for i in range(3)])
+    assert results[0] is not REJECTED
+    assert results[1:] == [REJECTED, REJECTED]
+    assert [r["bookingId"] for r in engine.load("appointments")] == ["PH0"]
+    engine.close()
+
+
+@pytest.mark.parametrize("kind", ENGINES)
+def test_guard_sees_bookings_made_by_another_worker(tmp_path, catalog, kind):
+    # Two engines on one data directory stand in for two worker processes
+    first, second = create_engine(kind, str(tmp_path)), create_engine(kind, str(tmp_path))
+    first_slots, second_slots = subscribed(first, catalog), subscribed(second, catalog)
+    assert first.apply_batch([("append", "appointments", record("PH1"), slot_guard(first_slots))]) != [REJECTED]
+    # `second` has not polled since; the guard must still see PH1
+    assert second.apply_batch([("append", "appointments", record("PH2"), slot_guard(second_slots))]) == [REJECTED]
+    # A cancellation frees the slot for everyone
+    second.delete("appointments", "bookingId", "PH1")
+    first.poll("appointments")
+    assert first_slots.is_free("Dr. Priya Sharma", "2030-01-07", "10:00")
+    assert first.apply_batch([("append", "appointments", record("PH3"), slot_guard(first_slots))]) != [REJECTED]
+    first.close()
+    second.close()
+
+
+def test_booked_slot_is_refused_in_any_spelling(clinic):
+    _, client = clinic
+    first = client.post("/api/appointments", json=booking(time="09:00", email="slot@example.com"))
+    assert first.status_code == 200
+    assert first.json()["appointment"]["doctor"] == "Dr. Priya Sharma"
+    for date, time in (("2030-01-07", "09:00"), ("2030-01-07", "9:00"), ("20300107", "09:00")):
+        response = client.post("/api/appointments",
+                               json=booking(date=date, time=time, email="other@example.com"))
+        assert response.status_code == 409, (date, time)
+    day = client.get("/api/availability", params={"doctor": "dr-priya", "from": "2030-01-07",
+                                                  "to": "2030-01-07"}).json()["days"][0]
+    assert "09:00" in day["booked"] and "09:00" not in day["available"]
+
+
+def test_outside_clinic_hours_is_refused(clinic):
+    _, client = clinic
+    # Sundays are closed, and Saturdays end at 2 PM
+    assert client.post("/api/appointments", json=booking(date="2030-01-06")).status_code == 400
+    assert client.post("/api/appointments", json=booking(date="2030-01-12", time="14:00")).status_code == 400
@@ -0,0 +1,51 @@
+"""
+PhysioHealth - Catalog tests
+Pre-serialised catalog responses, ETags and reloads
+"""
+
+import json
+import os
+import shutil
+
+from catalog import Catalog
+from conftest import ROOT
+from http_cache import negotiate_encoding
+
+
+def test_encoding_follows_accept_encoding():
+    assert negotiate_encoding("gzip, br", {"gzip": b"", "br": b""}) == "br"
+    assert negotiate_encoding("br;q=0, gzip", {"gzip": b"", "br": b""}) == "gzip"
+    assert negotiate_encoding("*", {"gzip": b""}) == "gzip"
+    assert negotiate_encoding("identity", {"gzip": b""}) is None
+
+
+def test_conditional_request_gets_304_for_every_representation(clinic):
+    _, client = clinic
+    for accept in ("identity", "gzip"):
+        first = client.get("/api/services", headers={"Accept-Encoding": accept})
+        assert first.status_code == 200
+        assert first.json()["services"]
+        again = client.get("/api/services", headers={"Accept-Encoding": accept,
+                                                     "If-None-Match": first.headers["ETag"]})
+        assert again.status_code == 304
+        assert again.content == b""
+    plain = client.get("/api/doctors", headers={"Accept-Encoding": "identity"})
+    packed = client.get("/api/doctors", headers={"Accept-Encoding": "gzip"})
+    assert packed.headers["Content-Encoding"] == "gzip"
+    assert packed.headers["ETag"] != plain.headers["ETag"]
+    assert packed.json() == plain.json()
+
+
+def test_reload_only_when_the_file_changed(tmp_path):
+    path = tmp_path / "catalog.json"
+    shutil.copy(os.path.join(ROOT, "data", "catalog.json"), path)
+    catalog = Catalog(str(path))
+    etag = catalog.responses["services"].etag
+    assert not catalog.reload_if_changed()
+    data = json.loads(path.read_text(encoding="utf-8"))
+    data["services"][0]["price"] += 100
+    path.write_text(json.dumps(data), encoding="utf-8")
+    os.utime(path, (1, 1))
+    assert catalog.reload_if_changed()
+    assert catalog.responses["services"].etag != etag
+    assert catalog.service_prices()[data["services"][0]["id"]] == data["services"][0]["price"]
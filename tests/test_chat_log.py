@@ -0,0 +1,53 @@
+"""
+PhysioHealth - Chat log tests
+Flushing to segments, and the one-time import of the legacy history file
+"""
+
+import json
+import time
+
+from chat_log import ChatLogger
+
+
+def message(text: str, timestamp: str) -> dict:
+    return {"message": text, "response": "Thanks!", "timestamp": timestamp}
+
+
+def test_flush_rotates_segments_by_day_and_size(tmp_path):
+    logger = ChatLogger(str(tmp_path), max_segment_bytes=10)
+    for i in range(3):
+        logger.log(message(f"knee pain {i}", "2030-01-07T10:00:00"))
+        logger.flush()
+    logger.log(message("back pain", "2030-01-08T09:00:00"))
+    logger.flush()
+    assert [m["message"] for m in logger.entries()] == ["knee pain 0", "knee pain 1", "knee pain 2",
+                                                        "back pain"]
+    assert logger.stats() == {"queued": 0, "written": 4, "dropped": 0,
+                              "segments": len(logger.segments())}
+    assert len(logger.segments()) == 4
+
+
+def test_legacy_history_is_imported_once(tmp_path):
+    legacy = tmp_path / "chat_history.json"
+    with open(legacy, "w", encoding="utf-8") as f:
+        json.dump([message("old one", "2024-03-05T10:00:00"), message("old two", "2024-03-06T10:00:00")], f)
+    logger = ChatLogger(str(tmp_path / "chat"))
+    logger.log(message("new", "2030-01-07T10:00:00"))
+    logger.flush()
+    assert logger.import_legacy(str(legacy)) == 2
+    # Another worker, or the next start
+    assert ChatLogger(str(tmp_path / "chat")).import_legacy(str(legacy)) == 0
+    assert [m["message"] for m in logger.entries()] == ["old one", "old two", "new"]
+    assert logger.stats()["segments"] == 3
+
+
+def test_legacy_history_is_searchable(clinic):
+    _, client = clinic
+    deadline = time.monotonic() + 5
+    while True:
+        found = client.get("/api/chat/search", params={"q": "frozen shoulder"}).json()
+        if found["count"] or time.monotonic() > deadline:
+            break
+        # The backfill runs on its own thread
+        time.sleep(0.05)
+    assert [chat["message"] for chat in found["chats"]] == ["Do you treat frozen shoulder?"]
@@ -0,0 +1,56 @@
+"""
+PhysioHealth - Chat matcher tests
+Keyword search and intent ranking for the chatbot
+"""
+
+from chat_matcher import KeywordAutomaton, KnowledgeBase
+
+
+def intents() -> KnowledgeBase:
+    return KnowledgeBase({
+        "pricing": {"response": "prices", "aliases": ["price", "how much"]},
+        "book appointment": {"response": "booking", "aliases": ["appointment", "booking"]},
+        "contact": {"response": "contact", "aliases": ["phone"]},
+        "default": {"response": "fallback"},
+    })
+
+
+def test_automaton_finds_overlapping_keywords():
+    automaton = KeywordAutomaton(["he", "she", "his", "hers"])
+    found = sorted((automaton.keywords[k], end) for k, end in automaton.find("ushers"))
+    assert found == [("he", 3), ("hers", 5), ("she", 3)]
+
+
+def test_longer_phrases_outscore_single_words():
+    knowledge = intents()
+    assert knowledge.match("What is the price to book appointment online?")[0] == "book appointment"
+    assert knowledge.match("How much is it? And your phone?")[0] == "pricing"
+
+
+def test_ties_go_to_the_intent_mentioned_first():
+    knowledge = intents()
+    # "price" and "phone" are the same length
+    assert knowledge.match("Your phone number and price?")[0] == "contact"
+    assert knowledge.match("Your price and phone number?")[0] == "pricing"
+    knowledge["contact"] = dict(knowledge["contact"], weight=1)
+    assert knowledge.match("Your price and phone number?")[0] == "contact"
+
+
+def test_unmatched_message_gets_the_default_intent():
+    assert intents().match("Hello there") == ("default", {"response": "fallback"})
+
+
+def test_edits_rebuild_the_matcher():
+    knowledge = intents()
+    assert knowledge.match("Any offers?")[0] == "default"
+    knowledge["discounts"] = {"response": "30% off", "aliases": ["offer"]}
+    assert knowledge.match("Any offers?")[0] == "discounts"
+    del knowledge["discounts"]
+    assert knowledge.match("Any offers?")[0] == "default"
+
+
+def test_chat_endpoint_answers_from_the_knowledge_base(clinic):
+    app, client = clinic
+    reply = client.post("/api/chat", json={"message": "How much does a session COST?"}).json()
+    assert reply["response"] == app.CHATBOT_RESPONSES["pricing"]["response"]
+    assert reply["suggestedActions"] == app.CHATBOT_RESPONSES["pricing"]["suggestedActions"]
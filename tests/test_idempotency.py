@@ -0,0 +1,56 @@
+"""
+PhysioHealth - Idempotency tests
+Idempotency-Key replays, against the storage engines directly and through
+the API
+"""
+
+import pytest
+
+from conftest import booking
+from idempotency import KEY_FIELD, IdempotencyKeys
+from storage import REJECTED, create_engine
+from test_availability import ENGINES, record, slot_guard, subscribed
+
+
+@pytest.mark.parametrize("kind", ENGINES)
+def test_idempotency_guard_admits_a_key_once(tmp_path, catalog, kind):
+    engine = create_engine(kind, str(tmp_path))
+    availability = subscribed(engine, catalog)
+    keys = IdempotencyKeys()
+    engine.subscribe("appointments", keys.apply)
+
+    def op(booking_id: str, time: str):
+        entry = dict(record(booking_id, time=time), **{KEY_FIELD: "retry-1"})
+        return ("append", "appointments", entry, keys.guard("retry-1", then=slot_guard(availability, time=time)))
+
+    # Same key for different slots in one batch, then again in a later one
+    assert engine.apply_batch([op("PH1", "10:00"), op("PH2", "11:00")])[1] == REJECTED
+    assert engine.apply_batch([op("PH3", "12:00")]) == [REJECTED]
+    assert keys.lookup("retry-1") == "PH1"
+    # A rejected key leaves its slot untouched
+    assert availability.is_free("Dr. Priya Sharma", "2030-01-07", "11:00")
+    engine.close()
+
+
+def test_retried_submission_returns_the_original_booking(clinic):
+    _, client = clinic
+    body = booking(time="11:00", email="retry@example.com")
+    headers = {"Idempotency-Key": "test-retry-1"}
+    first = client.post("/api/appointments", json=body, headers=headers)
+    second = client.post("/api/appointments", json=body, headers=headers)
+    assert first.status_code == second.status_code == 200
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert second.json()["bookingId"] == first.json()["bookingId"]
+    stored = client.get("/api/appointments", params={"email": "retry@example.com"}).json()
+    assert stored["count"] == 1
+
+
+def test_key_reused_for_a_different_booking_is_refused(clinic):
+    _, client = clinic
+    headers = {"Idempotency-Key": "test-retry-2"}
+    assert client.post("/api/appointments", json=booking(time="12:00", email="reuse@example.com"),
+                       headers=headers).status_code == 200
+    response = client.post("/api/appointments", json=booking(time="13:00", email="reuse@example.com"),
+                           headers=headers)
+    assert response.status_code == 409
+    assert "Idempotency-Key" in response.json()["detail"]
@@ -0,0 +1,55 @@
+"""
+PhysioHealth - ID tests
+Time-ordered, unique booking and message IDs
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from ids import ALPHABET, ID_LENGTH, IdGenerator, decode, encode, id_time, new_id
+
+
+def test_encoding_round_trips_and_keeps_order():
+    values = [0, 1, 31, 32, 2 ** 80, 2 ** 128 - 1]
+    encoded = [encode(value) for value in values]
+    assert all(len(text) == ID_LENGTH and set(text) <= set(ALPHABET) for text in encoded)
+    assert [decode(text) for text in encoded] == values
+    assert encoded == sorted(encoded)
+
+
+def test_ids_increase_within_a_millisecond_and_across_threads():
+    generator = IdGenerator()
+    with ThreadPoolExecutor(8) as pool:
+        batches = list(pool.map(lambda _: [generator.new("PH") for _ in range(2000)], range(8)))
+    ids = [value for batch in batches for value in batch]
+    assert len(set(ids)) == len(ids)
+    # Each thread sees them strictly increasing
+    assert all(batch == sorted(batch) and len(set(batch)) == len(batch) for batch in batches)
+
+
+def test_id_time_is_when_it_was_made():
+    before = datetime.now(timezone.utc)
+    made = id_time(new_id("MSG"))
+    # IDs keep whole milliseconds
+    assert before - timedelta(milliseconds=1) < made <= datetime.now(timezone.utc)
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_forked_workers_do_not_repeat_the_parent_sequence(monkeypatch):
+    # One frozen millisecond: without a reseed, parent and child would
+    # both continue with the same next ID
+    monkeypatch.setattr(time, "time_ns", lambda: 1_700_000_000_000_000_000)
+    generator = IdGenerator()
+    generator.new()
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.write(write_end, generator.new().encode())
+        os._exit(0)
+    os.waitpid(pid, 0)
+    child = os.read(read_end, ID_LENGTH).decode()
+    assert child != generator.new()
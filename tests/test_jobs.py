@@ -0,0 +1,155 @@
+"""
+PhysioHealth - Job tests
+The persistent queue, the runner's retries and limits, and delivery
+through the outbox and the fake SMTP server
+"""
+
+import asyncio
+import time
+
+from conftest import booking
+from jobs import DEAD, DONE, JobQueue, JobRunner
+from notifications import OutboxSender, SmtpSender, SmtpSink, contact_acknowledgement, contact_notice
+
+CLINIC = {"name": "PhysioHealth", "contact": {"email": "clinic@example.com", "phone": ["+91 9800000001"]}}
+
+
+def run_until(runner: JobRunner, done, timeout: float = 5.0):
+    """Start `runner`, wait until `done()` holds, then stop it"""
+    async def run():
+        runner.start()
+        deadline = time.monotonic() + timeout
+        while not done() and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        await runner.stop()
+
+    asyncio.run(run())
+
+
+def test_an_id_is_queued_once(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    assert queue.enqueue("email:booking:PH1", "email", {"to": "a@example.com"})
+    assert not queue.enqueue("email:booking:PH1", "email", {"to": "b@example.com"})
+    assert queue.enqueue_many([("email:booking:PH1", "email", {}, None),
+                               ("sms:booking:PH1", "sms", {}, None)]) == 1
+    assert queue.counts()["queued"] == 2
+    assert queue.claim(["email"]).payload == {"to": "a@example.com"}
+
+
+def test_failed_job_is_retried_with_backoff_then_dead_lettered(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    outbox = OutboxSender(str(tmp_path / "outbox"), "email")
+    attempts = []
+
+    async def flaky(message: dict):
+        attempts.append(time.time())
+        if message["to"] == "down@example.com" or len(attempts) == 1:
+            raise ConnectionError("mail server unavailable")
+        outbox.send(message)
+
+    runner = JobRunner(queue, max_attempts=3, backoff=0.1, poll_interval=0.05)
+    runner.handle("email", flaky)
+    queue.enqueue("email:1", "email", {"to": "flaky@example.com", "subject": "Hi", "body": ""})
+    run_until(runner, lambda: runner.completed == 1)
+    assert [message["to"] for message in outbox.messages()] == ["flaky@example.com"]
+    # Not retried before the backoff, which is 0.1s with up to 20% jitter
+    assert attempts[1] - attempts[0] >= 0.08
+
+    queue.enqueue("email:2", "email", {"to": "down@example.com", "subject": "Hi", "body": ""})
+    run_until(runner, lambda: runner.buried == 1)
+    (dead,) = queue.dead()
+    assert (dead["id"], dead["attempts"]) == ("email:2", 3)
+    assert dead["error"] == "ConnectionError: mail server unavailable"
+    assert (runner.completed, runner.retried) == (1, 3)
+
+    assert queue.requeue("email:2") and not queue.requeue("email:2")
+    assert queue.claim(["email"]).attempts == 1
+
+
+def test_backoff_doubles_up_to_the_cap(tmp_path):
+    runner = JobRunner(JobQueue(str(tmp_path / "jobs.db")), backoff=30, max_backoff=100)
+    assert 24 <= runner.delay(1) <= 36
+    assert 96 <= runner.delay(3) <= 120
+    assert 80 <= runner.delay(10) <= 120
+
+
+def test_job_of_a_dead_worker_runs_again_once_its_lease_expires(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"), lease=60)
+    queue.enqueue("sms:1", "sms", {"to": "+91 9800000000"})
+    claimed = queue.claim(["sms"])
+    # The worker holding it exits without finishing it
+    assert queue.claim(["sms"]) is None
+    restarted = JobQueue(str(tmp_path / "jobs.db"), lease=60)
+    assert restarted.claim(["sms"], now=time.time() + 30) is None
+    again = restarted.claim(["sms"], now=time.time() + 61)
+    assert (again.id, again.attempts, again.due_at) == ("sms:1", 2, claimed.due_at)
+    restarted.complete("sms:1")
+    assert restarted.counts()[DONE] == 1 and restarted.counts()[DEAD] == 0
+
+
+def test_runner_waits_instead_of_spinning_while_a_kind_is_at_its_limit(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    claims = []
+    claim = queue.claim
+    queue.claim = lambda kinds, now=None: claims.append(kinds) or claim(kinds, now)
+    release = None
+
+    async def slow(payload: dict):
+        await release.wait()
+
+    runner = JobRunner(queue, concurrency=4, poll_interval=1.0)
+    runner.handle("followup", slow, concurrency=1)
+    queue.enqueue_many([("followup:1", "followup", {}, None), ("followup:2", "followup", {}, None)])
+
+    async def run():
+        nonlocal release
+        release = asyncio.Event()
+        runner.start()
+        await asyncio.sleep(0.5)
+        busy_claims = len(claims)
+        release.set()
+        while runner.completed < 2:
+            await asyncio.sleep(0.01)
+        await runner.stop()
+        return busy_claims
+
+    # With the second job due but its kind full, the runner sleeps until
+    # the first one finishes rather than claiming in a loop
+    assert asyncio.run(run()) <= 3
+    assert queue.counts()[DONE] == 2
+
+
+def test_cancelled_booking_drops_its_followup(clinic):
+    app, client = clinic
+    booking_id = client.post("/api/appointments", json=booking(
+        email="followup@example.com", doctor="dr-amit", date="2030-01-14", time="10:00")).json()["bookingId"]
+    assert not app.job_queue.enqueue(f"followup:{booking_id}", "followup", {})
+    assert client.delete(f"/api/appointments/{booking_id}").status_code == 200
+    # Gone, so its id could be queued again
+    assert app.job_queue.enqueue(f"followup:{booking_id}", "followup", {})
+    assert app.job_queue.cancel(f"followup:{booking_id}")
+    assert not app.job_queue.cancel(f"followup:{booking_id}")
+
+
+def test_contact_subject_with_a_line_break_is_sent_on_one_line(tmp_path):
+    contact = {"id": "MSG1", "name": "Ravi", "email": "ravi@example.com",
+               "subject": "Back pain\r\nBcc: everyone@example.com", "message": "Hello"}
+    messages = [contact_acknowledgement(contact, CLINIC), contact_notice(contact, CLINIC)]
+    assert [message["subject"] for message in messages] == [
+        "Re: Back pain Bcc: everyone@example.com", "[Contact] Back pain Bcc: everyone@example.com"]
+
+    outbox = OutboxSender(str(tmp_path), "smtp")
+
+    async def deliver():
+        server = await SmtpSink(outbox).start(port=0)
+        port = server.sockets[0].getsockname()[1]
+        sender = SmtpSender("127.0.0.1", port, "PhysioHealth <noreply@example.com>")
+        async with server:
+            for message in messages:
+                await asyncio.to_thread(sender.send, message)
+
+    asyncio.run(deliver())
+    received = outbox.messages()
+    assert [message["to"] for message in received] == ["ravi@example.com", "clinic@example.com"]
+    assert received[0]["subject"] == messages[0]["subject"]
+    assert received[1]["body"].startswith("From: Ravi <ravi@example.com>")
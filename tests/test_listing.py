@@ -0,0 +1,110 @@
+"""
+PhysioHealth - Listing tests
+Appointment cursors resumed on a rebuilt index, in another worker's index
+and through the API around a rebuild
+"""
+
+import random
+
+from appointment_index import AppointmentIndex, decode_cursor, encode_cursor
+from conftest import booking
+from listing import make_filter, paginate
+
+
+def appointments(count: int) -> list:
+    # Some share a createdAt, so the bookingId has to break the tie
+    return [{"bookingId": f"PH{i:04d}", "email": f"p{i % 3}@example.com", "doctor": "Dr. Amit Patel",
+             "date": "2030-01-08", "time": "10:00", "createdAt": f"2030-01-01T09:00:{i // 2:02d}"}
+            for i in range(count)]
+
+
+def page(index: AppointmentIndex, after, limit: int = 7, email=None):
+    resume = decode_cursor(after) if after else None
+    items = index.iter_by_email(email, resume) if email else index.iter_from(resume)
+    records, cursor = paginate(items, make_filter("date", email=email), limit, encode_cursor)
+    return [record["bookingId"] for record in records], cursor
+
+
+def walk(indexes: list, **filters) -> list:
+    """Every page, fetched from the next index in turn"""
+    seen, cursor, turn = [], None, 0
+    while True:
+        ids, cursor = page(indexes[turn % len(indexes)], cursor, **filters)
+        seen += ids
+        turn += 1
+        if cursor is None:
+            return seen
+
+
+def test_cursor_resumes_in_an_index_built_in_another_order():
+    records = appointments(50)
+    shuffled = records[:]
+    random.Random(3).shuffle(shuffled)
+    here, there = AppointmentIndex(), AppointmentIndex()
+    here.build(records)
+    there.build(shuffled)
+    expected = [record["bookingId"] for record in records]
+    assert walk([here, there]) == expected
+    assert walk([there, here], email="p1@example.com") == expected[1::3]
+
+
+def test_cursor_survives_a_rebuild_with_changes_between_pages():
+    records = appointments(20)
+    index = AppointmentIndex()
+    index.build(records)
+    first, cursor = page(index, None)
+    # Cancel a record already listed and one still ahead, add a late one,
+    # then rebuild from scratch as compaction or a resync would
+    index.build([r for r in records if r["bookingId"] not in ("PH0002", "PH0015")]
+                + [dict(records[0], bookingId="PH9999", createdAt="2030-01-02T00:00:00")])
+    rest = []
+    while cursor:
+        ids, cursor = page(index, cursor)
+        rest += ids
+    assert first == [f"PH{i:04d}" for i in range(7)]
+    assert rest == [f"PH{i:04d}" for i in range(7, 20) if i != 15] + ["PH9999"]
+
+
+def test_api_pages_continue_across_a_rebuild(clinic, admin_headers):
+    _, client = clinic
+    email = "pages@example.com"
+    booked = [client.post("/api/appointments", json=booking(email=email, doctor="dr-amit",
+                                                             date="2030-01-09", time=f"{hour}:00")).json()["bookingId"]
+              for hour in range(9, 15)]
+    listing = "/api/appointments"
+    first = client.get(listing, params={"email": email, "limit": 4}).json()
+    assert first["nextCursor"]
+    assert client.post("/api/admin/reports/rebuild", headers=admin_headers).status_code == 200
+    second = client.get(listing, params={"email": email, "limit": 4, "after": first["nextCursor"]}).json()
+    assert second["nextCursor"] is None
+    ids = [a["bookingId"] for a in first["appointments"] + second["appointments"]]
+    assert ids == booked
+
+
+def test_malformed_cursor_is_refused(clinic):
+    _, client = clinic
+    for cursor in ("12", "not-a-cursor", encode_cursor(("x", "y", 0))[:-2]):
+        assert client.get("/api/appointments", params={"after": cursor}).status_code == 400
+
+
+def test_listing_order_ignores_a_client_supplied_created_at(clinic):
+    _, client = clinic
+    email = "backdated@example.com"
+    first = client.post("/api/appointments", json=booking(email=email, doctor="dr-amit", date="2030-01-10",
+                                                          time="09:00")).json()
+    # A client clock far in the past must not put this booking first
+    second = client.post("/api/appointments", json=booking(email=email, doctor="dr-amit", date="2030-01-10",
+                                                           time="10:00", createdAt="2000-01-01T00:00:00")).json()
+    assert second["appointment"]["createdAt"] > first["appointment"]["createdAt"]
+    listed = client.get("/api/appointments", params={"email": email}).json()["appointments"]
+    assert [a["bookingId"] for a in listed] == [first["bookingId"], second["bookingId"]]
+
+
+def test_doctor_filter_accepts_the_id_or_the_name(clinic):
+    _, client = clinic
+    booked = client.post("/api/appointments", json=booking(email="by-doctor@example.com", doctor="dr-rajesh",
+                                                           date="2030-01-11", time="16:00")).json()["bookingId"]
+    for doctor in ("dr-rajesh", "Dr. Rajesh Kumar"):
+        for params in ({"doctor": doctor}, {"doctor": doctor, "date": "2030-01-11"}):
+            listed = client.get("/api/appointments", params=params).json()["appointments"]
+            assert booked in [a["bookingId"] for a in listed], params
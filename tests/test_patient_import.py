@@ -0,0 +1,94 @@
+"""
+PhysioHealth - Patient import tests
+Streaming parsers, batch validation, progress and the import endpoint
+"""
+
+import io
+import json
+import time
+
+import pytest
+
+from patient_import import ImportReport, import_patients, iter_csv_records, iter_json_records
+from patient_repo import PatientRepository
+
+
+def patient(name: str, **fields) -> dict:
+    return {"name": name, "age": 30, "gender": "Female", "disease": "Asthma",
+            "admission_date": "2025-03-01", **fields}
+
+
+def test_json_items_stream_from_arrays_and_json_lines():
+    items = [patient(f"P{i}") for i in range(50)]
+    array = io.StringIO(json.dumps(items, indent=2))
+    lines = io.StringIO("\n".join(json.dumps(item) for item in items) + "\n")
+    assert list(iter_json_records(array, chunk_size=7)) == items
+    assert list(iter_json_records(lines, chunk_size=7)) == items
+    with pytest.raises(ValueError):
+        list(iter_json_records(io.StringIO('[{"name": "cut off"'), chunk_size=4))
+
+
+def test_an_item_larger_than_the_limit_is_refused_before_the_end():
+    read = []
+
+    class Stream(io.StringIO):
+        def read(self, size=-1):
+            chunk = super().read(size)
+            read.append(len(chunk))
+            return chunk
+
+    # One unterminated string that would otherwise be buffered whole
+    stream = Stream('[{"name": "' + "x" * 10_000)
+    with pytest.raises(ValueError, match="longer than"):
+        list(iter_json_records(stream, chunk_size=64, max_item_chars=256))
+    assert sum(read) < 1000
+
+
+def test_csv_rows_drop_empty_cells():
+    rows = list(iter_csv_records(io.StringIO("name,age,height\nAsha,30,\n")))
+    assert rows == [{"name": "Asha", "age": "30"}]
+
+
+def test_import_validates_rows_and_counts_progress_in_bytes(tmp_path):
+    path = tmp_path / "patients.json"
+    path.write_text("[]", encoding="utf-8")
+    repo = PatientRepository(str(path))
+    # Multi-byte names make characters and bytes differ
+    rows = [patient("Sérgio Ñúñez", patient_id=7), patient("Zoë", age=-1),
+            patient("Łucja"), patient("Ōta", patient_id=7)]
+    body = json.dumps(rows, ensure_ascii=False).encode("utf-8")
+    report = ImportReport(total_bytes=len(body))
+    import_patients(io.BytesIO(body), "json", repo, batch_size=2, report=report)
+    assert (report.rows, report.imported, report.rejected) == (4, 2, 2)
+    assert [error["row"] for error in report.errors] == [2, 4]
+    assert report.bytes_read == report.total_bytes
+    assert [(p.patient_id, p.name) for p in repo.all()] == [(7, "Sérgio Ñúñez"), (8, "Łucja")]
+
+
+def test_import_endpoint_runs_in_the_background(patient_api):
+    main, client = patient_api
+    body = "\n".join(json.dumps(patient(f"Imported {i}")) for i in range(3)).encode("utf-8")
+    started = client.post("/patients/import", content=body)
+    assert started.status_code == 202
+    deadline = time.monotonic() + 5
+    status = started.json()
+    while status["status"] == "running" and time.monotonic() < deadline:
+        time.sleep(0.02)
+        status = client.get(f"/patients/import/{status['jobId']}").json()
+    assert (status["status"], status["imported"], status["bytesRead"]) == ("done", 3, len(body))
+    names = {p["name"] for p in client.get("/view").json()}
+    assert {"Imported 0", "Imported 1", "Imported 2"} <= names
+
+
+def test_import_endpoint_refuses_oversized_bodies(patient_api, monkeypatch):
+    main, client = patient_api
+    monkeypatch.setattr(main, "MAX_IMPORT_BYTES", 10)
+    assert client.post("/patients/import", content=b"[" + b" " * 20 + b"]").status_code == 413
+
+    def chunks():
+        yield b"[" + b" " * 8
+        yield b" " * 8 + b"]"
+
+    # Without a Content-Length the limit applies while the body streams in
+    assert client.post("/patients/import", content=chunks()).status_code == 413
+    assert client.get("/patients/import/none").status_code == 404
@@ -0,0 +1,43 @@
+"""
+PhysioHealth - Patient repository tests
+Sort orders and the sort endpoints
+"""
+
+import json
+
+from patient_repo import SORTABLE_FIELDS, PatientRepository
+
+
+def write_patients(path, patients: list):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(patients, f)
+
+
+def test_sorted_puts_missing_values_last_in_either_direction(tmp_path):
+    path = tmp_path / "patients.json"
+    write_patients(path, [{"patient_id": 1, "age": 40}, {"patient_id": 2},
+                          {"patient_id": 3, "age": 25}, {"patient_id": 4, "age": 61}])
+    repo = PatientRepository(str(path))
+    assert [p.patient_id for p in repo.sorted("age")] == [3, 1, 4, 2]
+    assert [p.patient_id for p in repo.sorted("age", descending=True)] == [4, 1, 3, 2]
+    assert [p.patient_id for p in repo.sorted("age", limit=2)] == [3, 1]
+
+
+def test_only_sortable_fields_keep_an_order(tmp_path):
+    path = tmp_path / "patients.json"
+    write_patients(path, [{"patient_id": 2, "nickname": "b"}, {"patient_id": 1, "nickname": "a"}])
+    repo = PatientRepository(str(path))
+    assert [p.patient_id for p in repo.sorted("patient_id")] == [1, 2]
+    repo.sorted("nickname")
+    assert set(repo._orders) == {"patient_id"}
+    assert "nickname" not in SORTABLE_FIELDS
+
+
+def test_sort_endpoints_refuse_unknown_fields(patient_api):
+    _, client = patient_api
+    for route in ("/sort0/", "/patients"):
+        assert client.get(route, params={"sort_by": "no_such_field"}).status_code == 400
+    ages = [p["age"] for p in client.get("/sort0/", params={"sort_by": "age"}).json()]
+    assert ages == sorted(ages)
+    names = [p["name"] for p in client.get("/patients", params={"sort_by": "name", "order": "desc"}).json()]
+    assert names == sorted(names, reverse=True)
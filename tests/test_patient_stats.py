@@ -0,0 +1,65 @@
+"""
+PhysioHealth - Patient statistics tests
+Group-by counts, rates and histograms over the columnar records
+"""
+
+import json
+import os
+
+from patient_repo import PatientRepository
+from patient_stats import PatientColumns
+
+PATIENTS = [
+    {"patient_id": 1, "name": "A", "age": 34, "gender": "Female", "disease": "Asthma",
+     "admission_date": "2025-01-10", "readmitted": True},
+    {"patient_id": 2, "name": "B", "age": 41, "gender": "Male", "disease": "Asthma",
+     "admission_date": "2025-01-22", "readmitted": False},
+    {"patient_id": 3, "name": "C", "age": 67, "gender": "Male", "disease": "Diabetes",
+     "admission_date": "2025-04-02", "readmitted": True, "blood_group": "O+"},
+]
+
+
+def columns_for(tmp_path, patients: list) -> PatientColumns:
+    path = tmp_path / "patients.json"
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(patients, f)
+    return PatientColumns(PatientRepository(str(path)))
+
+
+def test_group_by_queries(tmp_path):
+    stats = columns_for(tmp_path, PATIENTS).refresh()
+    assert stats.counts("gender") == {"Female": 1, "Male": 2}
+    assert stats.counts("blood_group") == {"O+": 1, "unknown": 2}
+    assert stats.counts("readmitted") == {"true": 2, "false": 1}
+    assert stats.readmission_rates("disease") == [
+        {"disease": "Asthma", "patients": 2, "readmitted": 1, "rate": 0.5},
+        {"disease": "Diabetes", "patients": 1, "readmitted": 1, "rate": 1.0},
+    ]
+    assert [(b["from"], b["count"]) for b in stats.age_histogram(20)] == [(0, 0), (20, 1), (40, 1), (60, 1)]
+    # Months without admissions are listed too
+    assert stats.admissions_per_month() == {"2025-01": 2, "2025-02": 0, "2025-03": 0, "2025-04": 1}
+    assert stats.summary() == {"patients": 3, "readmissionRate": 0.6667,
+                               "age": {"min": 34, "max": 67, "mean": 47.33, "median": 41.0}}
+
+
+def test_appends_are_encoded_and_rewrites_rebuild(tmp_path):
+    stats = columns_for(tmp_path, PATIENTS[:2]).refresh()
+    stats.repo.append([PATIENTS[2]])
+    assert stats.refresh().counts("disease") == {"Asthma": 2, "Diabetes": 1}
+    with open(stats.repo.path, "w", encoding="utf-8") as f:
+        json.dump(PATIENTS[2:], f)
+    # Keep the size check from mistaking the rewrite for the old file
+    os.utime(stats.repo.path, (1, 1))
+    assert stats.refresh().counts("disease") == {"Diabetes": 1}
+    assert len(stats) == 1
+
+
+def test_stats_endpoints(patient_api):
+    _, client = patient_api
+    summary = client.get("/patients/stats").json()
+    counts = client.get("/patients/stats/counts", params={"by": "gender"}).json()["counts"]
+    assert sum(counts.values()) == summary["patients"]
+    assert client.get("/patients/stats/counts", params={"by": "name"}).status_code == 400
+    assert client.get("/patients/stats/readmission", params={"by": "readmitted"}).status_code == 400
+    bins = client.get("/patients/stats/age-histogram", params={"bin_width": 50}).json()["bins"]
+    assert sum(b["count"] for b in bins) == summary["patients"]
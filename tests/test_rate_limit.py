@@ -0,0 +1,79 @@
+"""
+PhysioHealth - Rate limit tests
+Token buckets, the client address behind proxies, and the 429 middleware
+"""
+
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from rate_limit import MemoryBuckets, RateLimit, RateLimiter, RateLimitMiddleware, SqliteBuckets
+
+
+def scope(forwarded=None, peer: str = "10.0.0.9", path: str = "/api/contact") -> dict:
+    headers = [(b"x-forwarded-for", value.encode()) for value in forwarded or ()]
+    return {"type": "http", "method": "POST", "path": path, "headers": headers, "client": (peer, 4000)}
+
+
+def test_bucket_allows_a_burst_then_refills():
+    limit = RateLimit.parse("contact", "3/60")
+    store = MemoryBuckets()
+    assert [store.take(limit, "a", 100.0) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert store.take(limit, "a", 100.0) == pytest.approx(20.0)
+    assert store.take(limit, "b", 100.0) == 0.0
+    # One token back every 20 seconds
+    assert store.take(limit, "a", 120.0) == 0.0
+    assert store.take(limit, "a", 120.0) > 0
+    with pytest.raises(ValueError):
+        RateLimit.parse("contact", "0/60")
+
+
+@pytest.mark.parametrize("trusted, forwarded, client", [
+    (0, ["203.0.113.7"], "10.0.0.9"),
+    (1, ["203.0.113.7"], "203.0.113.7"),
+    # Entries left of the trusted hops were written by the client
+    (1, ["1.2.3.4, 203.0.113.7"], "203.0.113.7"),
+    (1, ["1.2.3.4", "203.0.113.7"], "203.0.113.7"),
+    (2, ["1.2.3.4, 203.0.113.7, 10.1.1.1"], "203.0.113.7"),
+    # Fewer hops than proxies: the leftmost entry, or else the peer
+    (2, ["203.0.113.7"], "203.0.113.7"),
+    (1, [], "10.0.0.9"),
+])
+def test_client_is_the_address_the_outermost_trusted_proxy_saw(trusted, forwarded, client):
+    assert RateLimiter(MemoryBuckets(), trusted_proxies=trusted).client(scope(forwarded)) == client
+
+
+@pytest.mark.parametrize("store", ("memory", "sqlite"))
+def test_spoofed_forwarded_for_shares_one_bucket(tmp_path, store):
+    buckets = MemoryBuckets() if store == "memory" else SqliteBuckets(str(tmp_path / "ratelimit.db"))
+    limiter = RateLimiter(buckets, trusted_proxies=1)
+    limiter.limit("POST", "/api/contact", RateLimit.parse("contact", "2/60"))
+
+    async def attempts():
+        return [await limiter.check(scope([f"198.51.100.{i}, 203.0.113.7"])) for i in range(4)]
+
+    waits = asyncio.run(attempts())
+    assert waits[:2] == [0.0, 0.0] and all(wait > 0 for wait in waits[2:])
+    assert asyncio.run(limiter.check(scope(path="/api/chat"))) == 0.0
+    buckets.close()
+
+
+def test_middleware_answers_429_with_retry_after():
+    app = FastAPI()
+    limiter = RateLimiter(MemoryBuckets())
+    limiter.limit("POST", "/api/contact", RateLimit.parse("contact", "1/30"))
+    app.add_middleware(RateLimitMiddleware, limiter=limiter)
+
+    @app.post("/api/contact")
+    async def contact():
+        return {"success": True}
+
+    with TestClient(app) as client:
+        assert client.post("/api/contact").status_code == 200
+        limited = client.post("/api/contact")
+        assert limited.status_code == 429
+        assert limited.headers["Retry-After"] in ("29", "30")
+        assert "Too many requests" in limited.json()["detail"]
+        assert client.get("/api/contact").status_code == 405
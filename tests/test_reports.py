@@ -0,0 +1,54 @@
+"""
+PhysioHealth - Report tests
+Revenue rollups following bookings and cancellations
+"""
+
+from conftest import booking
+from reports import RevenueRollups
+from storage import create_engine
+
+
+def appointment(booking_id: str, day: str, doctor: str, price: float, regular: bool = False) -> dict:
+    return {"bookingId": booking_id, "date": day, "doctor": doctor, "service": "sports",
+            "originalPrice": price, "discount": price * 0.3 if regular else 0,
+            "isRegularPatient": regular}
+
+
+def test_rollups_follow_the_log(tmp_path):
+    engine = create_engine("jsonl", str(tmp_path))
+    rollups = RevenueRollups()
+    engine.subscribe("appointments", rollups.apply)
+    engine.append("appointments", appointment("PH1", "2030-01-07", "Dr. A", 1000, regular=True))
+    engine.append("appointments", appointment("PH2", "2030-01-08", "Dr. B", 2000))
+    engine.append("appointments", appointment("PH3", "2030-01-09", "Dr. A", 1500))
+    engine.delete("appointments", "bookingId", "PH3")
+    engine.poll("appointments")
+    engine.drain("appointments")
+    total, groups = rollups.report("doctor")
+    assert total == {"bookings": 2, "grossRevenue": 3000.0, "discountGiven": 300.0, "netRevenue": 2700.0,
+                     "regularPatients": 1, "regularShare": 0.5}
+    assert [(g["doctor"], g["bookings"]) for g in groups] == [("Dr. A", 1), ("Dr. B", 1)]
+    total, groups = rollups.report("day", date_from="2030-01-08", date_to="2030-01-08")
+    assert (total["bookings"], [g["day"] for g in groups]) == (1, ["2030-01-08"])
+    # A rebuild from the records gives the same answer
+    rebuilt = RevenueRollups()
+    rebuilt.rebuild(engine.load("appointments"))
+    assert rebuilt.report("doctor") == rollups.report("doctor")
+
+
+def test_report_endpoints(clinic, admin_headers):
+    _, client = clinic
+    day = {"from": "2030-02-04", "to": "2030-02-04"}
+    first = client.post("/api/appointments", json=booking(email="report@example.com", date="2030-02-04",
+                                                          isRegularPatient=True)).json()
+    client.post("/api/appointments", json=booking(email="report@example.com", date="2030-02-04",
+                                                  time="11:00", service="orthopedic"))
+    total = client.get("/api/reports/summary", params=day).json()["total"]
+    assert (total["bookings"], total["regularPatients"]) == (2, 1)
+    services = client.get("/api/reports/service", params=day).json()["groups"]
+    assert [g["service"] for g in services] == ["orthopedic", "sports"]
+    client.delete(f"/api/appointments/{first['bookingId']}")
+    assert client.get("/api/reports/summary", params=day).json()["total"]["bookings"] == 1
+    assert client.post("/api/admin/reports/rebuild", headers=admin_headers).json()["success"]
+    assert client.get("/api/reports/summary", params=day).json()["total"]["bookings"] == 1
+    assert client.get("/api/reports/patient").status_code == 404
@@ -0,0 +1,75 @@
+"""
+PhysioHealth - Search tests
+Full-text search over contact messages and chat history
+"""
+
+import sqlite3
+import time
+
+from search import MessageSearch, fts_query
+
+
+def contact(message_id: str, message: str, created: str = "2030-01-07T10:00:00") -> dict:
+    return {"id": message_id, "name": "Asha", "email": "asha@example.com", "subject": "Question",
+            "message": message, "createdAt": created}
+
+
+def texts(results) -> list:
+    return [result.get("message") for result in results]
+
+
+def test_query_words_are_literal_and_star_is_a_prefix():
+    assert fts_query('knee OR "pain" physio*') == '"knee" "OR" "pain" "physio"*'
+    assert fts_query("*** !!") is None
+
+
+def test_messages_sharing_an_id_are_all_indexed(tmp_path):
+    search = MessageSearch(str(tmp_path / "search.db"))
+    # Older clients made their own ids from the clock, so two messages
+    # sent in the same millisecond share one
+    first, second = contact("MSG1700000000000", "knee pain"), contact("MSG1700000000000", "knee brace")
+    assert search.add("contact", [first, second]) == 2
+    # Feeding the same messages again (another worker, a restart) adds nothing
+    assert search.add("contact", [first, second]) == 0
+    results, _ = search.search("contact", "knee")
+    assert sorted(texts(results)) == ["knee brace", "knee pain"]
+    search.close()
+
+
+def test_search_pages_newest_first_within_a_date_range(tmp_path):
+    search = MessageSearch(str(tmp_path / "search.db"))
+    search.add("contact", [contact(f"MSG{i}", f"shoulder {i}", f"2030-01-{7 + i // 2:02d}T10:00:00")
+                           for i in range(6)])
+    page, cursor = search.search("contact", "shoulder", limit=2)
+    rest, end = search.search("contact", "shoulder", limit=10, after=cursor)
+    assert texts(page + rest) == [f"shoulder {i}" for i in range(5, -1, -1)] and end is None
+    ranged, _ = search.search("contact", "shoulder", date_from="2030-01-08", date_to="2030-01-08")
+    assert texts(ranged) == ["shoulder 3", "shoulder 2"]
+    search.close()
+
+
+def test_an_index_with_the_old_keys_is_rebuilt(tmp_path):
+    path = str(tmp_path / "search.db")
+    old = sqlite3.connect(path)
+    old.execute("CREATE TABLE documents (docid INTEGER PRIMARY KEY, kind TEXT NOT NULL, key TEXT NOT NULL,"
+                " created TEXT NOT NULL, data TEXT NOT NULL, UNIQUE (kind, key))")
+    old.execute("INSERT INTO documents (kind, key, created, data) VALUES ('contact', 'MSG1', '', '{}')")
+    old.commit()
+    old.close()
+    search = MessageSearch(path)
+    assert search.count("contact") == 0
+    search.close()
+
+
+def test_contact_messages_are_searchable_through_the_api(clinic):
+    _, client = clinic
+    sent = client.post("/api/contact", json={"name": "Ravi", "email": "ravi@example.com",
+                                             "subject": "Tennis elbow", "message": "Weekend slots for tennis elbow?"})
+    assert sent.status_code == 200
+    deadline = time.monotonic() + 5
+    while True:
+        found = client.get("/api/contact/search", params={"q": "tennis elb*"}).json()
+        if found["count"] or time.monotonic() > deadline:
+            break
+        time.sleep(0.05)
+    assert [m["id"] for m in found["messages"]] == [sent.json()["messageId"]]
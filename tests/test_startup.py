@@ -0,0 +1,78 @@
+"""
+PhysioHealth - Startup tests
+Warm-up steps, the request gate and the readiness endpoint
+"""
+
+import threading
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from startup import StartupProfile, Warmup, WarmupGate, parse_importtime
+
+
+def test_steps_run_in_order_and_a_failure_does_not_stop_the_rest():
+    ran = []
+    warmup = Warmup(StartupProfile())
+    warmup.step("first", lambda: ran.append("first"))
+    warmup.step("broken", lambda: 1 / 0)
+    warmup.step("last", lambda: ran.append("last"))
+    warmup.start()
+    assert ran == ["first", "last"]
+    assert warmup.finished() and not warmup.ready()
+    states = {step["name"]: step["state"] for step in warmup.status()["steps"]}
+    assert states == {"first": "done", "broken": "failed", "last": "done"}
+    assert warmup.status()["steps"][1]["error"] == "ZeroDivisionError: division by zero"
+    assert {"warmup:first", "warmup:last", "ready"} <= set(warmup.profile.phases)
+
+
+def test_gate_holds_only_the_requests_that_need_a_step():
+    release = threading.Event()
+    warmup = Warmup()
+    warmup.step("slow", release.wait)
+    warmup.step("broken", lambda: 1 / 0)
+    app = FastAPI()
+    app.add_middleware(WarmupGate, warmup=warmup, routes={"/data": "slow", "/broken": "broken"})
+
+    @app.get("/{name}")
+    async def page(name: str):
+        return {"name": name}
+
+    with TestClient(app) as client:
+        warmup.start(background=True)
+        # Served while the warm-up is still running
+        assert client.get("/health").json() == {"name": "health"}
+        assert not warmup.done("slow")
+        held = {}
+        waiter = threading.Thread(target=lambda: held.update(response=client.get("/data")))
+        waiter.start()
+        waiter.join(0.2)
+        assert waiter.is_alive()
+        release.set()
+        waiter.join(5)
+        assert held["response"].json() == {"name": "data"}
+        refused = client.get("/broken")
+        assert (refused.status_code, refused.headers["Retry-After"]) == (503, "5")
+
+
+def test_import_time_report_lists_the_module_and_its_first_imports():
+    stderr = "\n".join([
+        "import time: self [us] | cumulative | imported package",
+        "import time:       100 |        100 |     fast_json",
+        "import time:        50 |         50 |       records",
+        "import time:       300 |        450 |   storage",
+        "import time:      1000 |       1600 | app",
+    ])
+    assert parse_importtime(stderr, "app") == {"module": {"self": 1000, "cumulative": 1600},
+                                               "imports": [("storage", 450)]}
+
+
+def test_ready_once_every_step_has_run(clinic, admin_headers):
+    _, client = clinic
+    ready = client.get("/api/ready")
+    assert ready.status_code == 200
+    steps = ready.json()["steps"]
+    assert [step["name"] for step in steps] == ["frontend", "appointments", "contacts", "chat"]
+    assert all(step["state"] == "done" for step in steps)
+    report = client.get("/api/admin/startup", headers=admin_headers).json()
+    assert "ready" in report["phases"] and report["warmup"]["ready"]
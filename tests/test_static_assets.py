@@ -0,0 +1,42 @@
+"""
+PhysioHealth - Static asset tests
+Fingerprinted frontend files, caching headers and HEAD requests
+"""
+
+import re
+
+from static_assets import IMMUTABLE, REVALIDATE, StaticAssets, fingerprint, media_type
+
+
+def test_pages_link_to_fingerprinted_assets(tmp_path):
+    (tmp_path / "app.js").write_text("console.log('hi');", encoding="utf-8")
+    (tmp_path / "vendor").mkdir()
+    (tmp_path / "vendor" / "app.js").write_text("var vendor = 1;", encoding="utf-8")
+    (tmp_path / "index.html").write_text('<script src="/app.js"></script><script src="vendor/app.js"></script>',
+                                         encoding="utf-8")
+    assets = StaticAssets(str(tmp_path), lazy=True)
+    assert not assets.built
+    page = assets.get("/").body.decode("utf-8")
+    hashed, vendor = assets.fingerprints["app.js"], assets.fingerprints["vendor/app.js"]
+    assert hashed == fingerprint("app.js", b"console.log('hi');")
+    assert page == f'<script src="/{hashed}"></script><script src="{vendor}"></script>'
+    assert assets.get(hashed).cache_control == IMMUTABLE
+    assert assets.get("app.js").cache_control == REVALIDATE
+    assert assets.get("missing.js") is None
+
+
+def test_frontend_is_served_with_revalidation_and_head(clinic):
+    _, client = clinic
+    page = client.get("/", headers={"Accept-Encoding": "identity"})
+    assert page.status_code == 200
+    assert page.headers["Cache-Control"] == REVALIDATE
+    script = re.search(r'src="/?(script\.[0-9a-f]{8}\.js)"', page.text).group(1)
+    asset = client.get(f"/{script}")
+    assert asset.headers["Cache-Control"] == IMMUTABLE
+    assert asset.headers["Content-Type"] == media_type("script.js")
+    head = client.head("/", headers={"Accept-Encoding": "identity"})
+    assert (head.status_code, head.content, head.headers["ETag"]) == (200, b"", page.headers["ETag"])
+    again = client.head("/", headers={"If-None-Match": page.headers["ETag"]})
+    assert again.status_code == 304
+    assert client.get("/no/such/page").status_code == 404
+    assert client.post("/").status_code == 405
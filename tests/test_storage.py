@@ -0,0 +1,75 @@
+"""
+PhysioHealth - Storage tests
+Recovery from a half-written log line, and deletes racing between workers
+"""
+
+import pytest
+
+from conftest import booking
+from storage import JsonlEngine, create_engine
+
+TORN = b'{"bookingId":"PH2","date":"2030-01'
+
+
+def write_torn_line(engine: JsonlEngine):
+    """What a crash in the middle of an append leaves at the end of the log"""
+    with open(engine.path("appointments"), "ab") as f:
+        f.write(TORN)
+
+
+def ids(records) -> list:
+    return [record["bookingId"] for record in records]
+
+
+def test_restart_ignores_a_half_written_line_and_the_next_append_cuts_it_off(tmp_path):
+    engine = JsonlEngine(str(tmp_path))
+    engine.append("appointments", {"bookingId": "PH1"})
+    engine.close()
+    write_torn_line(engine)
+
+    restarted = JsonlEngine(str(tmp_path))
+    assert ids(restarted.load("appointments")) == ["PH1"]
+    assert ids(record for _, record in restarted.iter_records("appointments")) == ["PH1"]
+    restarted.append("appointments", {"bookingId": "PH3"})
+    with open(restarted.path("appointments"), "rb") as f:
+        assert TORN not in f.read()
+    restarted.close()
+    assert ids(JsonlEngine(str(tmp_path)).load("appointments")) == ["PH1", "PH3"]
+
+
+def test_running_worker_skips_a_torn_line_until_the_log_moves_on(tmp_path):
+    reader, writer = JsonlEngine(str(tmp_path)), JsonlEngine(str(tmp_path))
+    seen = []
+    reader.subscribe("appointments", lambda entries, rebuilt: seen.extend(ids(entries)))
+    writer.append("appointments", {"bookingId": "PH1"})
+    reader.poll("appointments")
+    write_torn_line(writer)
+    reader.poll("appointments")
+    assert seen == ["PH1"]
+    writer.append("appointments", {"bookingId": "PH3"})
+    reader.poll("appointments")
+    assert seen == ["PH1", "PH3"]
+
+
+@pytest.mark.parametrize("kind", ("jsonl", "sqlite"))
+def test_only_one_worker_deletes_a_record(tmp_path, kind):
+    first, second = create_engine(kind, str(tmp_path)), create_engine(kind, str(tmp_path))
+    record = {"bookingId": "PH1"}
+    first.append("appointments", record)
+    second.poll("appointments")
+    # Both workers hold the record from their index when the cancels arrive
+    assert first.delete("appointments", "bookingId", "PH1", record) == record
+    assert second.delete("appointments", "bookingId", "PH1", record) is None
+    assert first.apply_batch([("delete", "appointments", "bookingId", "PH1", record)] * 2) == [None, None]
+    second.append("appointments", {"bookingId": "PH2"})
+    assert ids(create_engine(kind, str(tmp_path)).load("appointments")) == ["PH2"]
+    first.close()
+    second.close()
+
+
+def test_second_cancel_is_not_found(clinic):
+    _, client = clinic
+    booking_id = client.post("/api/appointments", json=booking(
+        email="cancel-twice@example.com", doctor="dr-rajesh", time="15:00")).json()["bookingId"]
+    assert client.delete(f"/api/appointments/{booking_id}").status_code == 200
+    assert client.delete(f"/api/appointments/{booking_id}").status_code == 404
@@ -0,0 +1,36 @@
+"""
+PhysioHealth - Writer tests
+Group commit of concurrent appends through the writer
+"""
+
+import asyncio
+import os
+
+import pytest
+
+from storage import create_engine
+from writer import StorageWriter
+
+
+@pytest.mark.parametrize("kind", ("jsonl", "sqlite"))
+def test_writer_commits_every_concurrent_append(tmp_path, kind):
+    engine = create_engine(kind, str(tmp_path))
+
+    async def book_all():
+        writer = StorageWriter(engine, max_batch=64)
+        writer.start()
+        await asyncio.gather(*(writer.append("appointments", {"bookingId": f"PH{i}"})
+                               for i in range(500)))
+        await writer.stop()
+        return writer.stats()
+
+    stats = asyncio.run(book_all())
+    assert stats["ops"] == 500
+    # Queued appends share commits
+    assert stats["batches"] < 500
+    stored = sorted(record["bookingId"] for record in engine.load("appointments"))
+    assert stored == sorted(f"PH{i}" for i in range(500))
+    engine.close()
+    if kind == "jsonl":
+        with open(os.path.join(str(tmp_path), "appointments.jsonl"), "rb") as f:
+            assert f.read().count(b"\n") == 500
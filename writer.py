@@ -0,0 +1,101 @@
+"""
+PhysioHealth - Storage writer
+Single asyncio task that owns all writes to the storage engine
+"""
+
+import asyncio
+from typing import Callable, Optional
+
+from storage import StorageEngine
+
+
+class StorageWriter:
+    """Serialises mutations through one queue with group commit.
+
+    Requests enqueue an operation and await its future. The writer task
+    takes everything waiting in the queue (up to `max_batch`), commits it
+    with a single `apply_batch` call in a worker thread, then resolves the
+    futures once the batch is durable. Blocking file I/O never runs on the
+    event loop.
+
+    `on_commit` runs on the event loop after each batch, before any of
+    its requests resume, so in-memory indexes can catch up first.
+    """
+
+    def __init__(self, storage: StorageEngine, max_batch: int = 256,
+                 on_commit: Optional[Callable[[], None]] = None):
+        self.storage = storage
+        self.max_batch = max_batch
+        self.on_commit = on_commit
+        self.batches = 0
+        self.ops = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run(), name="storage-writer")
+
+    async def stop(self):
+        """Commit everything already queued, then stop the writer task"""
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    async def submit(self, op: tuple):
+        if self._task is None:
+            raise RuntimeError("Storage writer is not running")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((op, future))
+        return await future
+
+    async def append(self, collection: str, record: dict,
+                     guard: Optional[Callable[[set], bool]] = None):
+        return await self.submit(("append", collection, record, guard))
+
+    async def delete(self, collection: str, field: str, value,
+                     record: Optional[dict] = None) -> Optional[dict]:
+        return await self.submit(("delete", collection, field, value, record))
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            batch = []
+            while item is not None:
+                batch.append(item)
+                if len(batch) >= self.max_batch or self._queue.empty():
+                    break
+                item = self._queue.get_nowait()
+            stopping = item is None
+            if batch:
+                await self._commit(batch)
+
+    async def _commit(self, batch: list):
+        try:
+            results = await asyncio.to_thread(
+                self.storage.apply_batch, [op for op, _ in batch]
+            )
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.batches += 1
+        self.ops += len(batch)
+        if self.on_commit is not None:
+            self.on_commit()
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "ops": self.ops,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+        }